@@ -0,0 +1,181 @@
+''' Throughput benchmark of the acquisition pipeline (Gather).
+
+Measures, for a matrix of channel counts and sampling rates:
+* decode : decoding of RDA data blocks (Gather.GetData -> decode_data_block)
+* insert : adding a block to the data memory (RingBuffer.write vs. the
+           former util.insert)
+* markers : parsing of the marker section (decode_markers)
+* ingest : end-to-end socket ingest of a Gather against a local RDA replay
+           server (in a separate process) that sends as fast as possible
+
+and reports blocks/s, per-block latency percentiles, CPU time and peak memory.
+Results are saved as json so that runs can be compared across commits.
+
+Usage: python benchmarks/benchmark_acquisition.py [--channels 32 64] [--sr 500 1000]
+    [--blocks 500] [--output results.json] [--skip-ingest]
+'''
+import sys; sys.path.insert(0, '../'); sys.path.insert(0, './')
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+from octopus.gather.gather import Gather, decode_data_block, decode_markers
+from octopus.buffer import RingBuffer
+from octopus.replay import RDAReplayServer, RandomWalkSource, SyntheticSource, encode_data
+from octopus import util
+
+BLOCKS_PER_S = 50
+MEMORY_S = 10
+
+
+def summarize(latencies, cpu_s, peak_bytes):
+    ''' Blocks/s, latency percentiles [ms], cpu time and peak memory of a run.'''
+    latencies = np.asarray(latencies)
+    return dict(blocks=len(latencies),
+        blocks_per_s=len(latencies) / latencies.sum(),
+        latency_ms=dict(zip(['p50', 'p90', 'p99', 'max'],
+            (np.percentile(latencies, [50, 90, 99, 100]) * 1e3).round(4).tolist())),
+        cpu_s=round(cpu_s, 4), peak_memory_mb=round(peak_bytes / 2**20, 3))
+
+def measure(fun, n_blocks):
+    ''' Call fun(i) for each block, then once more with tracemalloc for the peak memory.'''
+    latencies = np.zeros(n_blocks)
+    cpu = time.process_time()
+    for i in range(n_blocks):
+        start = time.perf_counter()
+        fun(i)
+        latencies[i] = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    tracemalloc.start()
+    for i in range(min(n_blocks, 50)):
+        fun(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(latencies, cpu, peak)
+
+def make_messages(channelCount, sr, n, markersPerBlock=0):
+    ''' Bodies (without RDA header) of n data messages.'''
+    source = RandomWalkSource(channelCount, sr)
+    points = int(sr / BLOCKS_PER_S)
+    messages = []
+    for block in range(n):
+        data, _ = source.read(points)
+        markers = dict(position=list(range(markersPerBlock)), points=[1]*markersPerBlock,
+            channel=[-1]*markersPerBlock, type=['Stimulus']*markersPerBlock,
+            description=['S 10']*markersPerBlock)
+        messages.append(bytearray(encode_data(block, data, markers)[24:]))
+    return messages
+
+def bench_decode(channelCount, sr, n_blocks):
+    messages = make_messages(channelCount, sr, 16)
+    def fun(i):
+        _, _, _, data, _ = decode_data_block(messages[i % 16], channelCount)
+        # Copy like Gather.GetData (float32 data memory)
+        np.array(data, dtype=np.float32)
+    return measure(fun, n_blocks)
+
+def bench_insert(channelCount, sr, n_blocks):
+    points = int(sr / BLOCKS_PER_S)
+    capacity = MEMORY_S * sr
+    block = np.random.randn(channelCount, points).astype(np.float32)
+    buffer = RingBuffer(capacity, channelCount, dtype=np.float32)
+    results = dict(ringbuffer=measure(lambda i: buffer.write(block, tag=i), n_blocks))
+    memory = np.full((channelCount, capacity), np.nan, dtype=np.float32)
+    def legacy(i):
+        nonlocal memory
+        memory = util.insert(memory, block)
+    results['util_insert'] = measure(legacy, n_blocks)
+    return results
+
+def bench_markers(channelCount, sr, n_blocks, markersPerBlock=8):
+    messages = make_messages(channelCount, sr, 16, markersPerBlock=markersPerBlock)
+    offset = 12 + 4 * channelCount * int(sr / BLOCKS_PER_S)
+    return measure(lambda i: decode_markers(messages[i % 16], offset, markersPerBlock), n_blocks)
+
+def serve(con, channelCount, sr, n_blocks):
+    ''' Replay server process for the ingest benchmark.'''
+    source = SyntheticSource(channelCount, sr, markerIntervalS=2.0)
+    server = RDAReplayServer(source, host='127.0.0.1', port=0, speed=None,
+        durationS=n_blocks / BLOCKS_PER_S)
+    con.send(server.port)
+    server.serve_forever()
+
+def bench_ingest(channelCount, sr, n_blocks):
+    con, childCon = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(childCon, channelCount, sr, n_blocks), daemon=True)
+    process.start()
+    port = con.recv()
+    gatherer = Gather(port=port, ip='127.0.0.1')
+    # Second connection that is streamed to the end (like gather_data)
+    gatherer.fresh_init()
+    latencies = []
+    overflows = 0
+    cpu = time.process_time()
+    tracemalloc.start()
+    while gatherer.connected:
+        start = time.perf_counter()
+        lastBlock = gatherer.lastBlock
+        gatherer.main()
+        latencies.append(time.perf_counter() - start)
+        if lastBlock != -1 and gatherer.lastBlock > lastBlock + 1:
+            overflows += 1
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    cpu = time.process_time() - cpu
+    process.terminate()
+    result = summarize(latencies, cpu, peak)
+    result['samples'] = gatherer.buffer.sampleCount
+    result['overflows'] = overflows
+    result['recv'] = gatherer.recvStats
+    return result
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--channels', type=int, nargs='+', default=[8, 32, 64, 128, 256])
+    parser.add_argument('--sr', type=int, nargs='+', default=[500, 1000, 2000, 5000])
+    parser.add_argument('--blocks', type=int, default=500, help='blocks per measurement')
+    parser.add_argument('--output', default=None, help='json file (default: benchmarks/results/<commit>_<time>.json)')
+    parser.add_argument('--skip-ingest', action='store_true', help='skip the socket benchmark')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    report = dict(commit=commit, time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        python=platform.python_version(), numpy=np.__version__,
+        platform=platform.platform(), blocks_per_s=BLOCKS_PER_S, results=[])
+    print(f'{"channels":>8} {"sr":>6} {"stage":>22} {"blocks/s":>12} {"p50 [ms]":>9} {"p99 [ms]":>9} {"peak [MB]":>10}')
+    for channelCount in args.channels:
+        for sr in args.sr:
+            stages = dict(decode=bench_decode(channelCount, sr, args.blocks),
+                markers=bench_markers(channelCount, sr, args.blocks))
+            for name, result in bench_insert(channelCount, sr, args.blocks).items():
+                stages['insert_' + name] = result
+            if not args.skip_ingest:
+                stages['ingest'] = bench_ingest(channelCount, sr, args.blocks)
+            for name, r in stages.items():
+                print(f'{channelCount:>8} {sr:>6} {name:>22} {r["blocks_per_s"]:>12.0f} '
+                    f'{r["latency_ms"]["p50"]:>9.3f} {r["latency_ms"]["p99"]:>9.3f} {r["peak_memory_mb"]:>10.2f}')
+            report['results'].append(dict(channels=channelCount, sr=sr, stages=stages))
+
+    output = args.output
+    if output is None:
+        output = 'benchmarks/results/{}_{}.json'.format(commit or 'nocommit', time.strftime('%Y%m%d_%H%M%S'))
+    if os.path.dirname(output) != '' and not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results saved to {output}')
+
+if __name__ == '__main__':
+    main()
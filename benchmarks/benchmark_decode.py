@@ -0,0 +1,53 @@
+''' Micro-benchmark of the RDA data block decoder (Gather.GetData).
+
+Compares the former per-sample unpack decoder with the vectorized 
+np.frombuffer decoder on synthetic data messages.
+
+Usage: python benchmarks/benchmark_decode.py
+'''
+import sys; sys.path.insert(0, '../'); sys.path.insert(0, './')
+from struct import pack, unpack
+import timeit
+import numpy as np
+from octopus.gather.gather import decode_data_block
+
+
+def make_data_message(channelCount, points, block=0, markers=()):
+    ''' Build the body of an RDA data message (msgtype 4).'''
+    data = np.random.randn(points, channelCount).astype('<f4')
+    body = pack('<LLL', block, points, len(markers)) + data.tobytes()
+    for (position, typ, description) in markers:
+        strings = typ.encode('utf-8') + b'\x00' + description.encode('utf-8') + b'\x00'
+        body += pack('<LLLl', 16 + len(strings), position, 1, -1) + strings
+    return body
+
+def legacy_decode(rawdata, channelCount):
+    ''' Former decoder: one unpack call per sample and a list-of-lists transpose.'''
+    (block, points, markerCount) = unpack('<LLL', rawdata[:12])
+    data = []
+    for i in range(points * channelCount):
+        index = 12 + 4 * i
+        value = unpack('<f', rawdata[index:index+4])
+        data.append(value[0])
+    new_data = [list() for _ in range(channelCount)]
+    chan_idx = np.arange(len(data)) % channelCount
+    for i, dat in enumerate(data):
+        new_data[chan_idx[i]].append(dat)
+    return np.array(new_data)
+
+def main(sr=1000, blocks_per_s=50, channel_counts=(8, 32, 64, 128), repeats=20):
+    points = int(sr / blocks_per_s)
+    print(f'Decoding one block of {points} points ({sr} Hz, {blocks_per_s} blocks/s)')
+    print(f'{"channels":>8} {"legacy [ms]":>12} {"vectorized [ms]":>16} {"speedup":>8}')
+    for channelCount in channel_counts:
+        rawdata = bytearray(make_data_message(channelCount, points, markers=[(3, 'Stimulus', 'S 10')]))
+        # Both decoders must agree
+        new = np.ascontiguousarray(decode_data_block(rawdata, channelCount)[3], dtype=np.float64)
+        assert np.array_equal(legacy_decode(rawdata, channelCount), new)
+
+        t_legacy = min(timeit.repeat(lambda: legacy_decode(rawdata, channelCount), number=1, repeat=repeats))
+        t_new = min(timeit.repeat(lambda: decode_data_block(rawdata, channelCount), number=1, repeat=repeats))
+        print(f'{channelCount:>8} {t_legacy*1e3:>12.3f} {t_new*1e3:>16.4f} {t_legacy/t_new:>7.0f}x')
+
+if __name__ == '__main__':
+    main()
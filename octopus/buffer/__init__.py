@@ -0,0 +1 @@
+from .buffer import *
\ No newline at end of file
@@ -0,0 +1,292 @@
+import numpy as np
+import time
+from multiprocessing import shared_memory
+
+class RingBuffer:
+    ''' Preallocated circular buffer of channels x samples with a write cursor.
+
+    Every write costs O(block) instead of re-allocating the whole memory. The
+    storage holds two copies of the ring back to back ("mirrored"), so that any
+    window of up to `capacity` samples can be handed out as a contiguous view
+    without copying.
+    Samples are addressed either relative to the newest sample (latest) or by
+    their absolute sample index, i.e. the number of samples written before them
+    since the buffer was created (range).
+    Writes are guarded by a sequence lock (seqlock): the sequence number is odd
+    while a write is in progress, so that readers on other threads or processes
+    can take consistent snapshots without a lock on the write path.
+    '''
+    # Number of int64 counters kept next to the storage: 
+    # [sampleCount, writeCount, sequence number, tag of the last write]
+    stateSize = 4
+
+    def __init__(self, capacity, channelCount=None, dtype=np.float64, fill=np.nan):
+        '''
+        Parameters:
+        -----------
+        capacity : int, number of samples (per channel) that are retained
+        channelCount : int/None, number of channels. If None the buffer is 1-D.
+        dtype : numpy.dtype, data type of the storage
+        fill : int/float, value of samples that were not written yet
+        '''
+        self.capacity = int(capacity)
+        self.channelCount = channelCount
+        self.dtype = np.dtype(dtype)
+        self.fill = fill
+        if channelCount is None:
+            shape = (2 * self.capacity,)
+        else:
+            shape = (int(channelCount), 2 * self.capacity)
+        self._allocate(shape)
+        self._storage[:] = fill
+        self._state[:] = 0
+
+    def _allocate(self, shape):
+        ''' Allocate the sample storage and the counters (state).'''
+        self._storage = np.empty(shape, dtype=self.dtype)
+        self._state = np.zeros(self.stateSize, dtype=np.int64)
+
+    @property
+    def sampleCount(self):
+        ''' Total number of samples written so far.'''
+        return int(self._state[0])
+
+    @sampleCount.setter
+    def sampleCount(self, value):
+        self._state[0] = value
+
+    @property
+    def writeCount(self):
+        ''' Total number of blocks written so far.'''
+        return int(self._state[1])
+
+    @property
+    def tag(self):
+        ''' Tag passed along with the last write (e.g. its block number).'''
+        return int(self._state[3])
+
+    @property
+    def cursor(self):
+        ''' Position in the ring at which the next sample will be written.'''
+        return self.sampleCount % self.capacity
+
+    @property
+    def firstSample(self):
+        ''' Absolute index of the oldest sample still held in the buffer.'''
+        return max(0, self.sampleCount - self.capacity)
+
+    def reset(self):
+        ''' Forget all data and start counting samples from zero again.'''
+        self._state[2] += 1
+        self._storage[:] = self.fill
+        self._state[[0, 1, 3]] = 0
+        self._state[2] += 1
+
+    def write(self, block, tag=None):
+        ''' Append a block of samples at the write cursor.
+        Parameters:
+        -----------
+        block : int/float/list/numpy.ndarray, single value or array of shape
+            (samples,) for 1-D buffers or (channels, samples) otherwise.
+        tag : int/None, stored along with the block and returned by snapshot()
+        '''
+        block = np.asarray(block, dtype=self.dtype)
+        if self.channelCount is None:
+            block = block.reshape(-1)
+        else:
+            assert block.ndim == 2 and block.shape[0] == self.channelCount, "block must be of shape ({}, samples) but is of shape {}".format(self.channelCount, block.shape)
+        n = block.shape[-1]
+        if n == 0:
+            return
+        # Odd sequence number: write in progress
+        self._state[2] += 1
+        if n > self.capacity:
+            # Only the newest samples fit in the ring
+            self.sampleCount += n - self.capacity
+            block = block[..., -self.capacity:]
+            n = self.capacity
+
+        start = self.cursor
+        stop = start + n
+        # Primary copy (may run into the mirror half, which is fine)
+        self._storage[..., start:stop] = block
+        # Mirror copy
+        split = min(stop, self.capacity) - start
+        if split > 0:
+            self._storage[..., start+self.capacity:start+self.capacity+split] = block[..., :split]
+        if split < n:
+            self._storage[..., :n-split] = block[..., split:]
+        self.sampleCount += n
+        self._state[1] += 1
+        if tag is not None:
+            self._state[3] = tag
+        self._state[2] += 1
+
+    def skip(self, n, tag=None):
+        ''' Append n samples of the fill value (e.g. NaN for a gap in the 
+        data). At most capacity samples are stored, the sample counter 
+        advances by n.
+        Parameters:
+        -----------
+        n : int, number of samples
+        tag : int/None, see write
+        '''
+        n = int(n)
+        if n <= 0:
+            return
+        if n < self.capacity:
+            shape = (n,) if self.channelCount is None else (self.channelCount, n)
+            self.write(np.full(shape, self.fill, dtype=self.dtype), tag=tag)
+            return
+        # The whole ring is overwritten
+        self._state[2] += 1
+        self._storage[:] = self.fill
+        self.sampleCount += n
+        self._state[1] += 1
+        if tag is not None:
+            self._state[3] = tag
+        self._state[2] += 1
+
+    def snapshot(self, n=None, start_sample=None):
+        ''' Consistent copy of the newest n samples taken with the sequence lock.
+        The copy is retried if a write happened in the meantime.
+        Parameters:
+        -----------
+        n : int/None, number of samples. If None the whole ring is copied. 
+            Samples that were not written yet are left out, so that data holds
+            at most sampleCount samples and first_sample is never negative.
+        start_sample : int/None, copy all samples from this absolute index on 
+            instead (at most the whole ring). n is ignored.
+
+        Return:
+        -------
+        data : numpy.ndarray, copy of the newest n samples, oldest sample first
+        first_sample : int, absolute index of the first sample in data
+        tag : int, tag of the last write contained in data
+        '''
+        n_requested = self.capacity if n is None else int(n)
+        assert 0 <= n_requested <= self.capacity, "n must be between 0 and {} but is {}".format(self.capacity, n_requested)
+        while True:
+            seq = self._state[2]
+            if seq % 2 == 1:
+                # Writer is busy, let it finish
+                time.sleep(0)
+                continue
+            sampleCount = int(self._state[0])
+            tag = int(self._state[3])
+            if start_sample is not None:
+                n = min(max(sampleCount - int(start_sample), 0), self.capacity, sampleCount)
+            else:
+                n = min(n_requested, sampleCount)
+            stop = sampleCount % self.capacity + self.capacity
+            data = self._storage[..., stop-n:stop].copy()
+            if self._state[2] == seq:
+                return data, sampleCount - n, tag
+
+    def offset(self, sample):
+        ''' Position of the sample with the given absolute index in ordered(). 
+        Negative if the sample was overwritten already.'''
+        return int(sample) - self.sampleCount + self.capacity
+
+    def ordered(self):
+        ''' Read-only view of the whole ring, oldest sample first.'''
+        return self.latest(self.capacity)
+
+    def latest(self, n):
+        ''' Read-only view of the newest n samples, oldest sample first.'''
+        n = int(n)
+        assert 0 <= n <= self.capacity, "n must be between 0 and {} but is {}".format(self.capacity, n)
+        stop = self.cursor + self.capacity
+        view = self._storage[..., stop-n:stop]
+        view.flags.writeable = False
+        return view
+
+    def range(self, start_sample, end_sample):
+        ''' Read-only view of the samples with absolute indices
+        start_sample <= i < end_sample.
+        '''
+        start_sample, end_sample = int(start_sample), int(end_sample)
+        assert start_sample <= end_sample, "start_sample ({}) must not be larger than end_sample ({})".format(start_sample, end_sample)
+        assert start_sample >= self.sampleCount - self.capacity and end_sample <= self.sampleCount, "samples {}-{} are not held in buffer (holding {}-{})".format(start_sample, end_sample, self.sampleCount - self.capacity, self.sampleCount)
+        stop = self.cursor + self.capacity - (self.sampleCount - end_sample)
+        view = self._storage[..., stop-(end_sample-start_sample):stop]
+        view.flags.writeable = False
+        return view
+
+
+class SharedRingBuffer(RingBuffer):
+    ''' RingBuffer whose storage and counters live in a 
+    multiprocessing.shared_memory block, so that it can be written by one 
+    process and read by others without copying or pickling.
+    The counters (sampleCount, writeCount) are shared as well, so readers can 
+    poll writeCount to see whether new blocks arrived.
+    '''
+    def __init__(self, capacity, channelCount=None, dtype=np.float64, fill=np.nan, 
+        name=None, create=True, readonly=False):
+        '''
+        Parameters:
+        -----------
+        capacity, channelCount, dtype, fill : see RingBuffer
+        name : str/None, name of the shared memory block. If None a unique name is 
+            chosen on creation.
+        create : bool, create the shared memory block (True) or attach to an 
+            existing one with the given name (False)
+        readonly : bool, hand out a read-only storage (for attaching readers)
+        '''
+        self.create = create
+        self.readonly = readonly
+        self.name = name
+        if create:
+            super(SharedRingBuffer, self).__init__(capacity, channelCount=channelCount, 
+                dtype=dtype, fill=fill)
+        else:
+            # Attach without touching the content
+            self.capacity = int(capacity)
+            self.channelCount = channelCount
+            self.dtype = np.dtype(dtype)
+            self.fill = fill
+            if channelCount is None:
+                shape = (2 * self.capacity,)
+            else:
+                shape = (int(channelCount), 2 * self.capacity)
+            self._allocate(shape)
+        if readonly:
+            self._storage.flags.writeable = False
+
+    def _allocate(self, shape):
+        stateBytes = self.stateSize * np.dtype(np.int64).itemsize
+        storageBytes = int(np.prod(shape)) * self.dtype.itemsize
+        if self.create:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, 
+                size=stateBytes + storageBytes)
+            self.name = self.shm.name
+        else:
+            self.shm = shared_memory.SharedMemory(name=self.name)
+        self._state = np.ndarray((self.stateSize,), dtype=np.int64, buffer=self.shm.buf)
+        self._storage = np.ndarray(shape, dtype=self.dtype, buffer=self.shm.buf, 
+            offset=stateBytes)
+
+    @classmethod
+    def attach(cls, info, readonly=False):
+        ''' Attach to a shared ring buffer created elsewhere.
+        Parameters:
+        -----------
+        info : dict, as returned by SharedRingBuffer.info()
+        readonly : bool, hand out a read-only storage
+        '''
+        return cls(info['capacity'], channelCount=info['channelCount'], dtype=info['dtype'],
+            fill=info['fill'], name=info['name'], create=False, readonly=readonly)
+
+    def info(self):
+        ''' Picklable description needed to attach to this buffer.'''
+        return dict(name=self.name, capacity=self.capacity, channelCount=self.channelCount, 
+            dtype=self.dtype.str, fill=self.fill)
+
+    def close(self, unlink=False):
+        ''' Release the shared memory. The creator should unlink it once all 
+        readers are done.'''
+        # Views on the shared memory must be gone before it can be closed
+        del self._state, self._storage
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
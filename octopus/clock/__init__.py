@@ -0,0 +1 @@
+from .clock import *
\ No newline at end of file
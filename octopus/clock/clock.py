@@ -0,0 +1,143 @@
+import time
+import numpy as np
+from octopus.buffer import RingBuffer
+
+# Host clock used for all arrival and event times
+host_clock = time.perf_counter
+
+class ClockModel:
+    ''' Online model of the amplifier clock as seen from the host.
+
+    The arrival time of every data block is regressed against the absolute 
+    sample count at its end with a robust (Huber) linear fit over a sliding 
+    window:
+
+        arrival = offset + slope * sample + delay
+
+    The slope is the duration of one sample in host seconds, so its deviation 
+    from 1/sr is the clock drift of the amplifier. The delay of each block 
+    (transport, buffering) is never smaller than that of the fastest blocks, 
+    so the lower envelope of the residuals (1st percentile) is taken as the 
+    time at which a sample was acquired. The estimated transport latency is 
+    the typical delay above that envelope; its spread is the jitter.
+    '''
+    def __init__(self, sr, windowSize=1500, refitInterval=50, huberK=1.345):
+        '''
+        Parameters:
+        -----------
+        sr : int/float, nominal sampling rate
+        windowSize : int, number of blocks in the fit (1500 = 30 s of blocks at 50/s)
+        refitInterval : int, refit after this many blocks (every block until then)
+        huberK : float, Huber threshold in robust standard deviations
+        '''
+        self.sr = sr
+        self.windowSize = windowSize
+        self.refitInterval = refitInterval
+        self.huberK = huberK
+        self.samples = RingBuffer(windowSize)
+        self.arrivals = RingBuffer(windowSize)
+        self.reset()
+
+    def reset(self):
+        ''' Forget all blocks, e.g. when the stream restarts.'''
+        self.samples.reset()
+        self.arrivals.reset()
+        # Reference time that keeps the fit well conditioned
+        self.t0 = None
+        # Host time of sample 0 (lower envelope) and seconds per sample
+        self.offset = None
+        self.slope = 1 / self.sr
+        self.residuals = np.zeros(0)
+        self.latency_s = None
+
+    def __len__(self):
+        return min(self.samples.sampleCount, self.windowSize)
+
+    def add(self, sample, arrivalTime=None):
+        ''' Add the arrival of a block.
+        Parameters:
+        -----------
+        sample : int, absolute sample count at the end of the block
+        arrivalTime : float/None, host time of arrival (default: now)
+
+        Return:
+        -------
+        lag_s : float, modelled acquisition time of the block minus its arrival
+            time, i.e. minus the delay of this block above the fastest blocks
+        '''
+        arrivalTime = host_clock() if arrivalTime is None else arrivalTime
+        if self.t0 is None:
+            self.t0 = arrivalTime
+        self.samples.write(sample)
+        self.arrivals.write(arrivalTime - self.t0)
+        n = self.samples.writeCount
+        if n < self.refitInterval or n % self.refitInterval == 0:
+            self.fit()
+        return self.sample_to_host_time(sample) - arrivalTime
+
+    def fit(self):
+        ''' Robust linear fit (iteratively reweighted least squares with Huber
+        weights) of the arrival times over the sample counts in the window.'''
+        n = len(self)
+        x = self.samples.latest(n)
+        y = self.arrivals.latest(n)
+        if n == 1:
+            self.offset = self.t0 + y[0] - self.slope * x[0]
+            self.residuals = np.zeros(1)
+            self.latency_s = 0.0
+            return
+        xMean = x.mean()
+        xc = x - xMean
+        weights = np.ones(n)
+        for _ in range(10):
+            sw = weights.sum()
+            yMean = (weights * y).sum() / sw
+            xw = (weights * xc).sum() / sw
+            denominator = (weights * (xc - xw)**2).sum()
+            slope = (weights * (xc - xw) * (y - yMean)).sum() / denominator if denominator > 0 else 1 / self.sr
+            intercept = yMean - slope * xw
+            residuals = y - intercept - slope * xc
+            # Robust scale (MAD)
+            scale = 1.4826 * np.median(np.abs(residuals - np.median(residuals))) + 1e-9
+            absolute = np.abs(residuals)
+            weights = np.minimum(1, self.huberK * scale / np.maximum(absolute, 1e-12))
+        envelope = np.percentile(residuals, 1)
+        self.slope = slope
+        self.offset = self.t0 + intercept + envelope - slope * xMean
+        self.residuals = residuals - envelope
+        self.latency_s = float(np.median(self.residuals))
+
+    @property
+    def driftPpm(self):
+        ''' Deviation of the amplifier clock from its nominal rate in ppm 
+        (positive = samples take longer than 1/sr on the host clock).'''
+        return (self.slope * self.sr - 1) * 1e6
+
+    def jitter(self, percentiles=(50, 95, 99)):
+        ''' Percentiles of the deviation of block arrivals from the typical 
+        delay in seconds.'''
+        if len(self.residuals) == 0:
+            return dict()
+        deviation = np.abs(self.residuals - np.median(self.residuals))
+        return dict(zip(['p{}'.format(p) for p in percentiles], np.percentile(deviation, percentiles).tolist()))
+
+    def sample_to_host_time(self, sample):
+        ''' Host time at which a sample (absolute index) was acquired.'''
+        if self.offset is None:
+            return np.nan
+        return self.offset + self.slope * np.asarray(sample, dtype=np.float64)
+
+    def host_time_to_sample(self, hostTime):
+        ''' Absolute index of the sample acquired at a host time (float).'''
+        if self.offset is None:
+            return np.nan
+        return (np.asarray(hostTime, dtype=np.float64) - self.offset) / self.slope
+
+    def mapping(self):
+        ''' (host time of sample 0, seconds per sample) of the current fit.'''
+        return (np.nan if self.offset is None else self.offset, self.slope)
+
+    def stats(self):
+        ''' Drift, latency and jitter of the current fit.'''
+        return dict(blocks=len(self), drift_ppm=float(self.driftPpm), latency_s=self.latency_s,
+            jitter_s=self.jitter())
@@ -2,6 +2,7 @@ from socket import AF_INET, SOCK_STREAM, gethostbyname, gethostname
 import socket
 from octopus import tcp
 import select
+from octopus.clock import host_clock
 import time
 
 class TCP:
@@ -63,6 +64,7 @@ class StimulusCommunication(TCP):
     def __init__(self, model, **kwargs):
         super(StimulusCommunication, self).__init__(**kwargs)
         self.model = model
+        self.responseTime = None
     
     def communication_routines(self):
         self.communicate_state()
@@ -86,6 +88,8 @@ class StimulusCommunication(TCP):
             # If connection is running
             try:
                 msg_libet = self.read_from_socket()
+                # Timestamp for locating the response in the data (see ClockModel)
+                self.responseTime = host_clock()
                 if msg_libet.decode(self.encoding) == self.model.targetMarker or self.model.targetMarker in msg_libet.decode(self.encoding):
                     print('Response!')                
                     self.model.checkState(recent_response=True)
@@ -0,0 +1 @@
+from .filters import *
\ No newline at end of file
@@ -0,0 +1,233 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+# Channels that are neither re-referenced nor EOG corrected
+non_eeg_channels = ['veog', 'res', 'resp', 'respiration']
+
+def split_channel_name(channelName):
+    ''' Split a namespaced channel name "<source>:<channel>" (see 
+    gather.MultiGather) into (source, channel). The source of plain names is "".'''
+    source, _, channel = channelName.rpartition(':')
+    return source, channel
+
+class SpatialFilter:
+    ''' Re-referencing and EOG correction compiled into a single 
+    channels x channels matrix, so that preprocessing a block is one matrix 
+    product:
+
+        clean = R @ E @ raw
+
+    E subtracts the EOG channel scaled by the regression weight (d) of each
+    channel, R subtracts the mean of the reference channels from every EEG 
+    channel of the same source (see split_channel_name). The filter is 
+    immutable - build a new one when settings change (see matches()).
+    '''
+    def __init__(self, channelNames, refChannels=None, eogChannel=None, eogWeights=None):
+        '''
+        Parameters:
+        -----------
+        channelNames : list, names of all channels in the order of the data
+        refChannels : list/None, names of the reference channels (None = no 
+            re-referencing)
+        eogChannel : str/None, name of the EOG channel
+        eogWeights : list/numpy.ndarray/None, EOG regression weight of each channel
+            (d_est). None disables the EOG correction.
+        '''
+        self.channelNames = list(channelNames)
+        self.refChannels = None if refChannels is None else list(refChannels)
+        self.eogChannel = eogChannel
+        self.eogWeights = None if eogWeights is None else np.array(eogWeights, dtype=np.float64)
+        channelCount = len(self.channelNames)
+        sources = np.array([split_channel_name(name)[0] for name in self.channelNames], dtype=object)
+        eeg = np.array([split_channel_name(name)[1].lower() not in non_eeg_channels for name in self.channelNames], dtype=bool)
+
+        # EOG correction
+        E = np.identity(channelCount)
+        if self.eogWeights is not None and eogChannel is not None:
+            assert eogChannel in self.channelNames, "EOG channel {} is not in the list of channels ({})".format(eogChannel, self.channelNames)
+            assert len(self.eogWeights) == channelCount, "eogWeights must have one weight per channel ({}) but has {}".format(channelCount, len(self.eogWeights))
+            weights = self.eogWeights * eeg
+            # The EOG channel is the regressor and stays untouched
+            weights[self.channelNames.index(eogChannel)] = 0
+            E[:, self.channelNames.index(eogChannel)] -= weights
+
+        # Re-referencing
+        R = np.identity(channelCount)
+        if self.refChannels:
+            missing = [name for name in self.refChannels if name not in self.channelNames]
+            assert len(missing) == 0, "Reference channels {} are not in the list of channels ({})".format(missing, self.channelNames)
+            refIndices = np.array([self.channelNames.index(name) for name in self.refChannels])
+            # Each amplifier is re-referenced to its own reference channels
+            for source in set(sources[refIndices]):
+                sourceRefs = refIndices[sources[refIndices] == source]
+                R[np.ix_(np.flatnonzero(eeg & (sources == source)), sourceRefs)] -= 1 / len(sourceRefs)
+
+        self.matrix = R @ E
+        self.isIdentity = np.array_equal(self.matrix, np.identity(channelCount))
+        # The matrix in the data type of the blocks, dtype -> matrix (see apply)
+        self.matrices = {self.matrix.dtype: self.matrix}
+
+    def matches(self, channelNames, refChannels=None, eogChannel=None, eogWeights=None):
+        ''' True if the filter was built from the given settings.'''
+        if list(channelNames) != self.channelNames:
+            return False
+        if (None if refChannels is None else list(refChannels)) != self.refChannels:
+            return False
+        if eogWeights is None or self.eogWeights is None:
+            return eogWeights is None and self.eogWeights is None
+        return eogChannel == self.eogChannel and np.array_equal(np.asarray(eogWeights, dtype=np.float64), self.eogWeights)
+
+    def apply(self, data):
+        ''' Filter a block of data (channels x time points). The result has the
+        data type of the block.'''
+        if self.isIdentity:
+            return data.copy()
+        matrix = self.matrices.get(data.dtype)
+        if matrix is None:
+            matrix = self.matrix.astype(data.dtype)
+            self.matrices = {**self.matrices, data.dtype: matrix}
+        return matrix @ data
+
+
+class FilterBank:
+    ''' Causal IIR filters (Butterworth, second-order sections) for several
+    named bands that are applied to every block as it arrives. The filter state
+    (zi) of each band and channel is carried from block to block, so the 
+    filtered streams are continuous and free of the edge effects of filtering
+    short epochs after the fact.
+    A channel is (re-)initialized at its first valid sample (steady state), 
+    i.e. at the start and after blocks containing NaN (gaps), which are passed 
+    on as NaN.
+    Coefficients and states are kept in float64 - the poles of low cut-off 
+    frequencies are too close to the unit circle for float32 - and the 
+    filtered blocks are returned in the data type of the input.
+    '''
+    def __init__(self, sr, channelCount, bands=None, order=2):
+        '''
+        Parameters:
+        -----------
+        sr : int/float, sampling rate
+        channelCount : int, number of channels
+        bands : dict/None, name -> (l_freq, h_freq) in Hz. l_freq=None gives a
+            low-pass, h_freq=None a high-pass filter.
+        order : int, default filter order
+        '''
+        self.sr = sr
+        self.channelCount = channelCount
+        self.order = order
+        self.bands = dict()
+        if bands is not None:
+            for name, (l_freq, h_freq) in bands.items():
+                self.add_band(name, l_freq, h_freq)
+
+    def add_band(self, name, l_freq, h_freq, order=None):
+        ''' Design the filter of a band. Bands are replaced as a whole, so that
+        bands can be added while another thread is filtering.'''
+        order = self.order if order is None else order
+        nyquist = self.sr / 2
+        assert l_freq is not None or h_freq is not None, "Band {} needs l_freq or h_freq".format(name)
+        if l_freq is None:
+            sos = signal.butter(order, h_freq / nyquist, btype='lowpass', output='sos')
+        elif h_freq is None:
+            sos = signal.butter(order, l_freq / nyquist, btype='highpass', output='sos')
+        else:
+            assert l_freq < h_freq, "l_freq ({}) must be lower than h_freq ({})".format(l_freq, h_freq)
+            sos = signal.butter(order, [l_freq / nyquist, h_freq / nyquist], btype='bandpass', output='sos')
+        band = dict(freqs=(l_freq, h_freq), sos=sos, 
+            # Steady state response to a unit step, scaled by the first sample
+            ziStep=signal.sosfilt_zi(sos)[:, np.newaxis, :],
+            zi=np.zeros((sos.shape[0], self.channelCount, 2)),
+            ready=np.zeros(self.channelCount, dtype=bool))
+        bands = dict(self.bands)
+        bands[name] = band
+        self.bands = bands
+
+    def reset(self):
+        ''' Start all filters afresh with the next block.'''
+        for band in self.bands.values():
+            band['ready'][:] = False
+
+    def process(self, data):
+        ''' Filter a block (channels x time points) with all bands.
+        Return:
+        -------
+        filtered : dict, name -> filtered block (channels x time points) in 
+            the data type of data
+        '''
+        bad = np.isnan(data).any(axis=1)
+        if bad.any():
+            data = np.where(bad[:, np.newaxis], 0, data)
+        filtered = dict()
+        for name, band in self.bands.items():
+            start = ~band['ready'] & ~bad
+            if start.any():
+                band['zi'][:, start] = band['ziStep'] * data[start, 0][np.newaxis, :, np.newaxis]
+            result, band['zi'] = signal.sosfilt(band['sos'], data, axis=-1, zi=band['zi'])
+            filtered[name] = result.astype(data.dtype, copy=False)
+            if bad.any():
+                filtered[name][bad] = np.nan
+            band['ready'] = ~bad
+        return filtered
+
+
+class Decimator:
+    ''' Streaming decimation by an integer factor with a linear phase FIR 
+    anti-aliasing filter. Only every factor-th output of the filter is 
+    computed (polyphase), on strided views of the input.
+    Output sample k is aligned with input sample k * factor: the group delay 
+    of the filter (delay output samples) is compensated by holding back the 
+    newest outputs, so the decimated stream keeps the absolute sample indices 
+    of the input (divided by factor) at the cost of delay / rate seconds 
+    latency. Gaps (NaN) spread over the length of the filter.
+    '''
+    def __init__(self, factor, channelCount, delay=10):
+        '''
+        Parameters:
+        -----------
+        factor : int, ratio of input and output sampling rate
+        channelCount : int, number of channels
+        delay : int, half length of the filter in output samples (the filter 
+            has 2 * delay * factor + 1 taps)
+        '''
+        assert int(factor) == factor and factor >= 1, "factor must be a positive integer but is {}".format(factor)
+        self.factor = int(factor)
+        self.channelCount = channelCount
+        self.delay = delay if self.factor > 1 else 0
+        # Cut-off at the new Nyquist frequency (like scipy.signal.decimate)
+        self.taps = signal.firwin(2 * self.delay * self.factor + 1, 1 / self.factor) if self.factor > 1 else np.ones(1)
+        self.reset()
+
+    def reset(self, inputCount=0):
+        ''' Start afresh at an absolute input sample index.
+        Parameters:
+        -----------
+        inputCount : int, absolute index of the next input sample
+        '''
+        self.history = None
+        self.inputCount = int(inputCount)
+        # Absolute index of the next output sample
+        self.outputCount = -(-self.inputCount // self.factor)
+
+    def process(self, data):
+        ''' Decimate the next block (channels x time points).
+        Return:
+        -------
+        decimated : numpy.ndarray, channels x new output samples (possibly none)
+        '''
+        if self.history is None:
+            # Start in the steady state of the first sample
+            self.history = np.repeat(data[:, :1], len(self.taps) - 1, axis=1)
+        x = np.concatenate([self.history, data], axis=1)
+        # The window starting at x[i] ends at input sample inputCount + i. Outputs
+        # are due at the input samples with index % factor == 0.
+        first = -self.inputCount % self.factor
+        windows = sliding_window_view(x, len(self.taps), axis=1)[:, first::self.factor]
+        # The FIR filter is short enough to be computed in the data type of the input
+        decimated = windows @ self.taps[::-1].astype(x.dtype, copy=False)
+        firstIndex = (self.inputCount + first) // self.factor - self.delay
+        decimated = decimated[:, max(self.outputCount - firstIndex, 0):]
+        self.outputCount += decimated.shape[1]
+        self.history = x[:, x.shape[1] - len(self.taps) + 1:]
+        self.inputCount += data.shape[1]
+        return decimated
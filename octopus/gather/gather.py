@@ -1,46 +1,648 @@
 import socket
-from struct import unpack
+import asyncio
+import multiprocessing
+import threading
+from multiprocessing import resource_tracker
+from struct import unpack, unpack_from
 import numpy as np
 import time
 from  octopus import util
-
-class Gather:
-    def __init__(self, port=51244, sockettimeout=0.1):
-        ''' 
+from octopus.buffer import RingBuffer, SharedRingBuffer
+from octopus.markers import MarkerStore
+from octopus.recorder import Recorder
+from octopus.replay import SyntheticSource
+from octopus.filters import SpatialFilter, FilterBank, Decimator
+from octopus.clock import ClockModel, host_clock
+from octopus.history import TieredHistory
+from octopus.quality import SignalQuality, quality_metrics, quality_from_matrix
+
+
+def split_string(raw):
+    ''' Split a raw array of zero terminated strings (C) into a list of 
+    python strings. A trailing fragment without terminator is dropped.
+    '''
+    return bytes(raw).decode('utf-8').split('\x00')[:-1]
+
+def stream_name(clean=False, band=None):
+    ''' Name of the raw ('raw'), clean ('clean') or band filtered (band) data.'''
+    if band is not None:
+        return band
+    return 'clean' if clean else 'raw'
+
+def decode_markers(rawdata, offset, markerCount):
+    ''' Decode the marker section of an RDA data message into columns.
+    Parameters:
+    -----------
+    rawdata : bytes/bytearray/memoryview, body of the data message
+    offset : int, byte position where the marker section starts
+    markerCount : int, number of markers in the message
+    
+    Return:
+    -------
+    markers : dict of lists with keys 'position' (relative to the block), 
+        'points', 'channel', 'type' and 'description'
+    '''
+    markers = dict(position=[], points=[], channel=[], type=[], description=[])
+    if markerCount == 0:
+        return markers
+    raw = memoryview(rawdata)
+    for _ in range(markerCount):
+        (markersize, position, points, channel) = unpack_from('<LLLl', raw, offset)
+        typedesc = split_string(raw[offset+16:offset+markersize])
+        markers['position'].append(position)
+        markers['points'].append(points)
+        markers['channel'].append(channel)
+        markers['type'].append(typedesc[0])
+        markers['description'].append(typedesc[1])
+        offset += markersize
+    return markers
+
+def decode_data_block(rawdata, channelCount):
+    ''' Decode the body of an RDA data message (msgtype 4) without per-sample 
+    python calls. The float payload is viewed in place with np.frombuffer and 
+    reshaped from the multiplexed (points x channels) layout to channels x points.
+    Parameters:
+    -----------
+    rawdata : bytes/bytearray/memoryview, body of the data message
+    channelCount : int, number of channels announced in the header message
+    
+    Return:
+    -------
+    block : int, block counter of the amplifier
+    points : int, number of data points per channel
+    markerCount : int, number of markers
+    data : numpy.ndarray, channels x points float32 view on rawdata
+    markers : dict of lists, see decode_markers
+    '''
+    (block, points, markerCount) = unpack_from('<LLL', rawdata, 0)
+    nValues = points * channelCount
+    data = np.frombuffer(rawdata, dtype='<f4', count=nValues, offset=12)
+    data = data.reshape(points, channelCount).T
+    markers = decode_markers(rawdata, 12 + 4 * nValues, markerCount)
+    return (block, points, markerCount, data, markers)
+
+
+class MessageReader:
+    ''' Receives RDA messages with socket.recv_into into preallocated buffers 
+    that are reused across messages. The header and the body are returned as 
+    memoryviews on these buffers, i.e. they are only valid until the next 
+    message is read.
+    '''
+    headerSize = 24
+
+    def __init__(self, con, bufferSize=2**16):
+        '''
         Parameters:
         -----------
-        ip : str, IP adress of the PC that sends remote data access (RDA) of the brain 
-            vision recorder software
-        port : int, corresponding port (see above)
-        plot_interval : int/float, interval in seconds in which to update data stream plot
-            (affects DataMonitor class, method: .update())
-        targetMarker : str, marker of button press (deprecated)
+        con : socket.socket, connected socket
+        bufferSize : int, initial size of the body buffer in bytes. The buffer 
+            grows to the largest message seen.
+        '''
+        self.con = con
+        self._header = memoryview(bytearray(self.headerSize))
+        self._body = memoryview(bytearray(bufferSize))
+        self.reset_stats()
+
+    def reset_stats(self):
+        ''' Reset the receive counters.'''
+        self.statsStart = time.time()
+        self.bytesReceived = 0
+        self.syscalls = 0
+        self.messages = 0
+        # Syscalls of the message being received and of the last complete one
+        self.messageSyscalls = 0
+        self.lastMessageSyscalls = 0
+
+    def _recv_exactly(self, view):
+        ''' Fill the whole memoryview from the socket.'''
+        got = 0
+        size = len(view)
+        while got < size:
+            n = self.con.recv_into(view[got:], size - got)
+            self.syscalls += 1
+            self.messageSyscalls += 1
+            if n == 0:
+                raise RuntimeError("connection broken")
+            got += n
+        self.bytesReceived += size
+
+    def read_header(self):
+        ''' Receive a message header (24 bytes).'''
+        self.messageSyscalls = 0
+        self._recv_exactly(self._header)
+        return self._header
+
+    def read_body(self, size):
+        ''' Receive a message body of the given size in bytes.'''
+        if size > len(self._body):
+            # Grow to at least twice the size to avoid frequent re-allocations
+            self._body = memoryview(bytearray(max(size, 2*len(self._body))))
+        view = self._body[:size]
+        self._recv_exactly(view)
+        self.messages += 1
+        # Published once the message is complete (stats may be polled meanwhile)
+        self.lastMessageSyscalls = self.messageSyscalls
+        return view
+
+    def read_message(self):
+        ''' Receive one complete message.
+        Return:
+        -------
+        msgtype : int, 1=start, 2=data (16 bit), 3=stop, 4=data (32 bit float)
+        body : memoryview, message body (without header)
+        '''
+        (id1, id2, id3, id4, msgsize, msgtype) = unpack_from('<llllLL', self.read_header())
+        return msgtype, self.read_body(msgsize - self.headerSize)
+
+    def stats(self):
+        ''' Summary of the receive counters since the last reset.'''
+        elapsed = max(time.time() - self.statsStart, 1e-9)
+        return dict(bytesPerSecond=self.bytesReceived / elapsed, 
+            syscallsPerMessage=self.syscalls / max(self.messages, 1),
+            lastMessageSyscalls=self.lastMessageSyscalls,
+            bytesReceived=self.bytesReceived, syscalls=self.syscalls,
+            messages=self.messages)
+
+
+class StreamReader:
+    ''' Read access to the data memory (snapshot, since, wait_for_samples, 
+    ...), shared by Gather, DummyGather and ProcessGather. Expects buffer, 
+    cleanBuffer, bandBuffers, rateBuffers, blockBuffer, newData and sr.
+    '''
+    def rate_key(self, rate, clean=False, band=None):
+        ''' Key of a decimated stream in rateBuffers and the decimation factor 
+        (see subscribe). None if rate does not divide sr.'''
+        factor = self.sr / rate
+        if factor != int(factor) or factor <= 1:
+            return None, None
+        return (stream_name(clean, band), int(rate)), int(factor)
+
+    def snapshot(self, n=None, clean=False, band=None, rate=None):
+        ''' Consistent snapshot of the newest n samples of the data memory, safe to
+        call from other threads while data is gathered.
+        Parameters:
+        -----------
+        n : int/None, number of samples. If None the whole data memory is returned.
+        clean : bool, take the re-referenced and EOG corrected data instead of 
+            the raw data
+        band : str/None, take the clean data filtered in this band (see add_band)
+        rate : int/None, take the data decimated to this rate (see subscribe). 
+            n and the sample indices are in samples of that rate then.
+
+        Return:
+        -------
+        data : numpy.ndarray, channels x n copy of the data (fewer samples if 
+            less than n were received since the reset)
+        first_sample : int, absolute index of the first sample in data
+        last_block : int, block number of the last block in data
+        '''
+        return self.select_buffer(clean, band, rate).snapshot(n)
 
+    def since(self, start_sample, clean=False, band=None, rate=None):
+        ''' Consistent snapshot of all samples from the absolute sample index 
+        start_sample on. No searching is involved: the position in the memory 
+        follows from the sample counter. If start_sample was overwritten 
+        already, the data starts at the oldest sample held (see first_sample).
+        Parameters:
+        -----------
+        start_sample : int, absolute index of the first sample (e.g. the 
+            sampleCount of the last call)
+        clean, band, rate : see snapshot
+
+        Return:
+        -------
+        data : numpy.ndarray, channels x samples copy of the data
+        first_sample : int, absolute index of the first sample in data
+        last_block : int, block number of the last block in data
         '''
+        return self.select_buffer(clean, band, rate).snapshot(start_sample=start_sample)
+
+    @property
+    def sampleCount(self):
+        ''' Number of samples received since the memory was reset. Doubles as 
+        absolute index of the next sample.'''
+        return self.buffer.sampleCount
+
+    def wait_for_samples(self, sample_count, timeoutS=None):
+        ''' Block until the data memory holds sample_count samples, i.e. until
+        the sample with the absolute index sample_count - 1 arrived. Consumers
+        wake with the block that completes their window instead of polling.
+        Parameters:
+        -----------
+        sample_count : int, absolute sample index to wait for (exclusive)
+        timeoutS : float/None, maximum time to wait in seconds
 
+        Return:
+        -------
+        sampleCount : int, current sampleCount. Smaller than sample_count on a
+            timeout.
+        '''
+        with self.newData:
+            self.newData.wait_for(lambda: self.sampleCount >= sample_count, timeoutS)
+        return self.sampleCount
+
+    def sample_offset(self, sample):
+        ''' Position of an absolute sample index in dataMemory (negative if 
+        the sample is not held anymore).'''
+        return self.buffer.offset(sample)
+
+    def select_buffer(self, clean=False, band=None, rate=None):
+        ''' Ring buffer of the raw, clean or band filtered data at the full rate
+        or at a subscribed one (see subscribe).'''
+        if rate is not None and rate != self.sr:
+            return self.rateBuffers[(stream_name(clean, band), rate)]
+        if band is not None:
+            return self.bandBuffers[band]
+        if clean:
+            return self.cleanBuffer
+        return self.buffer
+
+    @property
+    def dataMemory(self):
+        ''' Data memory (channels x time points) in chronological order.'''
+        return self.buffer.ordered()
+
+    @property
+    def blockMemory(self):
+        ''' Block number of each block held in dataMemory in chronological order.'''
+        return self.blockBuffer.ordered()
+
+
+class GatherPipeline(StreamReader):
+    ''' Ingest pipeline of a stream, shared by Gather and DummyGather: 
+    preprocessing (spatial filter, filter bank, decimation), data memory, 
+    history, signal quality, markers, clock model and recorder. A block in 
+    self.data is passed on with process_block.
+    '''
+    def init_pipeline(self, dtype):
+        ''' Set up the attributes of the pipeline. The memory is allocated by
+        setup_pipeline once the stream properties are known.
+        Parameters:
+        -----------
+        dtype : numpy.dtype, see Gather
+        '''
         # Data handling
+        self.dtype = np.dtype(dtype)
         self.blocks_per_s = 50
         self.block_counter = 0
         self.dataMemoryDurS = 10  # seconds of data memory
+        self.historyDurS = 600  # seconds of compressed history behind it (see recall)
+        self.history = None
+        # Running signal quality per channel (see quality_summary)
+        self.quality = None
+        # Range of the amplifier in units of the resolution (e.g. 32768 for 16 
+        # bit), enables the clipping check of the signal quality. None: not known
+        self.rangeCodes = None
         self.block_dur_s = 1.0/self.blocks_per_s
         self.blockSize = None
         self.sr = None
 
-        # Preprocessing
-        self.refChannels = None
+        # Preprocessing (see update_spatial_filter)
+        self._refChannels = None
+        self.eogChannel = None
+        self.eogWeights = None
+        self.spatialFilter = None
+        # Causally filtered streams, name -> (l_freq, h_freq) (see add_band)
+        self.bands = dict(scp=(None, 0.5))
+        self.filterBank = None
+        self.bandBuffers = dict()
+        # Decimated streams, (stream, rate) -> RingBuffer/Decimator (see subscribe)
+        self.rateBuffers = dict()
+        self.decimators = dict()
         # Here the block number will be assigned to each piece of data in dataMemory
-        self.blockMemory = np.array([-1] * self.blocks_per_s * self.dataMemoryDurS)
+        self.blockBuffer = RingBuffer(self.blocks_per_s * self.dataMemoryDurS, dtype=int, fill=-1)
         self.startTime = None
         self.lag_s = None
-        self.lastBlock = -1
         self.first_block_ever = None
-        self.markerMemory = []
+        # Markers by absolute sample index
+        self.markerStore = MarkerStore()
+        # Raw data recorder, its file name and the number of the current file
+        # (see start_recording, restart_recording)
+        self.recorder = None
+        self.recordingPath = None
+        self.recordingSegment = 0
+        # Notified after each block (see wait_for_samples)
+        self.newData = threading.Condition()
+        self.newDataTime = None
+        # Amplifier clock vs. host clock (see ClockModel), set up with the stream
+        self.clock = None
+
+    def setup_pipeline(self):
+        ''' Derive block size etc. from sr and channelCount and set up the data
+        memory, filters and clock.'''
+        self.blockSize = int(self.block_dur_s * self.sr)  # data points per block
+        self.theoreticalLooptime = float(self.blockSize) / self.sr
+
+        self.dataMemorySize = self.dataMemoryDurS * self.blocks_per_s * self.blockSize  # number of data points in memory
+        # Keep the memory across reconnects unless the channel layout changed
+        if not hasattr(self, 'buffer') or self.buffer.capacity != self.dataMemorySize or self.buffer.channelCount != self.channelCount:
+            self.buffer = RingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype)
+            self.cleanBuffer = RingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype)
+            self.bandBuffers = {name: RingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype) for name in self.bands}
+            self.history = TieredHistory(self.buffer, self.resolutions, 2 * self.blocks_per_s * self.blockSize, 
+                self.historyDurS * self.sr)
+            # The sample counter restarts
+            self.markerStore.reset()
+            self.restart_recording()
+            # Subscribed rates start afresh with the new layout
+            subscriptions = list(self.decimators)
+            self.rateBuffers, self.decimators = dict(), dict()
+            for name, rate in subscriptions:
+                self.subscribe(rate, clean=name == 'clean', band=None if name in ('raw', 'clean') else name)
+        self.filterBank = FilterBank(self.sr, self.channelCount, self.bands)
+        self.update_spatial_filter()
+        # A new stream starts: fit the clock afresh
+        self.clock = ClockModel(self.sr)
+        self.quality = SignalQuality(self.sr, self.resolutions, rangeCodes=self.rangeCodes)
+
+        self.data = np.array([np.nan] * int(self.blockSize))
+
+    def process_block(self, markers=None):
+        ''' Preprocess the block in self.data, add it to the data memory and 
+        store its markers.
+        Parameters:
+        -----------
+        markers : dict/None, marker columns 'position' (relative to the block), 
+            'points', 'channel', 'type' and 'description'
+        '''
+        # Preprocessing (rereferencing, ...)
+        self.preprocess_data()
+
+        self.block_counter += 1
+        blockStart = self.buffer.sampleCount
+        self.update_data()
+
+        # Store markers at their absolute sample index
+        if markers is not None:
+            samples = [blockStart + position for position in markers['position']]
+            self.markerStore.add(samples, markers['points'], markers['channel'],
+                markers['type'], markers['description'])
+            markers = dict(markers, sample=samples)
+        # stop_recording may run on another thread
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.push(self.data, markers)
+        self.notify_new_data()
+
+    def preprocess_data(self):
+        ''' Re-referencing and EOG correction of the current block in one matrix 
+        product (see filters.SpatialFilter), followed by the filter bank. The raw 
+        data is kept in self.data.'''
+        self.cleanData = self.spatialFilter.apply(self.data)
+        self.bandData = self.filterBank.process(self.cleanData)
+
+    def add_band(self, name, l_freq, h_freq):
+        ''' Continuously filter the clean data in another band, see 
+        snapshot(band=name).
+        Parameters:
+        -----------
+        name : str, name of the band
+        l_freq : float/None, lower edge in Hz (None = low-pass)
+        h_freq : float/None, upper edge in Hz (None = high-pass)
+        '''
+        self.bands = dict(self.bands, **{name: (l_freq, h_freq)})
+        if self.filterBank is None:
+            # Set up with the start message
+            return
+        bandBuffer = RingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype)
+        # Same absolute sample indices as the other buffers
+        bandBuffer.sampleCount = self.buffer.sampleCount
+        self.bandBuffers = dict(self.bandBuffers, **{name: bandBuffer})
+        self.filterBank.add_band(name, l_freq, h_freq)
+
+    def reset_memory(self):
+        ''' Empty all buffers and restart the filters.'''
+        self.blockBuffer.reset()
+        self.block_counter = 0
+        self.buffer.reset()
+        self.history.reset()
+        self.quality.reset()
+        self.cleanBuffer.reset()
+        for bandBuffer in self.bandBuffers.values():
+            bandBuffer.reset()
+        for key, decimator in self.decimators.items():
+            decimator.reset()
+            self.rateBuffers[key].reset()
+        self.filterBank.reset()
+        # Marker sample indices refer to the old sample counter
+        self.markerStore.reset()
+        self.restart_recording()
+        if self.clock is not None:
+            self.clock.reset()
+
+    def subscribe(self, rate, clean=False, band=None):
+        ''' Keep the raw, clean or band filtered data decimated to a lower 
+        rate as well (see filters.Decimator), so that consumers which do not 
+        need the full rate (plots, slow potentials) handle fewer samples. Sample 
+        k of the decimated stream is sample k * sr / rate of the full rate one.
+        Parameters:
+        -----------
+        rate : int, sampling rate in Hz. Must divide sr.
+        clean, band : see snapshot
+
+        Return:
+        -------
+        rate : int, rate to pass to snapshot/since. The full rate sr if rate 
+            does not divide it.
+        '''
+        key, factor = self.rate_key(rate, clean, band)
+        if key is None:
+            return self.sr
+        if key not in self.rateBuffers:
+            decimator = Decimator(factor, self.channelCount)
+            # Join at the current sample
+            decimator.reset(self.buffer.sampleCount)
+            rateBuffer = RingBuffer(self.dataMemorySize // factor, self.channelCount, dtype=self.dtype)
+            rateBuffer.sampleCount = decimator.outputCount
+            self.rateBuffers = {**self.rateBuffers, key: rateBuffer}
+            self.decimators = {**self.decimators, key: decimator}
+        return int(rate)
+
+    def update_rates(self, data, cleanData, bandData):
+        ''' Feed a block of all streams to the decimators (see subscribe).'''
+        for key, decimator in self.decimators.items():
+            name = key[0]
+            streamData = data if name == 'raw' else cleanData if name == 'clean' else bandData[name]
+            self.rateBuffers[key].write(decimator.process(streamData), tag=self.block_counter)
+
+    @property
+    def refChannels(self):
+        return self._refChannels
+
+    @refChannels.setter
+    def refChannels(self, refChannels):
+        self._refChannels = refChannels
+        self.update_spatial_filter()
+
+    def set_eog_correction(self, eogChannel, eogWeights):
+        ''' Subtract the EOG channel from all EEG channels in the clean data.
+        Parameters:
+        -----------
+        eogChannel : str, name of the EOG channel
+        eogWeights : list/numpy.ndarray/None, weight (d_est) of each channel. None 
+            disables the EOG correction.
+        '''
+        self.eogChannel = eogChannel
+        self.eogWeights = None if eogWeights is None else np.array(eogWeights, dtype=np.float64)
+        self.update_spatial_filter()
+
+    def update_spatial_filter(self):
+        ''' Rebuild the spatial filter if the channels or settings changed. The 
+        filter is swapped in one assignment, so settings can be changed from 
+        other threads while data is gathered.'''
+        if not hasattr(self, 'channelNames'):
+            # Channels are known after the start message
+            return
+        settings = (self.channelNames, self._refChannels, self.eogChannel, self.eogWeights)
+        if self.spatialFilter is None or not self.spatialFilter.matches(*settings):
+            self.spatialFilter = SpatialFilter(*settings)
+
+
+    def update_data(self):
+        ''' Collect new data and add it to the data memory.
+        Parameters:
+        -----------
+        data_package : numpy.ndarray/list, new data retrieved from rda.
+        '''
+        if self.blockSize is None:
+            self.blockSize = len(self.data)
+
+        assert self.blockSize == len(self.data.flatten()) / self.channelCount, "blockSize is supposed to be {} but data was of size {}".format(self.blockSize, len(self.data))
+        # Derived data first: a new tag in buffer means all are written
+        self.cleanBuffer.write(self.cleanData, tag=self.block_counter)
+        for name, data in self.bandData.items():
+            self.bandBuffers[name].write(data, tag=self.block_counter)
+        self.update_rates(self.data, self.cleanData, self.bandData)
+        self.quality.update(self.data, self.buffer.sampleCount)
+        self.buffer.write(self.data, tag=self.block_counter)
+        self.history.write(self.data)
+        self.blockBuffer.write(self.block_counter)
+
+    def notify_new_data(self):
+        ''' Wake all threads that wait for new data (see wait_for_samples).'''
+        with self.newData:
+            self.newDataTime = host_clock()
+            self.newData.notify_all()
+
+    def quality_summary(self):
+        ''' Running signal quality of each channel (see quality.SignalQuality.summarize). 
+        Cheap enough to be polled by the GUI.'''
+        return self.quality.summary
+
+    def recall(self, start_sample, end_sample=None):
+        ''' Raw samples from the absolute index start_sample on, reaching back 
+        up to historyDurS (see history.TieredHistory). Older samples are 
+        decompressed and quantized to the channel resolutions.
+        Parameters:
+        -----------
+        start_sample : int, absolute index of the first sample
+        end_sample : int/None, absolute index after the last sample (default:
+            the newest sample)
+
+        Return:
+        -------
+        data : numpy.ndarray, channels x samples copy of the data
+        first_sample : int, absolute index of the first sample in data
+        '''
+        return self.history.range(start_sample, end_sample)
+
+    def sample_to_host_time(self, sample):
+        ''' Host time (clock.host_clock) at which a sample (absolute index) was 
+        acquired according to the clock model. Use it to timestamp events.'''
+        return self.clock.sample_to_host_time(sample)
+
+    def host_time_to_sample(self, hostTime):
+        ''' Absolute index (float) of the sample acquired at a host time 
+        (clock.host_clock), e.g. of a button press.'''
+        return self.clock.host_time_to_sample(hostTime)
+
+    @property
+    def driftPpm(self):
+        ''' Clock drift of the amplifier in ppm (see ClockModel).'''
+        return np.nan if self.clock is None else self.clock.driftPpm
+
+    @property
+    def latency_s(self):
+        ''' Typical transport latency of the blocks (see ClockModel).'''
+        return None if self.clock is None else self.clock.latency_s
+
+    def start_recording(self, path):
+        ''' Continuously record the raw data stream to disk (see recorder.Recorder).
+        Parameters:
+        -----------
+        path : str, file name without extension
+        '''
+        self.stop_recording()
+        self.recordingPath = path
+        self.recordingSegment = 1
+        self.recorder = Recorder(path, self.channelNames, self.resolutions, self.sr, 
+            firstSample=self.sampleCount)
+
+    def restart_recording(self):
+        ''' Continue the recording in a new file after the sample counter 
+        restarted (reset_memory, new channel layout), so that sample i of each 
+        file stays the absolute sample firstSample + i of the stream and of its
+        markers. The files after the first one get the suffix _2, _3, ...'''
+        recorder = self.recorder
+        if recorder is None:
+            return
+        self.recorder = None
+        recorder.close()
+        if recorder.pushedSamples > recorder.firstSample:
+            self.recordingSegment += 1
+        # Otherwise the empty file is started again
+        path = self.recordingPath if self.recordingSegment == 1 \
+            else '{}_{}'.format(self.recordingPath, self.recordingSegment)
+        self.recorder = Recorder(path, self.channelNames, self.resolutions, self.sr, 
+            firstSample=self.sampleCount)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+
+
+class Gather(GatherPipeline):
+    def __init__(self, port=51244, sockettimeout=0.1, mode='blocking', 
+        reconnectDelayS=0.5, maxReconnectDelayS=10, ip=None, dtype=np.float32):
+        ''' 
+        Parameters:
+        -----------
+        ip : str, IP adress of the PC that sends remote data access (RDA) of the brain 
+            vision recorder software. Default: IP of this PC.
+        port : int, corresponding port (see above)
+        plot_interval : int/float, interval in seconds in which to update data stream plot
+            (affects DataMonitor class, method: .update())
+        targetMarker : str, marker of button press (deprecated)
+        mode : str, 'blocking' reads the RDA with a blocking socket. 'async' streams 
+            it with asyncio and reconnects automatically (see Gather.stream)
+        reconnectDelayS : float, first delay before reconnecting in async mode. 
+            It is doubled after each failed attempt.
+        maxReconnectDelayS : float, upper bound of the reconnect delay
+        dtype : numpy.dtype, data type of the data memory and of the blocks. 
+            RDA sends float32, so float32 halves memory and bandwidth without 
+            losing precision. Filter states and statistics are kept in float64.
+
+        '''
+        assert mode in ('blocking', 'async'), "mode must be 'blocking' or 'async' but is {}".format(mode)
+
+        # Data memory, preprocessing, markers etc. (see GatherPipeline)
+        self.init_pipeline(dtype)
+        self.lastBlock = -1
+        self.lastDataTime = None
+        # (first sample, number of samples) of each period without data
+        self.gaps = []
 
         # Data TCP Connection (with PC that sends RDA)
         self.connected = False
-        self.ip = socket.gethostbyname(socket.gethostname())
+        self.ip = socket.gethostbyname(socket.gethostname()) if ip is None else ip
         self.port = port
         self.sockettimeout = sockettimeout
+        self.mode = mode
+        self.connectTimeoutS = 2
+        self.reconnectDelayS = reconnectDelayS
+        self.maxReconnectDelayS = maxReconnectDelayS
+        self.running = False
         self.retryText = ('Try again?', 'Connection to Remote Data Access could not be established.')
         self.connect()
     
@@ -48,10 +650,22 @@ class Gather:
         ''' If connection failed it will prompt a dialog 
             to attempt it again.'''
 
+        if self.mode == 'async':
+            print(f'Attempting connection to RDA {self.ip} {self.port}...')
+            try:
+                asyncio.run(self.probe())
+                self.connected = True
+                print('\t...done.')
+                return True
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                self.connected = False
+                print('\t...failed.')
+                return False
 
         print(f'Attempting connection to RDA {self.ip} {self.port}...')
         self.con = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.con.settimeout(self.sockettimeout)
+        self.reader = MessageReader(self.con)
 
         try:
             self.con.connect((self.ip, self.port))
@@ -76,10 +690,7 @@ class Gather:
         
     def fresh_init(self):
         ''' Re-Do connection right before experiment.'''
-        self.blockMemory = np.array([-1] * self.blocks_per_s * self.dataMemoryDurS)
-        self.block_counter = 0
-        self.dataMemory = np.empty((self.channelCount, self.dataMemorySize))
-        self.dataMemory[:] = np.nan
+        self.reset_memory()
 
         # Close connection if there is one at all:
         if hasattr(self, 'con'):
@@ -93,72 +704,179 @@ class Gather:
         if not self.connected:
             return
         try:
-            # Get message header as raw array of chars
-            self.rawhdr = self.RecvData(24)
-
-            # Split array into usefull information id1 to id4 are constants
-            (id1, id2, id3, id4, msgsize, msgtype) = unpack('<llllLL', self.rawhdr)#.encode('utf-8', "replace"))
-
-            # Get data part of message, which is of variable size
-            self.rawdata = self.RecvData(msgsize - 24)
-
+            # Get message header and the data part of message, which is of variable 
+            # size. Both are parsed in place from the reader's buffers.
+            msgtype, self.rawdata = self.reader.read_message()
             # Perform action dependend on the message type
-            if msgtype == 1:
-                # Start message, extract eeg properties and display them
-                self.GetProperties()
-                # reset block counter
-                self.lastBlock = -1
-                print('#########################')
-                print("Starting Data Acquisition")
-                print("Number of channels: " + str(self.channelCount))
-                print("Sampling interval: " + str(self.samplingInterval))
-                print("Resolutions: " + str(self.resolutions))
-                print("Channel Names: " + str(self.channelNames))
-                print('#########################')
-                print('\n')
-
-                # Calculate some important values:
-                self.sr = int(1000 / (self.samplingInterval / 1000))  # Sampling rate
-                self.blockSize = int(self.block_dur_s * self.sr)  # data points per block
-                self.theoreticalLooptime = float(self.blockSize) / self.sr
-
-                self.dataMemorySize = self.dataMemoryDurS * self.blocks_per_s * self.blockSize  # number of data points in memory
-                self.dataMemory = np.empty((self.channelCount, self.dataMemorySize))
-                self.dataMemory[:] = np.nan
-
-                self.data = np.array([np.nan] * int(self.blockSize))
-
-            elif msgtype == 4:
-                # Data message, extract data and markers
-                self.GetData()
-                
-                # Check for overflow
-                if self.lastBlock != -1 and self.block > self.lastBlock + 1:
-                    print("*** Overflow with " + str(self.block - self.lastBlock) + " datablocks ***" )
-                self.lastBlock = self.block
-
-                # Lag Calculation        
-                if self.startTime is not None:
-                    endTime = time.time()
-                    measuredLoopTime = endTime - self.startTime
-                    calculatedEndTime = (self.theoreticalLooptime*(self.block-self.first_block_ever))  # (self.block_counter+1))
-                    self.lag_s = calculatedEndTime - measuredLoopTime
-                    # if self.lag_s > 0.05:
-                    #     print(self.lag_s)
-
-            elif msgtype == 3:
+            self.handle_message(msgtype)
+
+            if msgtype == 3:
                 # Stop message, terminate program
                 print("Stop")
                 self.quit()
         except OSError as err:
             print("Connection probably closed")
             self.connected = False
-   
+
+    def handle_message(self, msgtype):
+        ''' Process the message in self.rawdata according to its type.'''
+        arrivalTime = host_clock()
+        if msgtype == 1:
+            # Start message, extract eeg properties and display them
+            self.GetProperties()
+            # reset block counter
+            self.lastBlock = -1
+            print('#########################')
+            print("Starting Data Acquisition")
+            print("Number of channels: " + str(self.channelCount))
+            print("Sampling interval: " + str(self.samplingInterval))
+            print("Resolutions: " + str(self.resolutions))
+            print("Channel Names: " + str(self.channelNames))
+            print('#########################')
+            print('\n')
+            self.setup_memory()
+
+        elif msgtype == 4:
+            # Data message, extract data and markers
+            self.GetData()
+            
+            # Check for overflow
+            if self.lastBlock != -1 and self.block > self.lastBlock + 1:
+                print("*** Overflow with " + str(self.block - self.lastBlock) + " datablocks ***" )
+            self.lastBlock = self.block
+            self.lastDataTime = time.time()
+
+            # Lag of this block according to the clock model
+            self.lag_s = self.clock.add(self.buffer.sampleCount, arrivalTime)
+
+    def setup_memory(self):
+        ''' Derive the sampling rate from the stream properties (channelCount, 
+        samplingInterval) and set up the data memory, filters and clock (see
+        GatherPipeline.setup_pipeline).'''
+        self.sr = int(1000 / (self.samplingInterval / 1000))  # Sampling rate
+        self.setup_pipeline()
+
+    async def read_message_async(self, reader):
+        ''' Receive one complete message from an asyncio.StreamReader.
+        Return:
+        -------
+        msgtype : int, type of the message
+        '''
+        rawhdr = await reader.readexactly(MessageReader.headerSize)
+        (id1, id2, id3, id4, msgsize, msgtype) = unpack_from('<llllLL', rawhdr)
+        self.rawdata = await reader.readexactly(msgsize - MessageReader.headerSize)
+        return msgtype
+
+    async def probe(self):
+        ''' Connect to the RDA server asynchronously, read the properties from 
+        the start message and disconnect again.'''
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.ip, self.port), self.connectTimeoutS)
+        try:
+            while self.blockSize is None or self.sr is None:
+                msgtype = await asyncio.wait_for(self.read_message_async(reader), self.connectTimeoutS)
+                self.handle_message(msgtype)
+        finally:
+            writer.close()
+
+    async def stream(self):
+        ''' Stream messages from the RDA server until quit() is called. If the
+        connection is lost (e.g. Recorder was restarted) reconnection is 
+        attempted with exponential backoff. The data memory is kept and the 
+        time without data is filled with NaNs.'''
+        self.running = True
+        self.streamTask = asyncio.current_task()
+        self.streamLoop = asyncio.get_running_loop()
+        delay = self.reconnectDelayS
+        while self.running:
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.ip, self.port), self.connectTimeoutS)
+                delay = self.reconnectDelayS
+                while self.running:
+                    msgtype = await self.read_message_async(reader)
+                    if msgtype == 1 and self.lastDataTime is not None:
+                        self.handle_message(msgtype)
+                        self.insert_gap(time.time() - self.lastDataTime)
+                        # Re-anchor the lag calculation on the new block counter
+                        self.first_block_ever = None
+                        self.connected = True
+                        continue
+                    self.handle_message(msgtype)
+                    self.connected = True
+                    if msgtype == 3:
+                        print("Stop")
+                        break
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as err:
+                print(f"Connection to RDA {self.ip} {self.port} lost ({type(err).__name__}), retrying in {delay:.1f} s")
+            except asyncio.CancelledError:
+                self.running = False
+            finally:
+                if writer is not None:
+                    writer.close()
+            self.connected = False
+            if not self.running:
+                break
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                break
+            delay = min(delay * 2, self.maxReconnectDelayS)
+        self.running = False
+
+    def insert_gap(self, gap_s):
+        ''' Fill the data memory with NaN blocks for a period without data. All
+        sample counters advance by the whole gap, but only the part that fits 
+        into the memory is written (see RingBuffer.skip).
+        Parameters:
+        -----------
+        gap_s : float, duration of the gap in seconds
+        '''
+        nBlocks = int(round(gap_s / self.block_dur_s))
+        if nBlocks < 1:
+            return
+        print(f"Inserting gap of {nBlocks} blocks ({gap_s:.2f} s)")
+        nSamples = nBlocks * self.blockSize
+        gapStart = self.buffer.sampleCount
+        gapEnd = gapStart + nSamples
+        self.gaps.append((gapStart, nSamples))
+        self.block_counter += nBlocks
+        # Derived data first: a new tag in buffer means all are written
+        self.cleanBuffer.skip(nSamples, tag=self.block_counter)
+        for bandBuffer in self.bandBuffers.values():
+            bandBuffer.skip(nSamples, tag=self.block_counter)
+        for key, decimator in self.decimators.items():
+            # Decimation starts afresh after the gap
+            decimator.reset(gapEnd)
+            rateBuffer = self.rateBuffers[key]
+            rateBuffer.skip(decimator.outputCount - rateBuffer.sampleCount, tag=self.block_counter)
+        # The statistics have forgotten everything before the newest samples
+        n = min(nSamples, self.dataMemorySize)
+        self.quality.update(np.full((self.channelCount, n), np.nan, dtype=self.dtype), gapEnd - n)
+        # Filters start afresh after the gap
+        self.filterBank.reset()
+        # History before the hot buffer (see TieredHistory.skip)
+        self.history.skip(nSamples)
+        self.buffer.skip(nSamples, tag=self.block_counter)
+        recorder = self.recorder
+        if recorder is not None:
+            # Keep the recording aligned with the sample indices of the markers
+            recorder.push_gap(nSamples)
+        nWritten = min(nBlocks, self.blockBuffer.capacity)
+        self.blockBuffer.skip(nBlocks - nWritten)
+        self.blockBuffer.write(np.arange(self.block_counter - nWritten + 1, self.block_counter + 1))
+        self.notify_new_data()
+
     def gather_data(self):
         if not self.connected:
             # If connection to Remote Data Access was not established yet
             print("Gatherer is not connected.")
             return
+        if self.mode == 'async':
+            self.reset_memory()
+            asyncio.run(self.stream())
+            return
         self.fresh_init()
         while self.connected:
             # start = time.time()*1000
@@ -169,32 +887,20 @@ class Gather:
         # self.quit()
 
     def RecvData(self, requestedSize):
-        ''' Helper function for receiving whole message.'''
-        returnStream = bytearray()#''
-
-        while len(returnStream) < requestedSize:
-            databytes = self.con.recv(requestedSize - len(returnStream))
-
-            if str(databytes.decode('utf8', "replace")) == '':
-                raise RuntimeError("connection broken")
-            returnStream += databytes
-        return returnStream   
+        ''' Helper function for receiving whole message. The returned memoryview 
+        is only valid until the next message is received.'''
+        return self.reader.read_body(requestedSize)
+
+    @property
+    def recvStats(self):
+        ''' Bytes/s and syscalls per block of the socket reader.'''
+        return self.reader.stats()
     
     @staticmethod
     def SplitString(raw):
         ''' Helper function for splitting a raw array of
             zero terminated strings (C) into an array of python strings'''
-        stringlist = []
-        s = ""
-        raw = raw.decode('utf-8')
-        for i in range(len(raw)):
-            if raw[i] != '\x00':
-                s = s + raw[i]
-            else:
-                stringlist.append(s)
-                s = ""
-
-        return stringlist
+        return split_string(raw)
 
     def GetProperties(self):
         ''' Helper function for extracting eeg properties from a raw data array
@@ -203,11 +909,8 @@ class Gather:
         (self.channelCount, self.samplingInterval) = unpack('<Ld', self.rawdata[:12])
 
         # Extract resolutions
-        self.resolutions = []
-        for c in range(self.channelCount):
-            index = 12 + c * 8
-            restuple = unpack('<d', self.rawdata[index:index+8])
-            self.resolutions.append(restuple[0])
+        self.resolutions = np.frombuffer(self.rawdata, dtype='<f8', 
+            count=self.channelCount, offset=12).tolist()
 
         # Extract channel names
         self.channelNames = self.SplitString(self.rawdata[12 + 8 * self.channelCount:])
@@ -217,103 +920,604 @@ class Gather:
     def GetData(self):
         ''' Helper function for extracting eeg and marker data from a raw data array
             read from tcpip socket '''
-        # Extract numerical data
-        (self.block, self.points, self.markerCount) = unpack('<LLL', self.rawdata[:12])
+        # Extract numerical data, eeg data (chan x timepoints) and markers in one go
+        (self.block, self.points, self.markerCount, data, self.markers) = \
+            decode_data_block(self.rawdata, self.channelCount)
 
         if self.first_block_ever is None:
             self.first_block_ever = self.block
             self.startTime = time.time()
 
-        # Extract eeg data as array of floats
-        self.old_data = self.data.copy()
-        self.data = []
+        # Copy out of the receive buffer so that preprocessing may work in-place
+        self.data = np.array(data, dtype=self.dtype)
+        self.process_block(self.markers if self.markerCount > 0 else None)
 
-        for i in range(self.points * self.channelCount):
-            index = 12 + 4 * i
-            value = unpack('<f', self.rawdata[index:index+4])
-            self.data.append(value[0])
+    def quit(self):
+        self.stop_recording()
+        if self.mode == 'async':
+            self.running = False
+            if getattr(self, 'streamTask', None) is not None:
+                self.streamLoop.call_soon_threadsafe(self.streamTask.cancel)
+        else:
+            self.con.close()
+        self.connected = False
 
-        self.new_data = [list() for _ in range(self.channelCount)]
 
-        # reshape into chan x timepoints
-        chan_idx = np.arange(len(self.data)) % self.channelCount
+def gather_data_async(gatherers):
+    ''' Stream several Gather objects (mode='async') on one shared event loop.
+    Blocks until all of them were quit.
+    Parameters:
+    -----------
+    gatherers : list of Gather
+    '''
+    async def stream_all():
+        await asyncio.gather(*[gatherer.stream() for gatherer in gatherers])
+    for gatherer in gatherers:
+        gatherer.reset_memory()
+    asyncio.run(stream_all())
+
+
+class MultiGather(Gather):
+    ''' Merges several RDA streams (e.g. two amplifiers) into one logical 
+    stream with namespaced channel names ("<source name>:<channel name>").
+
+    Each source is read by its own Gather (mode='async') on one shared event
+    loop. The first source is the reference: its sampling rate, block size and
+    sample clock define the merged stream. The other sources are aligned to it
+    by a linear map of sample indices (see source_map), which is estimated from
+    markers that all amplifiers receive at the same time (syncMarker) or, 
+    without them, from the clock models of the sources (see ClockModel). 
+    Sources whose rate differs (nominally or by clock drift) are resampled by 
+    linear interpolation. Samples a source cannot provide (gaps, data that is
+    older than its memory) are NaN.
+
+    Merged blocks pass through the same pipeline as the blocks of a Gather 
+    (preprocessing, filter bank, markers, recorder), so MultiGather can be used
+    in place of a Gather.
+    '''
+    def __init__(self, sources, syncMarker=None, syncToleranceS=0.1, 
+        reconnectDelayS=0.5, maxReconnectDelayS=10, dtype=np.float32):
+        '''
+        Parameters:
+        -----------
+        sources : list of (name, ip, port), name is the prefix of the channel 
+            names of that source. The first source is the reference.
+        syncMarker : str/None, type or description of a marker that is sent to
+            all amplifiers at once (e.g. via a trigger splitter). None aligns 
+            the sources by their clock models only.
+        syncToleranceS : float, sync markers of two sources are paired if they
+            are at most this far apart according to the clock models
+        reconnectDelayS, maxReconnectDelayS : float, see Gather
+        dtype : numpy.dtype, see Gather
+        '''
+        assert len(sources) > 0, "MultiGather needs at least one source"
+        self.sourceNames = [name for name, _, _ in sources]
+        assert len(set(self.sourceNames)) == len(self.sourceNames), "Source names must be unique but are {}".format(self.sourceNames)
+        self.sources = [Gather(port=port, mode='async', ip=ip, reconnectDelayS=reconnectDelayS, 
+            maxReconnectDelayS=maxReconnectDelayS, dtype=dtype) for _, ip, port in sources]
+        self.syncMarker = syncMarker
+        self.syncToleranceS = syncToleranceS
+        # Reference sample index of the first merged sample (see merge)
+        self.refStart = None
+        super().__init__(port=None, mode='async', ip='', reconnectDelayS=reconnectDelayS,
+            maxReconnectDelayS=maxReconnectDelayS, dtype=dtype)
+        # Check for new data four times per block
+        self.mergeIntervalS = self.block_dur_s / 4
 
-        for i, dat in enumerate(self.data):
-            self.new_data[chan_idx[i]].append(dat)
-        self.data = np.array(self.new_data)
-        # Preprocessing (rereferencing, ...)
-        self.preprocess_data()
+    def connect(self):
+        ''' Combine the properties of the sources into those of the merged 
+        stream.'''
+        self.connected = all(source.connected for source in self.sources)
+        if not self.connected:
+            failed = [name for name, source in zip(self.sourceNames, self.sources) if not source.connected]
+            print(f'Sources {failed} could not be connected.')
+            return False
+        reference = self.sources[0]
+        self.channelNames = [f'{name}:{channelName}' for name, source in zip(self.sourceNames, self.sources) 
+            for channelName in source.channelNames]
+        self.channelCount = len(self.channelNames)
+        self.resolutions = [resolution for source in self.sources for resolution in source.resolutions]
+        # Index of the first channel of each source in the merged stream
+        self.channelOffsets = np.cumsum([0] + [source.channelCount for source in self.sources])[:-1]
+        self.samplingInterval = reference.samplingInterval
+        self.setup_memory()
+        print(f'Merging {len(self.sources)} sources ({self.channelCount} channels at {self.sr} Hz)')
+        return True
 
-        # print(self.data)
-        # print(self.data.shape)
-        # print(f'self.data = {self.data}, len={len(self.data)}')
-        # self.data = np.array(self.data).reshape(self.channelCount, int(len(self.data)/self.channelCount))
-        
-        # value = value / self.channelCount
-        self.block_counter += 1
-        self.update_data()
+    def reset_memory(self):
+        ''' Empty the memory of the merged stream and of all sources.'''
+        super().reset_memory()
+        for source in self.sources:
+            source.reset_memory()
+        self.refStart = None
+
+    async def stream(self):
+        ''' Stream all sources and merge their data until quit() is called. 
+        The sources reconnect on their own (see Gather.stream).'''
+        self.running = True
+        self.streamTask = asyncio.current_task()
+        self.streamLoop = asyncio.get_running_loop()
+        tasks = [asyncio.ensure_future(source.stream()) for source in self.sources]
         try:
-            if self.data == self.old_data:
-                print("Its a copy")
-        except:
+            while self.running:
+                await asyncio.sleep(self.mergeIntervalS)
+                self.connected = all(source.connected for source in self.sources)
+                self.merge()
+        except asyncio.CancelledError:
             pass
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def source_map(self, index):
+        ''' Linear map from sample indices of the reference to those of a source.
+        Parameters:
+        -----------
+        index : int, index of the source in self.sources
 
-        # Extract markers
-        self.markers = []
-        index = 12 + 4 * self.points * self.channelCount
-        for m in range(self.markerCount):
-            markersize = unpack('<L', self.rawdata[index:index+4])
-
-            ma = Marker()
-            (ma.position, ma.points, ma.channel) = unpack('<LLl', self.rawdata[index+4:index+16])
-            typedesc = self.SplitString(self.rawdata[index+16:index+markersize[0]])
-            ma.type = typedesc[0]
-            ma.description = typedesc[1]
-
-            self.markers.append(ma)
-            index = index + markersize[0]
-
-        # return (self.block, self.points, self.markerCount, self.data, self.markers)
-        if len(self.markers)>0:
-            if self.markers[0].description == "S 10":
-                self.markerMemory.extend(self.markers)
-            
-    def preprocess_data(self):
-        non_eeg_channels = ['veog', 'res', 'resp', 'respiration']
-        
-        # rereferencing
-        # if self.refChannels is not None:
-        #     self.refChannelsIndices = [self.channelNames.index(i) for i in self.refChannels]
-        #     # loop through channels
-        #     for i in range(self.data.shape[0]):
-        #         if any([elem == self.channelNames[i].lower() for elem in non_eeg_channels]):
-        #             continue
-        #         self.data[i, :] -= np.mean(self.data[self.refChannelsIndices, :], axis=0)
-        #         print("Subtracting shape: ", np.mean(self.data[self.refChannelsIndices, :], axis=0).shape, " from ", self.data[i,:].shape)
+        Return:
+        -------
+        sourceMap : tuple/None, (offset, ratio) such that 
+            sourceSample = offset + ratio * referenceSample. None if the clocks
+            are not fitted yet.
+        '''
+        reference, source = self.sources[0], self.sources[index]
+        if reference.clock is None or source.clock is None:
+            return None
+        refTime0, refPeriod = reference.clock.mapping()
+        time0, period = source.clock.mapping()
+        if np.isnan(refTime0) or np.isnan(time0):
+            return None
+        ratio = refPeriod / period
+        offset = (refTime0 - time0) / period
+        if self.syncMarker is not None:
+            refSamples, samples = self.sync_pairs(source, offset, ratio)
+            if len(refSamples) > 1:
+                ratio, offset = np.polyfit(refSamples, samples, 1)
+            elif len(refSamples) == 1:
+                offset = samples[0] - ratio * refSamples[0]
+        return offset, ratio
+
+    def sync_markers(self, gatherer):
+        ''' Sample indices of the sync markers held by a gatherer.'''
+        markers = gatherer.markerStore.markers_between(0, gatherer.sampleCount)
+        isSync = (markers['type'] == self.syncMarker) | (markers['description'] == self.syncMarker)
+        return markers['sample'][isSync]
+
+    def sync_pairs(self, source, offset, ratio):
+        ''' Pair the sync markers of the reference with those of a source. 
+        Each marker of the reference is paired with the closest marker of the 
+        source, if the clock models put them less than syncToleranceS apart.
+
+        Return:
+        -------
+        refSamples, samples : numpy.ndarray, sample indices of the paired 
+            markers in the reference and in the source
+        '''
+        refSamples = self.sync_markers(self.sources[0])
+        samples = self.sync_markers(source)
+        if len(refSamples) == 0 or len(samples) == 0:
+            return np.zeros(0), np.zeros(0)
+        predicted = offset + ratio * refSamples
+        # Left or right neighbour of each prediction, whichever is closer
+        right = np.clip(np.searchsorted(samples, predicted), 0, len(samples) - 1)
+        left = np.clip(right - 1, 0, len(samples) - 1)
+        closest = np.where(np.abs(samples[left] - predicted) <= np.abs(samples[right] - predicted), left, right)
+        paired = np.abs(samples[closest] - predicted) <= self.syncToleranceS * source.sr
+        return refSamples[paired].astype(np.float64), samples[closest[paired]].astype(np.float64)
+
+    def merge(self):
+        ''' Move all whole blocks that every source can provide to the merged
+        stream.'''
+        reference = self.sources[0]
+        sourceMaps = [(0., 1.)] + [self.source_map(index) for index in range(1, len(self.sources))]
+        if any(sourceMap is None for sourceMap in sourceMaps) or reference.sampleCount == 0:
+            return
+        # Reference positions of source samples, rounded so that the rounding
+        # errors of the fitted maps do not move the interval by a sample
+        toReference = lambda sample, offset, ratio: np.round((sample - offset) / ratio, 6)
+        if self.refStart is None:
+            # Start with the first sample all sources hold
+            starts = [int(np.ceil(toReference(source.buffer.firstSample, offset, ratio))) 
+                for source, (offset, ratio) in zip(self.sources, sourceMaps)]
+            self.refStart = max(starts)
+        # End of the interval all sources can provide (interpolation needs the 
+        # sample after each position)
+        end = min(int(np.floor(toReference(source.sampleCount - 1, offset, ratio))) + 1 
+            for source, (offset, ratio) in zip(self.sources, sourceMaps))
+        refSample = self.refStart + self.sampleCount
+        while end - refSample >= self.blockSize:
+            self.merge_block(refSample, sourceMaps)
+            refSample += self.blockSize
+        # Lag of the newest merged sample (see ClockModel.add)
+        self.lag_s = self.sample_to_host_time(self.sampleCount) - host_clock()
+
+    def merge_block(self, refSample, sourceMaps):
+        ''' Resample one block of every source to the reference samples 
+        refSample ... refSample + blockSize - 1 and process it.'''
+        refSamples = np.arange(refSample, refSample + self.blockSize, dtype=np.float64)
+        parts = []
+        markers = dict(position=[], points=[], channel=[], type=[], description=[])
+        for source, (offset, ratio), channelOffset in zip(self.sources, sourceMaps, self.channelOffsets):
+            parts.append(self.resample(source, offset + ratio * refSamples))
+            # Markers of the source that fall into this block
+            sourceMarkers = source.markerStore.markers_between(offset + ratio * (refSample - 0.5), 
+                offset + ratio * (refSample + self.blockSize - 0.5))
+            positions = np.round((sourceMarkers['sample'] - offset) / ratio).astype(int) - refSample
+            markers['position'].extend(np.clip(positions, 0, self.blockSize - 1).tolist())
+            markers['points'].extend(sourceMarkers['points'].tolist())
+            markers['channel'].extend([channel + channelOffset if channel >= 0 else channel 
+                for channel in sourceMarkers['channel'].tolist()])
+            markers['type'].extend(sourceMarkers['type'].tolist())
+            markers['description'].extend(sourceMarkers['description'].tolist())
+        # Interpolated in float64
+        self.data = np.concatenate(parts, axis=0).astype(self.dtype)
+        self.block = self.block_counter
+        if len(markers['position']) == 0:
+            self.process_block()
+            return
+        order = np.argsort(markers['position'], kind='stable')
+        self.process_block({key: [values[i] for i in order] for key, values in markers.items()})
 
+    @staticmethod
+    def resample(source, positions):
+        ''' Linearly interpolate the raw data of a source at fractional sample
+        indices.
+        Parameters:
+        -----------
+        source : Gather
+        positions : numpy.ndarray, (increasing) sample indices of the source
 
-    def update_data(self):
-        ''' Collect new data and add it to the data memory.
+        Return:
+        -------
+        data : numpy.ndarray, channels x len(positions), NaN where the source 
+            does not hold the data
+        '''
+        data = np.full((source.channelCount, len(positions)), np.nan)
+        # Rounding errors of the map must not move a position below a sample
+        positions = np.round(positions, 6)
+        i0 = np.floor(positions).astype(int)
+        valid = (i0 >= source.buffer.firstSample) & (i0 < source.sampleCount)
+        if not valid.any():
+            return data
+        start = i0[valid][0]
+        segment = source.buffer.range(start, min(i0[valid][-1] + 2, source.sampleCount))
+        left = i0[valid] - start
+        right = np.minimum(left + 1, segment.shape[1] - 1)
+        fraction = positions[valid] - i0[valid]
+        data[:, valid] = segment[:, left] + (segment[:, right] - segment[:, left]) * fraction
+        return data
+
+    def sample_to_host_time(self, sample):
+        ''' Host time at which a sample of the merged stream was acquired 
+        according to the clock of the reference (see Gather.sample_to_host_time).'''
+        if self.refStart is None:
+            return np.nan
+        return self.sources[0].sample_to_host_time(np.asarray(sample) + self.refStart)
+
+    def host_time_to_sample(self, hostTime):
+        ''' Absolute index of the sample of the merged stream acquired at a host
+        time (see Gather.host_time_to_sample).'''
+        if self.refStart is None:
+            return np.nan
+        return self.sources[0].host_time_to_sample(hostTime) - self.refStart
+
+    @property
+    def driftPpm(self):
+        ''' Clock drift of the reference amplifier in ppm.'''
+        return self.sources[0].driftPpm
+
+    @property
+    def latency_s(self):
+        return self.sources[0].latency_s
+
+
+def acquisition_process(con, status, newData, port, sockettimeout, dtype=np.float32):
+    ''' Entry point of the acquisition process started by ProcessGather. 
+    Connects a Gather to the RDA, moves its memory into the shared ring buffers
+    created by the parent and reads data until the parent sends "quit".
+    Parameters:
+    -----------
+    con : multiprocessing.connection.Connection, command pipe to the parent
+    status : multiprocessing.Array, shared [connected, lag_s, host time of sample 0,
+        seconds per sample, drift in ppm, latency_s, host time of the newest 
+        block] (see ClockModel)
+    newData : multiprocessing.Condition, notified after each block (see 
+        Gather.wait_for_samples)
+    port : int, RDA port
+    sockettimeout : float, socket timeout of the RDA connection
+    dtype : numpy.dtype, data type of the data memory (see Gather)
+    '''
+    gatherer = Gather(port=port, sockettimeout=sockettimeout, dtype=dtype)
+    if not gatherer.connected:
+        con.send(None)
+        return
+    con.send(dict(channelNames=gatherer.channelNames, channelCount=gatherer.channelCount,
+        resolutions=gatherer.resolutions, samplingInterval=gatherer.samplingInterval, 
+        sr=gatherer.sr, blockSize=gatherer.blockSize, dataMemorySize=gatherer.dataMemorySize,
+        blockMemorySize=gatherer.blockBuffer.capacity, bands=gatherer.bands))
+    def handle_command(command):
+        # Settings from the parent, e.g. ('setattr', 'refChannels', [...])
+        if command[0] == 'setattr':
+            setattr(gatherer, command[1], command[2])
+        elif command[0] == 'call':
+            getattr(gatherer, command[1])(*command[2])
+        elif command[0] == 'recall':
+            # Tagged with the number of the request (see ProcessGather.recall)
+            con.send((command[1], gatherer.recall(*command[2:])))
+
+    command = con.recv()
+    while command[0] in ('setattr', 'call'):
+        handle_command(command)
+        command = con.recv()
+    if command[0] != 'start':
+        gatherer.quit()
+        return
+    gatherer.buffer = SharedRingBuffer.attach(command[1])
+    gatherer.blockBuffer = SharedRingBuffer.attach(command[2])
+    gatherer.cleanBuffer = SharedRingBuffer.attach(command[3])
+    gatherer.bandBuffers = {name: SharedRingBuffer.attach(info) for name, info in command[4].items()}
+    gatherer.rateBuffers = {key: SharedRingBuffer.attach(info) for key, info in command[5].items()}
+    # The hot tier of the history is the shared data memory now
+    gatherer.history.hot = gatherer.buffer
+    qualityBuffer = SharedRingBuffer.attach(command[6])
+    try:
+        gatherer.fresh_init()
+        while gatherer.connected:
+            gatherer.main()
+            status[0] = 1
+            status[1] = np.nan if gatherer.lag_s is None else gatherer.lag_s
+            status[2:4] = gatherer.clock.mapping()
+            status[4] = gatherer.driftPpm
+            status[5] = np.nan if gatherer.latency_s is None else gatherer.latency_s
+            qualityBuffer.write(gatherer.quality.matrix().reshape(-1, 1))
+            if gatherer.newDataTime is not None and gatherer.newDataTime != status[6]:
+                # After the status, so that waiting consumers see the new values
+                status[6] = gatherer.newDataTime
+                with newData:
+                    newData.notify_all()
+            if con.poll():
+                command = con.recv()
+                if command[0] == 'quit':
+                    break
+                handle_command(command)
+    finally:
+        status[0] = 0
+        gatherer.stop_recording()
+        if gatherer.connected:
+            gatherer.quit()
+        gatherer.buffer.close()
+        gatherer.blockBuffer.close()
+        gatherer.cleanBuffer.close()
+        for bandBuffer in gatherer.bandBuffers.values():
+            bandBuffer.close()
+        for rateBuffer in gatherer.rateBuffers.values():
+            rateBuffer.close()
+        qualityBuffer.close()
+
+class ProcessGather(StreamReader):
+    ''' Runs the RDA acquisition (Gather) in a separate process, so that 
+    plotting and filtering in this process do not compete with it for the GIL.
+    The acquisition process writes into shared-memory ring buffers which are
+    owned by this process and handed out as read-only views (buffer, 
+    cleanBuffer, blockBuffer) - no copying or pickling of data. blockBuffer.writeCount 
+    lives in shared memory as well and signals progress.
+    '''
+    def __init__(self, port=51244, sockettimeout=0.1, startTimeoutS=10, dtype=np.float32):
+        '''
         Parameters:
         -----------
-        data_package : numpy.ndarray/list, new data retrieved from rda.
+        port : int, RDA port
+        sockettimeout : float, socket timeout of the RDA connection
+        startTimeoutS : float, time to wait for the acquisition process to connect
+        dtype : numpy.dtype, data type of the data memory (see Gather)
         '''
-        if self.blockSize is None:
-            self.blockSize = len(self.data)
+        self.dtype = np.dtype(dtype)
+        self.blocks_per_s = 50
+        self.dataMemoryDurS = 10
+        self.block_dur_s = 1.0/self.blocks_per_s
+        self.port = port
+        # The command pipe is used from several threads (see send)
+        self.conLock = threading.Lock()
+        # Number of the last recall request, replies carry it
+        self.recallId = 0
+        self._refChannels = None
+        self.connected = False
+        self.started = False
+        # Both processes must share one resource tracker, otherwise the child
+        # would remove the shared memory when it exits.
+        resource_tracker.ensure_running()
+        context = multiprocessing.get_context('spawn')
+        self.con, childCon = context.Pipe()
+        self.status = context.Array('d', [0] + [np.nan] * 6, lock=False)
+        # Notified by the acquisition process after each block (see wait_for_samples)
+        self.newData = context.Condition()
+        self.process = context.Process(target=acquisition_process, 
+            args=(childCon, self.status, self.newData, port, sockettimeout, self.dtype), daemon=True)
+        print(f'Starting acquisition process for RDA port {port}...')
+        self.process.start()
+        if not self.con.poll(startTimeoutS):
+            print('\t...failed (timeout).')
+            self.process.terminate()
+            return
+        info = self.con.recv()
+        if info is None:
+            print('\t...failed.')
+            self.process.join()
+            return
+        for key in ['channelNames', 'channelCount', 'resolutions', 'samplingInterval', 
+            'sr', 'blockSize', 'dataMemorySize']:
+            setattr(self, key, info[key])
+        self.theoreticalLooptime = float(self.blockSize) / self.sr
+        self.buffer = SharedRingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype, readonly=True)
+        self.cleanBuffer = SharedRingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype, readonly=True)
+        self.bands = dict(info['bands'])
+        self.bandBuffers = {name: SharedRingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype, readonly=True) 
+            for name in self.bands}
+        self.blockBuffer = SharedRingBuffer(info['blockMemorySize'], dtype=int, fill=-1, readonly=True)
+        self.rateBuffers = dict()
+        # Signal quality matrix (metrics x channels) as one column
+        self.qualityBuffer = SharedRingBuffer(1, len(quality_metrics) * self.channelCount, readonly=True)
+        self.connected = True
+        print('\t...done.')
+
+    @property
+    def refChannels(self):
+        return self._refChannels
+
+    @refChannels.setter
+    def refChannels(self, refChannels):
+        # Preprocessing happens in the acquisition process
+        self._refChannels = refChannels
+        self.send_setting('refChannels', refChannels)
+
+    def send(self, command):
+        ''' Send a command to the acquisition process, one thread at a time.'''
+        with self.conLock:
+            self.con.send(command)
+
+    def send_setting(self, name, value):
+        ''' Set an attribute of the Gather in the acquisition process.'''
+        if self.connected and self.process.is_alive():
+            self.send(('setattr', name, value))
+
+    def set_eog_correction(self, eogChannel, eogWeights):
+        ''' EOG correction of the clean data (see Gather.set_eog_correction).'''
+        if self.connected and self.process.is_alive():
+            eogWeights = None if eogWeights is None else list(eogWeights)
+            self.send(('call', 'set_eog_correction', (eogChannel, eogWeights)))
+
+    def add_band(self, name, l_freq, h_freq):
+        ''' Filter the clean data in another band (see Gather.add_band). Bands 
+        must be added before gather_data() is called.'''
+        assert not self.started, "Bands must be added before the acquisition starts"
+        self.bands = dict(self.bands, **{name: (l_freq, h_freq)})
+        if name not in self.bandBuffers:
+            self.bandBuffers[name] = SharedRingBuffer(self.dataMemorySize, self.channelCount, dtype=self.dtype, readonly=True)
+        self.send(('call', 'add_band', (name, l_freq, h_freq)))
+
+    def subscribe(self, rate, clean=False, band=None):
+        ''' Keep a stream decimated to a lower rate as well (see 
+        Gather.subscribe). Streams must be subscribed before gather_data() is
+        called.'''
+        key, factor = self.rate_key(rate, clean, band)
+        if key is None:
+            return self.sr
+        if key not in self.rateBuffers:
+            assert not self.started, "Rates must be subscribed before the acquisition starts"
+            self.rateBuffers[key] = SharedRingBuffer(self.dataMemorySize // factor, self.channelCount, 
+                dtype=self.dtype, readonly=True)
+            self.send(('call', 'subscribe', (rate, clean, band)))
+        return int(rate)
+
+    def start_recording(self, path):
+        ''' Record the raw data stream to disk from the acquisition process.'''
+        if self.connected and self.process.is_alive():
+            self.send(('call', 'start_recording', (path,)))
+
+    def stop_recording(self):
+        if self.connected and self.process.is_alive():
+            self.send(('call', 'stop_recording', ()))
+
+    @property
+    def lag_s(self):
+        lag = self.status[1]
+        return None if np.isnan(lag) else lag
+
+    @property
+    def block_counter(self):
+        return self.buffer.tag
+
+    def sample_to_host_time(self, sample):
+        ''' Host time at which a sample was acquired (see Gather.sample_to_host_time).'''
+        return self.status[2] + self.status[3] * np.asarray(sample, dtype=np.float64)
+
+    def host_time_to_sample(self, hostTime):
+        ''' Absolute index of the sample acquired at a host time (see 
+        Gather.host_time_to_sample).'''
+        return (np.asarray(hostTime, dtype=np.float64) - self.status[2]) / self.status[3]
+
+    @property
+    def driftPpm(self):
+        return self.status[4]
+
+    @property
+    def latency_s(self):
+        latency = self.status[5]
+        return None if np.isnan(latency) else latency
+
+    @property
+    def newDataTime(self):
+        ''' Host time at which the acquisition process published the newest block.'''
+        newDataTime = self.status[6]
+        return None if np.isnan(newDataTime) else newDataTime
+
+    def quality_summary(self):
+        ''' Running signal quality of each channel (see Gather.quality_summary),
+        published by the acquisition process after each message.'''
+        matrix, _, _ = self.qualityBuffer.snapshot(1)
+        if matrix.shape[1] == 0:
+            # Nothing published yet
+            matrix = np.full((len(quality_metrics) * self.channelCount, 1), np.nan)
+        return quality_from_matrix(matrix.reshape(len(quality_metrics), self.channelCount))
+
+    def recall(self, start_sample, end_sample=None, timeoutS=5):
+        ''' Raw samples reaching back up to historyDurS (see Gather.recall). The
+        history lives in the acquisition process, which sends the range over 
+        the command pipe. Replies to earlier requests that timed out are 
+        discarded.'''
+        with self.conLock:
+            if not self.connected or not self.process.is_alive():
+                return np.zeros((self.channelCount, 0), dtype=self.dtype), self.sampleCount
+            self.recallId += 1
+            self.con.send(('recall', self.recallId, start_sample, end_sample))
+            deadline = time.monotonic() + timeoutS
+            while self.con.poll(max(deadline - time.monotonic(), 0)):
+                recallId, result = self.con.recv()
+                if recallId == self.recallId:
+                    return result
+            return np.zeros((self.channelCount, 0), dtype=self.dtype), self.sampleCount
 
-        assert self.blockSize == len(self.data.flatten()) / self.channelCount, "blockSize is supposed to be {} but data was of size {}".format(self.blockSize, len(self.data))
-        self.dataMemory = util.insert(self.dataMemory, self.data)
-        self.blockMemory = util.insert(self.blockMemory, self.block_counter)
-        self.blockMemory = np.squeeze(self.blockMemory)
+    def gather_data(self):
+        ''' Start acquisition and block until the acquisition process ends.'''
+        if not self.connected:
+            print("Gatherer is not connected.")
+            return
+        self.started = True
+        self.send(('start', self.buffer.info(), self.blockBuffer.info(), self.cleanBuffer.info(), 
+            {name: bandBuffer.info() for name, bandBuffer in self.bandBuffers.items()},
+            {key: rateBuffer.info() for key, rateBuffer in self.rateBuffers.items()},
+            self.qualityBuffer.info()))
+        self.process.join()
+        self.connected = False
 
     def quit(self):
-        self.con.close()
+        if self.process.is_alive():
+            try:
+                self.send(('quit',))
+            except OSError:
+                pass
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
         self.connected = False
-
-
-class DummyGather:
+        if hasattr(self, 'buffer'):
+            self.buffer.close(unlink=True)
+            self.blockBuffer.close(unlink=True)
+            self.cleanBuffer.close(unlink=True)
+            for bandBuffer in self.bandBuffers.values():
+                bandBuffer.close(unlink=True)
+            for rateBuffer in self.rateBuffers.values():
+                rateBuffer.close(unlink=True)
+            self.qualityBuffer.close(unlink=True)
+            del self.buffer, self.blockBuffer, self.cleanBuffer, self.bandBuffers, self.rateBuffers, self.qualityBuffer
+
+
+class DummyGather(GatherPipeline):
     def __init__(self, port=51244, targetMarker='response',
-        sockettimeout=0.1):
+        sockettimeout=0.1, source=None, dtype=np.float32):
         ''' 
         Parameters:
         -----------
@@ -323,24 +1527,15 @@ class DummyGather:
         plot_interval : int/float, interval in seconds in which to update data stream plot
             (affects DataMonitor class, method: .update())
         targetMarker : str, marker of button press (deprecated)
+        source : SyntheticSource/None, generator of the dummy data (see 
+            replay.SyntheticSource). Any object with channelNames, resolutions, sr, 
+            reset() and read(n) works. Default: 7 channels at 1000 Hz incl. VEOG.
+        dtype : numpy.dtype, data type of the data memory (see Gather)
 
         '''
 
-        # Data handling
-        self.blocks_per_s = 50
-        self.block_counter = 0
-        self.dataMemoryDurS = 10  # seconds of data memory
-        self.block_dur_s = 1.0/self.blocks_per_s
-        self.blockSize = None
-        self.sr = None
-
-        # Preprocessing
-        self.refChannels = None
-        # Here the block number will be assigned to each piece of data in dataMemory
-        self.blockMemory = np.array([-1] * self.blocks_per_s * self.dataMemoryDurS)
-        self.startTime = None
-        self.lag_s = None
-        self.first_block_ever = None
+        # Data memory, preprocessing, markers etc. (see GatherPipeline)
+        self.init_pipeline(dtype)
 
         # Data TCP Connection (with PC that sends RDA)
         self.connected = False
@@ -349,21 +1544,17 @@ class DummyGather:
         self.sockettimeout = sockettimeout
         self.retryText = ('Try again?', 'Connection to Remote Data Access could not be established.')
         
+        if source is None:
+            source = SyntheticSource(channelNames=['Cz', 'leftBrain', 'rightBrain', 
+                'centerOfConsciousness', 'TP9', 'TP10', 'VEOG'], sr=1000, seed=None)
+        self.source = source
         # Calculate some important values:
         self.GetProperties()
         # reset block counter
         self.lastBlock = -1
 
-        self.sr = int(1000 / (self.samplingInterval / 1000))  # Sampling rate
-        self.blockSize = int(self.block_dur_s * self.sr)  # data points per block
-        self.theoreticalLooptime = float(self.blockSize) / self.sr
-
-        self.dataMemorySize = self.dataMemoryDurS * self.blocks_per_s * self.blockSize  # number of data points in memory
-        self.dataMemory = np.empty((self.channelCount, self.dataMemorySize))
-        self.dataMemory[:] = np.nan
-
-        self.data = np.array([np.nan] * int(self.blockSize))
-        self.d = 0.5
+        self.sr = int(self.source.sr)  # Sampling rate
+        self.setup_pipeline()
         self.connect()
         
     
@@ -379,31 +1570,23 @@ class DummyGather:
     
     def fresh_init(self):
         ''' Re-Do connection right before experiment.'''
-        self.blockMemory = np.array([-1] * self.blocks_per_s * self.dataMemoryDurS)
-        self.block_counter = 0
-        self.dataMemory = np.empty((self.channelCount, self.dataMemorySize))
-        self.dataMemory[:] = np.nan
-        self.startTime = time.time()
+        self.reset_memory()
+        self.source.reset()
+        self.startTime = time.perf_counter()
        
     def main(self):
         ''' Get data from Brain Vision RDA'''
         if not self.connected:
             return
         # Create Data and all that
-        start = time.time()
         self.GetData()
-        # Lag Calculation        
-        if self.startTime is not None:
-            endTime = time.time()
-            measuredLoopTime = endTime - self.startTime
-            calculatedEndTime = (self.theoreticalLooptime*(self.block-self.first_block_ever))  # (self.block_counter+1))
-            self.lag_s = calculatedEndTime - measuredLoopTime
-            
-
-        # wait a bit for next block of dummy data
-        end = time.time()
-        elapsed = end - start
-        time.sleep(np.clip((1/self.blocks_per_s) - elapsed, a_min=0, a_max=99999))
+        # Block n is due at an absolute deadline since the start, so that the time 
+        # spent generating data does not accumulate as drift.
+        deadline = self.startTime + self.theoreticalLooptime * (self.block - self.first_block_ever + 1)
+        # wait for the next block of dummy data
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
    
     def gather_data(self):
         if not self.connected:
@@ -416,119 +1599,41 @@ class DummyGather:
             self.main()
         self.quit()
 
-    def RecvData(self, requestedSize):
-        ''' Helper function for receiving whole message.'''
-        returnStream = bytearray()#''
-
-        while len(returnStream) < requestedSize:
-            databytes = self.con.recv(requestedSize - len(returnStream))
-
-            if str(databytes.decode('utf8', "replace")) == '':
-                raise RuntimeError("connection broken")
-            returnStream += databytes
-        return returnStream   
-    
     @staticmethod
     def SplitString(raw):
         ''' Helper function for splitting a raw array of
             zero terminated strings (C) into an array of python strings'''
-        stringlist = []
-        s = ""
-        raw = raw.decode('utf-8')
-        for i in range(len(raw)):
-            if raw[i] != '\x00':
-                s = s + raw[i]
-            else:
-                stringlist.append(s)
-                s = ""
-
-        return stringlist
+        return split_string(raw)
 
     def GetProperties(self):
-        ''' Helper function for extracting eeg properties from a raw data array
-            read from TCP IP socket'''
-        # Define channel names
-        self.channelNames = ['Cz', 'leftBrain', 'rightBrain', 'centerOfConsciousness', 'TP9', 'TP10', 'VEOG']
-        # Define numerical data
-        (self.channelCount, self.samplingInterval) = [len(self.channelNames), 1000]
-
-        # Extract resolutions
-        self.resolutions = [0.01] * self.channelCount
+        ''' Helper function for extracting eeg properties from the synthetic source'''
+        self.channelNames = list(self.source.channelNames)
+        # Sampling interval in µs
+        (self.channelCount, self.samplingInterval) = [len(self.channelNames), 1e6 / self.source.sr]
+        self.resolutions = list(self.source.resolutions)
   
     def GetData(self):
         ''' Helper function for extracting eeg and marker data from a raw data array
             read from tcpip socket '''
         # Extract numerical data
-        (self.block, self.points, self.markerCount) = (self.block_counter, self.blockSize, 0)
+        (self.block, self.points) = (self.block_counter, self.blockSize)
 
         if self.first_block_ever is None:
             self.first_block_ever = self.block
-            self.startTime = time.time()
-
-        # Extract eeg data as array of floats
-        self.data = np.cumsum(np.random.randn(self.channelCount, self.blockSize), axis=1)
-        for i in range(self.channelCount):
-            self.data[i, :] = np.cumsum(self.data[i, :])
-        # Preprocessing (rereferencing, ...)
-        self.preprocess_data()
-
-        # Some stochastically ocurring eye artifacts
-        if np.random.rand(1) < 0.05:
-            eog_idx = self.channelNames.index('VEOG')
-            self.data[eog_idx, :] = util.pulse(self.blockSize) * 50
-            for i in range(self.channelCount):
-                if i != eog_idx:
-                    self.data[i, :] += self.data[eog_idx, :] * self.d
-        
-        self.block_counter += 1
-        self.update_data()
+            self.startTime = time.perf_counter()
+
+        # All channels of the block in one go, markers like Gather.GetData
+        data, self.markers = self.source.read(self.blockSize)
+        self.markerCount = len(self.markers['position'])
+        self.data = np.asarray(data, dtype=self.dtype)
+        self.lag_s = self.clock.add(self.buffer.sampleCount + self.blockSize)
+        self.process_block(self.markers if self.markerCount > 0 else None)
     
-    def preprocess_data(self):
-        # rereferencing
-        if self.refChannels is not None:
-            self.refChannelsIndices = [self.channelNames.index(i) for i in self.refChannels]
-            # loop through channels
-            for i in range(self.data.shape[0]):
-                if self.channelNames[i] == 'VEOG':
-                    continue
-                self.data[i, :] -= np.mean(self.data[self.refChannelsIndices, :], axis=0)
-
-    def update_data(self):
-        ''' Collect new data and add it to the data memory.
-        Parameters:
-        -----------
-        data_package : numpy.ndarray/list, new data retrieved from rda.
-        '''
-        if self.blockSize is None:
-            self.blockSize = len(self.data)
-
-        assert self.blockSize == len(self.data.flatten()) / self.channelCount, "blockSize is supposed to be {} but data was of size {}".format(self.blockSize, len(self.data))
-        self.dataMemory = util.insert(self.dataMemory, self.data)
-        self.blockMemory = util.insert(self.blockMemory, self.block_counter)
-        self.blockMemory = np.squeeze(self.blockMemory)
-
     def quit(self):
+        self.stop_recording()
         self.con.close()
         self.connected = False
 
-class Marker:
-    ''' Little helper class to extract markers from Brain Vision Amp'''
-    def __init__(self):
-        self.position = 0
-        self.points = 0
-        self.channel = -1
-        self.type = ""
-        self.description = ""
-    
-    def pprint(self):
-        print(
-            "Position: ", self.position,
-            "\nPoints: ", self.points,
-            "\nChannel: ", self.channel,
-            "\nType: ", self.type,
-            "\nDescription: ", self.description,
-        )
-
 class DummyCon:
     def __init__(self):
         self.connected = False
@@ -245,6 +245,7 @@ class MainWindow(QMainWindow):
         ''' Toggle EOG correction on/off'''
         # Toggle EOG correction
         self.eog_toggle = not self.eog_toggle
+        self.toggle_EOG_correction = self.eog_toggle
         # Change Button label accordingly
         self.toggle_eog_button.setText(self.eog_toggle_text[int(self.eog_toggle)])
         # Change Button color accordingly
@@ -0,0 +1 @@
+from .history import *
\ No newline at end of file
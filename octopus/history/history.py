@@ -0,0 +1,181 @@
+import zlib
+from collections import deque
+import numpy as np
+
+# int16 code of missing samples (NaN)
+NAN_CODE = -32768
+
+class TieredHistory:
+    ''' Bounded long-term memory of a data stream in two tiers. The newest 
+    samples are read from the hot ring buffer of the gatherer (RAM), older 
+    ones from compressed chunks of chunkSize samples. A chunk is stored as 
+    int16 in units of the channel resolutions (relative to an offset per 
+    channel) and compressed with zlib. Chunks whose range does not fit into 
+    int16 are stored as zlib compressed float32 instead. The oldest chunks are
+    dropped once maxSamples are held, so memory stays bounded in long sessions.
+
+    write() is called by the acquisition, right after the block was written 
+    to the hot buffer. range() may be called from any thread: a sample leaves 
+    the hot buffer only after its chunk was compressed, so reading the hot 
+    buffer first and the chunks second never misses samples.
+    '''
+    def __init__(self, hot, resolutions, chunkSize, maxSamples, level=1):
+        '''
+        Parameters:
+        -----------
+        hot : RingBuffer, data memory of the gatherer (channels x time points)
+        resolutions : list of float, resolution of each channel (quantization step)
+        chunkSize : int, samples per compressed chunk. Must not exceed the 
+            capacity of the hot buffer.
+        maxSamples : int, number of samples held in compressed chunks
+        level : int, zlib compression level (1 = fastest)
+        '''
+        assert chunkSize <= hot.capacity, "chunkSize ({}) must not exceed the capacity of the hot buffer ({})".format(chunkSize, hot.capacity)
+        self.hot = hot
+        self.channelCount = hot.channelCount
+        self.resolutions = np.asarray(resolutions, dtype=np.float64).reshape(-1, 1)
+        self.chunkSize = int(chunkSize)
+        self.maxChunks = max(1, int(maxSamples) // self.chunkSize)
+        self.level = level
+        # Same data type as the hot buffer (quantization is done in float64)
+        self.staging = np.full((self.channelCount, self.chunkSize), np.nan, dtype=hot.dtype)
+        self.reset()
+
+    def reset(self):
+        ''' Forget all chunks. The next chunk starts at the next sample of the
+        hot buffer.'''
+        # New objects, so that readers holding the old ones are not affected
+        self.chunks = deque()
+        self.stagedCount = 0
+        # Absolute index of the first sample in staging
+        self.stagingStart = self.hot.sampleCount
+        self.compressedBytes = 0
+
+    def write(self, block):
+        ''' Stage a block (channels x time points) that was just written to the 
+        hot buffer. Full chunks are compressed.'''
+        n = block.shape[1]
+        position = 0
+        while position < n:
+            k = min(n - position, self.chunkSize - self.stagedCount)
+            self.staging[:, self.stagedCount:self.stagedCount + k] = block[:, position:position + k]
+            self.stagedCount += k
+            position += k
+            if self.stagedCount == self.chunkSize:
+                self.chunks.append(self.compress(self.staging, self.stagingStart))
+                self.compressedBytes += len(self.chunks[-1]['payload'])
+                if len(self.chunks) > self.maxChunks:
+                    self.compressedBytes -= len(self.chunks.popleft()['payload'])
+                self.stagingStart += self.chunkSize
+                self.stagedCount = 0
+
+    def skip(self, n):
+        ''' Stage n missing samples (NaN), e.g. a gap that is not written to 
+        the hot buffer as a whole (see RingBuffer.skip). Chunks that would be 
+        dropped right away are not created. Call it before the hot buffer 
+        skips, so that no sample leaves the hot buffer before its chunk exists.
+        '''
+        n = int(n)
+        # Complete the staged chunk
+        k = min(n, self.chunkSize - self.stagedCount) if self.stagedCount > 0 else 0
+        self.write(np.full((self.channelCount, k), np.nan, dtype=self.hot.dtype))
+        n -= k
+        wholeChunks = n // self.chunkSize
+        if wholeChunks > 0:
+            # All missing chunks compress to the same payload
+            chunk = self.compress(np.full((self.channelCount, self.chunkSize), np.nan), 0)
+            for i in range(max(wholeChunks - self.maxChunks, 0), wholeChunks):
+                self.chunks.append(dict(chunk, start=self.stagingStart + i * self.chunkSize))
+                self.compressedBytes += len(chunk['payload'])
+                if len(self.chunks) > self.maxChunks:
+                    self.compressedBytes -= len(self.chunks.popleft()['payload'])
+            self.stagingStart += wholeChunks * self.chunkSize
+        self.write(np.full((self.channelCount, n % self.chunkSize), np.nan, dtype=self.hot.dtype))
+
+    def compress(self, data, start):
+        ''' Compressed chunk of data (channels x chunkSize) starting at the 
+        absolute sample index start.'''
+        finite = np.isfinite(data)
+        # Center of the range of each channel (0 for channels without data), on
+        # the grid of the resolution so that amplifier data is kept losslessly
+        low = np.where(finite, data, np.inf).min(axis=1)
+        high = np.where(finite, data, -np.inf).max(axis=1)
+        empty = ~np.isfinite(low)
+        low[empty], high[empty] = 0, 0
+        offset = ((low + high) / 2).reshape(-1, 1)
+        offset = np.round(offset / self.resolutions) * self.resolutions
+        codes = np.round((data - offset) / self.resolutions)
+        if np.all(np.abs(np.where(finite, codes, 0)) < -NAN_CODE):
+            kind = 'int16'
+            codes = np.where(finite, codes, NAN_CODE).astype('<i2')
+        else:
+            kind = 'float32'
+            codes = data.astype('<f4')
+        return dict(start=start, kind=kind, offset=offset,
+            payload=zlib.compress(codes.tobytes(), self.level))
+
+    def decompress(self, chunk):
+        ''' Data (channels x chunkSize) of a chunk.'''
+        raw = zlib.decompress(chunk['payload'])
+        if chunk['kind'] == 'float32':
+            return np.frombuffer(raw, dtype='<f4').reshape(self.channelCount, self.chunkSize).astype(self.hot.dtype)
+        codes = np.frombuffer(raw, dtype='<i2').reshape(self.channelCount, self.chunkSize)
+        data = codes * self.resolutions + chunk['offset']
+        data[codes == NAN_CODE] = np.nan
+        return data
+
+    @property
+    def firstSample(self):
+        ''' Absolute index of the oldest sample held in either tier.'''
+        chunks = self.chunks
+        if len(chunks) > 0:
+            return min(chunks[0]['start'], self.hot.firstSample)
+        return self.hot.firstSample
+
+    def range(self, start_sample, end_sample=None):
+        ''' Samples start_sample ... end_sample - 1 from both tiers. Chunks are
+        decompressed on the fly.
+        Parameters:
+        -----------
+        start_sample : int, absolute index of the first sample. If it is not
+            held anymore, the data starts at the oldest sample held.
+        end_sample : int/None, absolute index after the last sample (default: 
+            the newest sample)
+
+        Return:
+        -------
+        data : numpy.ndarray, channels x samples copy of the data
+        first_sample : int, absolute index of the first sample in data
+        '''
+        start_sample = int(start_sample)
+        # Hot tier first (see class description)
+        hotData, hotFirst, _ = self.hot.snapshot(start_sample=start_sample)
+        chunks = list(self.chunks)
+        hotEnd = hotFirst + hotData.shape[1]
+        end_sample = hotEnd if end_sample is None else min(int(end_sample), hotEnd)
+        first_sample = hotFirst
+        if len(chunks) > 0 and start_sample < hotFirst:
+            first_sample = min(max(start_sample, chunks[0]['start']), hotFirst)
+        if end_sample <= first_sample:
+            return np.zeros((self.channelCount, 0), dtype=self.hot.dtype), first_sample
+        data = np.empty((self.channelCount, end_sample - first_sample), dtype=self.hot.dtype)
+        for chunk in chunks:
+            # Part of the chunk that is requested and not in the hot tier
+            start = max(chunk['start'], first_sample)
+            stop = min(chunk['start'] + self.chunkSize, hotFirst, end_sample)
+            if start >= stop:
+                continue
+            data[:, start - first_sample:stop - first_sample] = \
+                self.decompress(chunk)[:, start - chunk['start']:stop - chunk['start']]
+        if end_sample > hotFirst:
+            data[:, max(hotFirst - first_sample, 0):] = hotData[:, max(first_sample - hotFirst, 0):end_sample - hotFirst]
+        return data, first_sample
+
+    def stats(self):
+        ''' Summary of the compressed tier.'''
+        chunks = list(self.chunks)
+        rawBytes = len(chunks) * self.chunkSize * self.channelCount * np.dtype(self.hot.dtype).itemsize
+        return dict(chunks=len(chunks), samples=len(chunks) * self.chunkSize, 
+            compressedBytes=self.compressedBytes, 
+            ratio=rawBytes / self.compressedBytes if self.compressedBytes > 0 else np.nan,
+            float32Chunks=sum(chunk['kind'] == 'float32' for chunk in chunks))
@@ -0,0 +1 @@
+from .markers import *
\ No newline at end of file
@@ -0,0 +1,110 @@
+import numpy as np
+from octopus.buffer import RingBuffer
+
+class MarkerStore:
+    ''' Bounded store of markers keyed by their absolute sample index.
+
+    Markers are kept column-wise (struct of arrays) in ring buffers. Since 
+    markers arrive in chronological order the columns are sorted by sample 
+    index, so range queries are binary searches (O(log n)). Type and description
+    strings are stored as integer codes. All queries run on these columns, so 
+    the memory is bounded by capacity however many different labels arrive.
+    '''
+    def __init__(self, capacity=10000):
+        '''
+        Parameters:
+        -----------
+        capacity : int, number of markers that are retained. Older markers are 
+            dropped.
+        '''
+        self.capacity = int(capacity)
+        self.samples = RingBuffer(self.capacity, dtype=np.int64, fill=-1)
+        self.points = RingBuffer(self.capacity, dtype=np.int64, fill=0)
+        self.channels = RingBuffer(self.capacity, dtype=np.int64, fill=-1)
+        self.typeCodes = RingBuffer(self.capacity, dtype=np.int64, fill=-1)
+        self.descriptionCodes = RingBuffer(self.capacity, dtype=np.int64, fill=-1)
+        self.reset()
+
+    def reset(self):
+        ''' Remove all markers, e.g. when the sample counter of the data memory
+        restarts (the columns must stay sorted by sample index).'''
+        for column in (self.samples, self.points, self.channels, self.typeCodes, self.descriptionCodes):
+            column.reset()
+        # Lookup tables of the string codes
+        self.labels = []
+        self.labelCodes = dict()
+
+    def __len__(self):
+        return min(self.samples.sampleCount, self.capacity)
+
+    def code(self, label):
+        ''' Integer code of a type or description string.'''
+        if label not in self.labelCodes:
+            self.labelCodes[label] = len(self.labels)
+            self.labels.append(label)
+        return self.labelCodes[label]
+
+    def add(self, samples, points, channels, types, descriptions):
+        ''' Add the markers of one data block.
+        Parameters:
+        -----------
+        samples : list/numpy.ndarray, absolute sample index of each marker
+        points : list/numpy.ndarray, number of points each marker spans
+        channels : list/numpy.ndarray, channel of each marker (-1: all channels)
+        types : list of str, marker types (e.g. "Stimulus")
+        descriptions : list of str, marker descriptions (e.g. "S 10")
+        '''
+        if len(samples) == 0:
+            return
+        typeCodes = [self.code(t) for t in types]
+        descriptionCodes = [self.code(d) for d in descriptions]
+        self.samples.write(samples)
+        self.points.write(points)
+        self.channels.write(channels)
+        self.typeCodes.write(typeCodes)
+        self.descriptionCodes.write(descriptionCodes)
+
+    def markers_between(self, t0, t1):
+        ''' Markers with t0 <= sample < t1.
+        Parameters:
+        -----------
+        t0, t1 : int, absolute sample indices
+
+        Return:
+        -------
+        markers : dict of numpy.ndarray with keys 'sample', 'points', 'channel', 
+            'type' and 'description'
+        '''
+        n = len(self)
+        samples = self.samples.latest(n)
+        i0, i1 = np.searchsorted(samples, [t0, t1], side='left')
+        labels = np.array(self.labels, dtype=object)
+        return dict(sample=samples[i0:i1].copy(), 
+            points=self.points.latest(n)[i0:i1].copy(),
+            channel=self.channels.latest(n)[i0:i1].copy(),
+            type=labels[self.typeCodes.latest(n)[i0:i1]],
+            description=labels[self.descriptionCodes.latest(n)[i0:i1]])
+
+    def last_of_type(self, label, before=None):
+        ''' Sample index of the last marker with the given type or description.
+        Parameters:
+        -----------
+        label : str, marker type (e.g. "Stimulus") or description (e.g. "S 10")
+        before : int/None, only consider markers with sample < before
+
+        Return:
+        -------
+        sample : int/None, absolute sample index or None if there is no such marker
+        '''
+        if label not in self.labelCodes:
+            return None
+        code = self.labelCodes[label]
+        n = len(self)
+        samples = self.samples.latest(n)
+        i = n if before is None else np.searchsorted(samples, before, side='left')
+        # Markers of the label among those before
+        matches = np.flatnonzero((self.typeCodes.latest(n)[:i] == code) | 
+            (self.descriptionCodes.latest(n)[:i] == code))
+        if len(matches) == 0:
+            return None
+        return int(samples[matches[-1]])
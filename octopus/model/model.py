@@ -11,6 +11,7 @@ from octopus import neurofeedbackviz as nfv
 from octopus import util
 from octopus import workers
 from octopus import communication
+from octopus import quality
 
 import time
 import numpy as np
@@ -47,6 +48,18 @@ class Model(gui.MainWindow):
         self.avg_scp = None
         self.sd_scp = None
         self.toggle_EOG_correction = True
+        # Read the RDA in a separate process (see gather.ProcessGather)
+        self.acquisitionProcess = False
+        # Several amplifiers merged into one stream, list of (name, ip, port) 
+        # (see gather.MultiGather). Channel names are then "<name>:<channel>".
+        self.rdaSources = None
+        # Rates of the data monitor and of the SCP analysis. The gatherer 
+        # decimates the data to them (see gather.Gather.subscribe).
+        self.displayRate = 250
+        self.scpRate = 50
+        # Record the raw data stream of the session to recordings/ (opt-in, 
+        # files grow for the whole session)
+        self.recordRawData = False
         self.responded = False
         self.current_state = 0
         self.get_statelist()
@@ -85,10 +98,44 @@ class Model(gui.MainWindow):
         )
         self.EOGChannelIndex = self.gatherer.channelNames.index(self.EOGChannelName)
         self.d_est = np.zeros(len(self.gatherer.channelNames))
+        # Falls back to the full rate if a rate does not divide the sampling rate
+        self.displayRate = self.gatherer.subscribe(self.displayRate, clean=True)
+        self.scpRate = self.gatherer.subscribe(self.scpRate, clean=True)
+        self.gatherer.subscribe(self.scpRate, band='scp')
         self.handleChannelIndex() 
         self.fillChannelDropdown()
         self.init_plots()
 
+    @property
+    def d_est(self):
+        ''' EOG regression weight of each channel.'''
+        return self._d_est
+
+    @d_est.setter
+    def d_est(self, d_est):
+        self._d_est = d_est
+        self.update_spatial_filter()
+
+    @property
+    def toggle_EOG_correction(self):
+        return self._toggle_EOG_correction
+
+    @toggle_EOG_correction.setter
+    def toggle_EOG_correction(self, toggle):
+        self._toggle_EOG_correction = toggle
+        self.update_spatial_filter()
+
+    def update_spatial_filter(self):
+        ''' Hand the EOG correction settings to the gatherer, which compiles them
+        into the spatial filter of its clean data (see Gather.set_eog_correction).'''
+        if not hasattr(self, 'gatherer') or not hasattr(self, '_toggle_EOG_correction'):
+            return
+        eogWeights = self.d_est if self.toggle_EOG_correction else None
+        if eogWeights is not None and len(eogWeights) != self.gatherer.channelCount:
+            # Weights of a different channel layout (e.g. loaded state)
+            eogWeights = None
+        self.gatherer.set_eog_correction(self.EOGChannelName, eogWeights)
+
     def run(self):
         ''' When settings are entered, save them in the octopus.'''
         # Set Blinding
@@ -102,10 +149,17 @@ class Model(gui.MainWindow):
         # Objects 
         if self.simulated_data:
             self.gatherer = gather.DummyGather() 
+        elif self.rdaSources is not None:
+            self.gatherer = gather.MultiGather(self.rdaSources)
+        elif self.acquisitionProcess:
+            self.gatherer = gather.ProcessGather()
         else:
             self.gatherer = gather.Gather()
         
         self.set_info()
+        if self.recordRawData:
+            filename = "recordings/" + self.SubjectID + time.strftime("_%Y%m%d_%H%M%S")
+            self.gatherer.start_recording(filename)
 
         self.internal_tcp = communication.StimulusCommunication(self)
         
@@ -154,12 +208,13 @@ class Model(gui.MainWindow):
             return
 
         if self.gatherer.connected:
-            self.data_monitor = plot.DataMonitor(self.gatherer.sr, self.gatherer.blockSize, 
+            self.data_monitor = plot.DataMonitor(self.displayRate, 
+                self.gatherer.blockSize * self.displayRate // self.gatherer.sr, 
                 curve=self.curve1, widget=self.graphWidget1, title=self.title, 
                 viewChannel=self.viewChannel, EOGChannelIndex=self.EOGChannelIndex,
                 blinder=self.blinder)
             
-            self.hist_monitor = plot.HistMonitor(self.gatherer.sr, canvas=self.MplCanvas, 
+            self.hist_monitor = plot.HistMonitor(self.scpRate, canvas=self.MplCanvas, 
                 SCPTrialDuration=self.SCPTrialDuration, 
                 channelOfInterestIdx=self.channelOfInterestIdx,
                 EOGChannelIndex=self.EOGChannelIndex, blinder=self.blinder)
@@ -187,15 +242,26 @@ class Model(gui.MainWindow):
         if self.plotsReady:
             self.save()
             self.checkState()
+            self.show_signal_quality()
         else:
             # Don't rush if plots aren't ready yet
             time.sleep(0.25)
             self.init_plots()
 
+    def show_signal_quality(self):
+        ''' List the bad channels below the amplifier info (see quality.SignalQuality).'''
+        badChannels = quality.bad_channels(self.gatherer.quality_summary(), self.gatherer.channelNames)
+        text = f"{int(self.sampling_frequency)} Hz\n{self.number_of_channels} channels"
+        if len(badChannels) > 0:
+            text += "\nBad: " + ", ".join(badChannels)
+        if text != self.amp_info_text.text():
+            self.amp_info_text.setText(text)
+
     def response_triggered(self, result):
         ''' This function is called whenever the participant presses the button.'''
         if result:
-            self.hist_monitor.button_press(self.gatherer, self.d_est)
+            self.hist_monitor.button_press(self.gatherer, self.d_est, 
+                responseTime=self.internal_tcp.responseTime)
             self.hist_monitor.plot_hist(avg=self.avg_scp, sd=self.sd_scp)
             self.check_if_interview()
             if self.go_interview and (self.current_state == 1 or self.current_state == 3):
@@ -415,7 +481,10 @@ class Model(gui.MainWindow):
         print('\tRecording...')
         time.sleep(nsec)
         print('\t\t...done.')
-        return self.gatherer.dataMemory
+        # May reach back beyond the data memory (see Gather.recall)
+        data, _ = self.gatherer.recall(self.gatherer.sampleCount - int(nsec * self.gatherer.sr))
+        # The regression of the EOG weights is done in float64
+        return data.astype(np.float64)
 
     def plot_eog_results(self, results):
         print("\t...done.")
@@ -451,11 +520,14 @@ class Model(gui.MainWindow):
         plt.show()
 
     def startNeurofeedbacks(self):
-        # Frequency Band Power Neurofeedback:
+        # Frequency Band Power Neurofeedback (see neurofeedback.MetricRegistry):
         channelsOfInterest = ['Cz']
         freqs = (15, 30)  # low and high frequency for the bandpass filter
-        sr = self.gatherer.sr
-        fun = util.freq_band_power
-        self.NF_alpha = neurofeedback.BaseNeuroFeedback(fun, self.NFCanvas, self.threadpool, self.gatherer, freqs, sr, timeRangeProcessed=0.25, 
-            channelsOfInterest=channelsOfInterest)
+        registry = neurofeedback.MetricRegistry(self.gatherer.sr)
+        registry.register('beta', channelsOfInterest, freqs, windowS=0.25)
+        # Scored with every block on the newest 0.25 s, smoothed over the last 
+        # 2.5 s (scoreMemorySize) like 10 consecutive windows
+        scoreMemorySize = int(round(2.5 * self.gatherer.blocks_per_s))
+        self.NF_beta = neurofeedback.MetricNeuroFeedback(registry, self.NFCanvas, self.threadpool, 
+            self.gatherer, scoreMemorySize=scoreMemorySize)
      
\ No newline at end of file
@@ -1,13 +1,18 @@
 from  octopus import neurofeedbackviz as nfv
 from octopus import workers
+from octopus import util
+from octopus.clock import host_clock
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
 import numpy as np
-import time
 
 class BaseNeuroFeedback:
     ''' Process data and plot it on a canvas.'''
     def __init__(self, ProcessFunction, canvas, threadpool, gatherer, 
         *args, timeRangeProcessed=0.25, channelsOfInterest=None, 
-        scoreMemorySize=10, **kwargs):
+        scoreMemorySize=10, calibrationDurS=None, waitTimeoutS=1, latencyMemorySize=1000, 
+        multichannel=False, updateIntervalS=None, calibrationWidth=None, 
+        recalibrationIntervalS=None, recalibrationWeight=0.2, **kwargs):
         ''' 
         Parameters:
         -----------
@@ -15,10 +20,37 @@ class BaseNeuroFeedback:
         timeRangeProcessed : float, time in seconds 
         blocksPerSecond : int, number of blocks per second (given by Brain Vision RDA)
         indicesOfInterest : list, indices of electrodes on which the metric should be calculated
+        calibrationDurS : float/None, seconds of data the calibration is based 
+            on. None: the data memory of the gatherer (dataMemoryDurS), i.e. 
+            the calibration happens as soon as it is full. Longer periods are 
+            recalled from the history (see Gather.recall) and delay the first 
+            feedback until they are covered.
+        waitTimeoutS : float, maximum time update() waits for new data (see 
+            Gather.wait_for_samples)
+        latencyMemorySize : int, number of wake latencies kept for latency_stats
+        multichannel : bool, ProcessFunction takes all channels of interest at 
+            once (channels x time points) and returns the score averaged across
+            them (e.g. util.freq_band_power). Otherwise it is called per channel.
+        updateIntervalS : float/None, interval between two scores. Each score is
+            computed from the newest timeRangeProcessed seconds, so windows 
+            overlap if it is shorter. None: timeRangeProcessed (consecutive 
+            windows).
+        calibrationWidth : float/None, None: the calibration (minval, maxval, 
+            medianval) is the lowest, highest and mean score. Otherwise the 
+            robust range: median +- calibrationWidth robust standard deviations
+            (1.4826 * MAD) of the calibration scores, limited to the lowest and
+            highest score, and the median (e.g. 3).
+        recalibrationIntervalS : float/None, the calibration is blended with 
+            the running statistics of the scores of each such period of the 
+            session (see track_calibration). None: calibrate only once.
+        recalibrationWeight : float, weight of the scores of the last period 
+            in a recalibration
         args/kwargs : lists/dict, variable arguments for the ProcessFunction
         '''
 
         self.BlocksProcessed = 1
+        # Absolute index of the first sample that was not processed yet
+        self.samplesProcessed = 0
         self.BlocksVisualized = 0
         self.ProcessFunction = ProcessFunction
         self.canvas = canvas
@@ -30,8 +62,28 @@ class BaseNeuroFeedback:
         self.indicesOfInterest = [gatherer.channelNames.index(chan) for chan in channelsOfInterest]
         self.blockDurS = 1 / float(self.blocksPerSecond)
         self.minNumberOfBlocks = int(round(self.blocksPerSecond * self.timeRangeProcessed))
+        self.minNumberOfSamples = int(round(gatherer.sr * self.timeRangeProcessed))
+        # New samples per score (see updateIntervalS)
+        self.updateSamples = self.minNumberOfSamples if updateIntervalS is None \
+            else max(1, int(round(gatherer.sr * updateIntervalS)))
+        if calibrationDurS is None:
+            calibrationDurS = gatherer.dataMemoryDurS
+        self.calibrationBlocks = int(round(calibrationDurS * self.blocksPerSecond))
+        self.calibrationWidth = calibrationWidth
         self.cal = None
+        # Running statistics of the scores since the last (re)calibration
+        self.recalibrationScores = None if recalibrationIntervalS is None \
+            else max(1, int(round(recalibrationIntervalS * gatherer.sr / self.updateSamples)))
+        self.recalibrationWeight = recalibrationWeight
+        self.runningStats = None
+        self.recalibrations = 0
         self.scoreMemory = [np.nan] * scoreMemorySize
+        # update() sleeps until the gatherer has the samples of the next window
+        self.waitTimeoutS = waitTimeoutS
+        # Delay between the newest block and the start of its processing [s]
+        self.wakeLatencies = deque(maxlen=latencyMemorySize)
+        self.waitTimeouts = 0
+        self.multichannel = multichannel
         self.args = args
         self.kwargs = kwargs
 
@@ -40,40 +92,80 @@ class BaseNeuroFeedback:
         self.threadpool.start(self.NF_worker)
     
     def calibrate(self, dataMemory, blockMemory):
+        ''' Calibration from the scores of consecutive windows of 
+        timeRangeProcessed seconds that cover the data memory. All windows 
+        are scored in one pass (see score_windows).'''
         if all(blockMemory[:10] == -1 ):
             return
         print("enough data to calibrate!")
-        dataMemoryDurS = len(blockMemory) * self.blockDurS
-        numberOfChunks = dataMemoryDurS / self.timeRangeProcessed
         # Get dataMemory in consistent shape
         dataMemory = self.handleDataInput(dataMemory)
         # Calculate properties of the data (e.g. sampling rate)
         self.calculate_data_properties(dataMemory, blockMemory)
-        # Create chunks of the whole data Memory to process individually
-        # Ensure the dataMemory is evenly divisible by numberOfChunks:
-        while dataMemory.shape[1] % numberOfChunks != 0:
-            numberOfChunks -= 1
-        dataChunks = np.split(dataMemory[self.indicesOfInterest, :], numberOfChunks, axis=1)
-        # Process the chunks
-        scoreList = list()
-        for chunk in dataChunks:
-            chunk = np.array(chunk)
-            tmp_score = list()
-            for elec in range(chunk.shape[0]):
-                score = self.ProcessFunction(np.squeeze(chunk[elec, :]), *self.args, **self.kwargs)
-                tmp_score.append( score )
-                # print(f'chunk[elec, :] {chunk[elec, :]} of type {type(chunk[elec, :])} yielded {score}')
-                # print(f'self.args={self.args}, self.kwargs={self.kwargs}')
-            scoreList.append(np.nanmean(tmp_score))
-                
-        # scoreList = [self.ProcessFunction(np.squeeze(chunk), *self.args, **self.kwargs) for chunk in dataChunks]
-        # print(f'scoreList={scoreList}')
-        # Finally, extract y limits
-        self.cal = (np.min(scoreList), np.max(scoreList), np.mean(scoreList))
+        # Windows x channels x time points (strided view, the oldest samples 
+        # that do not fill a window are left out)
+        n = self.minNumberOfSamples
+        data = dataMemory[self.indicesOfInterest, dataMemory.shape[1] % n:]
+        windows = sliding_window_view(data, n, axis=1)[:, ::n].transpose(1, 0, 2)
+        scores = np.asarray(self.score_windows(windows), dtype=np.float64)
+        # Finally, extract y limits (of each score if the scores are vectors)
+        median = np.nanmedian(scores, axis=0)
+        mad = np.nanmedian(np.abs(scores - median), axis=0)
+        self.cal = self.calibration_range(median, mad, np.nanmin(scores, axis=0), np.nanmax(scores, axis=0), 
+            np.nanmean(scores, axis=0))
+        self.runningStats = util.RunningRobustStats(np.size(median))
         self.BlocksProcessed = blockMemory[-1]
         self.dataPerBlock = self.blockDurS  * self.sr
         print("\t...done.")
 
+    def score_windows(self, windows):
+        ''' Scores of many windows (calibration), like score on each of them.
+        Parameters:
+        -----------
+        windows : numpy.ndarray, windows x channels of interest x time points
+
+        Return:
+        -------
+        scores : numpy.ndarray, one score (or score vector) per window
+        '''
+        scores = list()
+        for window in windows:
+            if self.multichannel:
+                scores.append(self.ProcessFunction(window, *self.args, **self.kwargs))
+                continue
+            scores.append(np.nanmean([self.ProcessFunction(channel, *self.args, **self.kwargs) 
+                for channel in window]))
+        return np.array(scores)
+
+    def calibration_range(self, median, mad, minimum, maximum, mean):
+        ''' Calibration tuple (minval, maxval, medianval) from statistics of 
+        the scores (see calibrationWidth).'''
+        if self.calibrationWidth is None:
+            return (minimum, maximum, mean)
+        width = self.calibrationWidth * 1.4826 * mad
+        return (np.fmax(median - width, minimum), np.fmin(median + width, maximum), median)
+
+    def track_calibration(self, score):
+        ''' Add a score to the running statistics (P-square sketches, O(1) per 
+        score, see util.RunningRobustStats). After each recalibrationIntervalS
+        the calibration is blended with them and they start anew.'''
+        if self.recalibrationScores is None or self.runningStats is None:
+            return
+        stats = self.runningStats
+        stats.add(score)
+        if stats.count < self.recalibrationScores:
+            return
+        new = self.calibration_range(stats.median(), stats.mad(), stats.minimum, stats.maximum, stats.mean())
+        w = self.recalibrationWeight
+        cal = list()
+        for old, value in zip(self.cal, new):
+            value = np.reshape(value, np.shape(old))
+            # Keep the calibration of quantities without valid scores
+            cal.append(np.where(np.isnan(value), old, (1 - w) * old + w * value))
+        self.cal = tuple(cal)
+        self.recalibrations += 1
+        stats.reset()
+
     def update(self):
         ''' Process new data 
         Parameters:
@@ -81,55 +173,112 @@ class BaseNeuroFeedback:
         dataMemory : list/numpy.ndarray, array of data points of a single 
         blockMemory : ist/numpy.ndarray, array of block indices
         '''
-        dataMemory = self.gatherer.dataMemory
-        blockMemory = self.gatherer.blockMemory
         # Check if Neurofeedback has been calibrated:
         if self.cal is None:
-            self.calibrate(dataMemory, blockMemory)
+            # Wait until the history covers the whole calibration period
+            n_samples = self.calibrationBlocks * self.gatherer.blockSize
+            end_sample = self.gatherer.sampleCount
+            dataMemory, first_sample = self.gatherer.recall(end_sample - n_samples, end_sample)
+            if dataMemory.shape[1] == n_samples:
+                blockMemory = self.block_numbers(end_sample // self.gatherer.blockSize, self.calibrationBlocks)
+                self.calibrate(dataMemory, blockMemory)
             if self.cal is None:
-                time.sleep(1)
+                # Try again once the calibration period is complete, at the next block
+                self.gatherer.wait_for_samples(max(n_samples, end_sample + 1), self.waitTimeoutS)
                 return (False, False)
-        # Get dataMemory in consistent shape
-        dataMemory = self.handleDataInput(dataMemory)
-        # Calculate properties of the data (e.g. sampling rate)
-        self.calculate_data_properties(dataMemory, blockMemory)
-        if blockMemory[-1] < (self.BlocksProcessed + self.minNumberOfBlocks):
-            # not enough data blocks available to start next processing
-            time.sleep(self.timeRangeProcessed)  # sleep a bit
+            self.samplesProcessed = first_sample + dataMemory.shape[1]
+        if self.gatherer.sampleCount < self.samplesProcessed:
+            # Memory of the gatherer was reset
+            self.samplesProcessed = 0
+        # Wake with the block that completes the next window
+        next_sample = self.samplesProcessed + self.updateSamples
+        if self.gatherer.wait_for_samples(next_sample, self.waitTimeoutS) < next_sample:
+            self.waitTimeouts += 1
             return (False, False)
+        if self.gatherer.newDataTime is not None:
+            self.wakeLatencies.append(host_clock() - self.gatherer.newDataTime)
         # Extract data
-        currentData = self.extract_current_data(dataMemory, blockMemory)
+        currentData = self.extract_current_data()
         # Calculate Neurofeedback Score
-        score = []
-        # Call ProcessFunction for each channel of interest
-        for i in range(currentData.shape[0]):
-            tmp_score = self.ProcessFunction(currentData[i, :], *self.args, **self.kwargs)
-            score.append( tmp_score )
-        
-        if len(score) == 1:
-            score = score[0]
-        else:
-            # Average over all channels available
-            score = np.mean(score)
+        score = self.score(currentData)
+        self.track_calibration(score)
         
         # Retrieve average value across scoreMemory
         self.scoreMemory[0:-1] = self.scoreMemory[1:]
         self.scoreMemory[-1] = score
-        scoreHysteresis = np.nanmean(self.scoreMemory)
-        
-        self.BlocksProcessed = blockMemory[-1]
+        # Score vectors are averaged element-wise
+        scoreHysteresis = np.nanmean(np.broadcast_arrays(*self.scoreMemory), axis=0)
         
         result = (self.canvas, scoreHysteresis, self.cal)
 
         return (True, result)
 
-    def extract_current_data(self, dataMemory, blockMemory):
-        blockMemory = list(blockMemory)
-        newBlocks = (int(self.BlocksProcessed), int(blockMemory[-1]))
-        newBlocksIndices = (blockMemory.index(newBlocks[0]), blockMemory.index(newBlocks[1]))
-        dataMemoryIndices = (int(round(newBlocksIndices[0] * self.dataPerBlock)), int(round(newBlocksIndices[1] * self.dataPerBlock)))
-        currentData = dataMemory[self.indicesOfInterest, dataMemoryIndices[0]:dataMemoryIndices[1]]
-        return currentData
+    def score(self, newData):
+        ''' Score of the current window.
+        Parameters:
+        -----------
+        newData : numpy.ndarray, samples of the channels of interest that 
+            arrived since the last score (see extract_current_data)
+        '''
+        if self.updateSamples < self.minNumberOfSamples:
+            # Overlapping windows
+            currentData = self.current_window()
+        else:
+            currentData = newData
+        if self.multichannel:
+            # All channels of interest in one call
+            score = [self.ProcessFunction(currentData, *self.args, **self.kwargs)]
+        else:
+            score = []
+            # Call ProcessFunction for each channel of interest
+            for i in range(currentData.shape[0]):
+                tmp_score = self.ProcessFunction(currentData[i, :], *self.args, **self.kwargs)
+                score.append( tmp_score )
+        
+        if len(score) == 1:
+            score = score[0]
+        else:
+            # Average over all channels available
+            score = np.mean(score)
+        return score
+
+    def latency_stats(self):
+        ''' Percentiles of the delay between the arrival of the newest block 
+        and the start of its processing in update().
+
+        Return:
+        -------
+        stats : dict, number of processed windows, timeouts of the wait for 
+            new data and the latency percentiles in ms
+        '''
+        latencies = np.array(self.wakeLatencies)
+        stats = dict(windows=len(latencies), timeouts=self.waitTimeouts)
+        if len(latencies) > 0:
+            stats['latency_ms'] = dict(zip(['p50', 'p90', 'p99', 'max'],
+                (np.percentile(latencies, [50, 90, 99, 100]) * 1e3).round(3).tolist()))
+        return stats
+
+    def extract_current_data(self):
+        ''' All samples of the channels of interest that arrived since the last 
+        call, looked up by absolute sample index (see Gather.since).'''
+        data, first_sample, lastBlock = self.gatherer.since(self.samplesProcessed)
+        self.samplesProcessed = first_sample + data.shape[1]
+        self.BlocksProcessed = lastBlock
+        return data[self.indicesOfInterest, :]
+
+    def current_window(self):
+        ''' The newest timeRangeProcessed seconds of the channels of interest 
+        up to samplesProcessed (shorter right after a reset).'''
+        data, first_sample, _ = self.gatherer.since(max(self.samplesProcessed - self.minNumberOfSamples, 0))
+        return data[self.indicesOfInterest, :self.samplesProcessed - first_sample]
+
+    @staticmethod
+    def block_numbers(lastBlock, n_blocks):
+        ''' Block numbers of the n_blocks blocks up to lastBlock. Blocks that 
+        were not recorded yet are -1.'''
+        blockMemory = np.arange(lastBlock - n_blocks + 1, lastBlock + 1)
+        blockMemory[blockMemory < 1] = -1
+        return blockMemory
 
     def calculate_data_properties(self, dataMemory, blockMemory):
         if not hasattr(self, "sr"):
@@ -163,4 +312,268 @@ class BaseNeuroFeedback:
     def set_animation(self, animation):
         self.canvas.ax.clear()
         self.NF_worker.signals.result.connect(animation)
-        
\ No newline at end of file
+        
+
+
+class BandPowerNeuroFeedback(BaseNeuroFeedback):
+    ''' Frequency band power feedback (util.freq_band_power) that is updated 
+    with every block: the spectrum of the newest timeRangeProcessed seconds 
+    is kept up to date by a sliding DFT (see util.SlidingBandPower), so a 
+    score costs O(bins x channels) per new sample instead of a spectrum of 
+    the whole window. Calibration and scores match freq_band_power.
+    '''
+    def __init__(self, canvas, threadpool, gatherer, freqs, timeRangeProcessed=0.25, 
+        channelsOfInterest=None, updateIntervalS=None, **kwargs):
+        '''
+        Parameters:
+        -----------
+        freqs : list/tuple, lower and upper edge of the band in Hz
+        updateIntervalS : float/None, interval between two scores. Default: 
+            one block.
+        canvas, threadpool, gatherer, timeRangeProcessed, channelsOfInterest, 
+        kwargs : see BaseNeuroFeedback
+        '''
+        # Before the worker is started by BaseNeuroFeedback
+        self.estimator = util.SlidingBandPower(len(channelsOfInterest), gatherer.sr, 
+            int(round(gatherer.sr * timeRangeProcessed)), *freqs)
+        # Absolute index after the last sample passed to the estimator
+        self.estimatorEnd = None
+        if updateIntervalS is None:
+            updateIntervalS = gatherer.block_dur_s
+        super().__init__(util.freq_band_power, canvas, threadpool, gatherer, freqs, gatherer.sr,
+            timeRangeProcessed=timeRangeProcessed, channelsOfInterest=channelsOfInterest, 
+            updateIntervalS=updateIntervalS, multichannel=True, **kwargs)
+
+    def score(self, newData):
+        ''' Band power of the current window, averaged across the channels of 
+        interest (see BaseNeuroFeedback.score).'''
+        if self.estimatorEnd != self.samplesProcessed - newData.shape[1]:
+            # First score or samples were skipped: start with the whole window
+            self.estimator.reset()
+            newData = self.current_window()
+        self.estimator.update(newData)
+        self.estimatorEnd = self.samplesProcessed
+        return np.mean(self.estimator.power())
+
+    def score_windows(self, windows):
+        ''' Band power of many windows in one pass (see 
+        BaseNeuroFeedback.score_windows).'''
+        return util.band_power_engine.power(windows, self.gatherer.sr, *self.args[0]).mean(axis=-1)
+
+
+class MetricRegistry:
+    ''' Named neurofeedback metrics that are computed together from shared 
+    intermediates. A metric declares its channels, bands and window. 
+    Live (update, current): each band power of a window length is kept up to 
+    date by one sliding DFT (util.SlidingBandPower) for all channels that 
+    need it, so a tick costs O(bins x channels) per new sample and metrics 
+    sharing a band (e.g. beta and theta/beta) share its estimator.
+    Batch (scores, e.g. the calibration): the periodogram of each window 
+    length is computed once for all channels that need it 
+    (util.BandPowerEngine.spectrum), and each band power once for all of them.
+    The scores of a tick are one vector in the order of registration (see 
+    names).
+    '''
+    def __init__(self, sr, engine=None):
+        '''
+        Parameters:
+        -----------
+        sr : int, sampling rate
+        engine : util.BandPowerEngine/None, default: util.band_power_engine
+        '''
+        self.sr = sr
+        self.engine = util.band_power_engine if engine is None else engine
+        # name -> dict(channels, bands, windowSize, combine, rows)
+        self.metrics = dict()
+        # Channels of all metrics, order of the rows of the data (see scores)
+        self.channels = []
+        # (windowSize, fmin, fmax) -> (rows, util.SlidingBandPower), see update
+        self.estimators = dict()
+
+    def register(self, name, channels, bands, windowS=0.25, combine=None):
+        ''' Add a metric.
+        Parameters:
+        -----------
+        name : str, name of the metric
+        channels : list of str, channels the metric is computed on
+        bands : dict/list/tuple, band name -> (fmin, fmax) in Hz, or a single 
+            (fmin, fmax)
+        windowS : float, seconds of data the metric is computed on
+        combine : function/None, score from the band powers, called with a 
+            dict band name -> power of each channel (numpy.ndarray, channels 
+            on the last axis, see scores). Default:
+            the power of the band averaged across the channels (like 
+            util.freq_band_power). See band_ratio.
+        '''
+        assert name not in self.metrics, "Metric {} is already registered".format(name)
+        if not isinstance(bands, dict):
+            bands = dict(power=tuple(bands))
+        if combine is None:
+            assert len(bands) == 1, "Metric {} has several bands and needs a combine function".format(name)
+            band = list(bands)[0]
+            combine = lambda powers: np.mean(powers[band], axis=-1)
+        for channel in channels:
+            if channel not in self.channels:
+                self.channels.append(channel)
+        self.metrics[name] = dict(channels=list(channels), bands=dict(bands), 
+            windowSize=int(round(windowS * self.sr)), combine=combine, 
+            rows=[self.channels.index(channel) for channel in channels])
+        # Set up again with the rows of all metrics
+        self.estimators = dict()
+
+    @property
+    def names(self):
+        return list(self.metrics)
+
+    @property
+    def windowS(self):
+        ''' Longest window of all metrics in seconds.'''
+        return max(metric['windowSize'] for metric in self.metrics.values()) / self.sr
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def scores(self, data):
+        ''' Scores of all metrics.
+        Parameters:
+        -----------
+        data : numpy.ndarray, channels (see self.channels) x time points. Each
+            metric uses the newest samples of its window. More leading 
+            dimensions (e.g. windows x channels x time points) are scored in
+            the same pass.
+
+        Return:
+        -------
+        scores : numpy.ndarray, one score per metric (see names) on the last
+            axis
+        '''
+        data = np.asarray(data)
+        T = data.shape[-1]
+        scores = list()
+        # Shared intermediates of this tick
+        spectra = dict()
+        powers = dict()
+        for metric in self.metrics.values():
+            n = min(metric['windowSize'], T)
+            if n not in spectra:
+                # All channels of the metrics with this window
+                channels = sorted(set(row for m in self.metrics.values() 
+                    if min(m['windowSize'], T) == n for row in m['rows']))
+                spectra[n] = (channels, self.engine.spectrum(data[..., channels, T - n:], self.sr))
+            channels, spectrum = spectra[n]
+            bandPowers = dict()
+            for band, (fmin, fmax) in metric['bands'].items():
+                if (n, fmin, fmax) not in powers:
+                    powers[(n, fmin, fmax)] = self.engine.band(spectrum, fmin, fmax)
+                bandPowers[band] = powers[(n, fmin, fmax)][..., [channels.index(row) for row in metric['rows']]]
+            scores.append(metric['combine'](bandPowers))
+        return np.stack(scores, axis=-1).astype(np.float64)
+
+    def setup_estimators(self):
+        ''' One sliding DFT per window length and band, on the channels of all
+        metrics that need it.'''
+        rows = dict()
+        for metric in self.metrics.values():
+            for fmin, fmax in metric['bands'].values():
+                key = (metric['windowSize'], fmin, fmax)
+                rows[key] = sorted(set(rows.get(key, [])) | set(metric['rows']))
+        self.estimators = {key: (keyRows, util.SlidingBandPower(len(keyRows), self.sr, key[0], 
+            key[1], key[2], engine=self.engine)) for key, keyRows in rows.items()}
+
+    def reset(self):
+        ''' Start the live estimators with empty windows (see update).'''
+        if len(self.estimators) == 0:
+            self.setup_estimators()
+        for _, estimator in self.estimators.values():
+            estimator.reset()
+
+    def update(self, data):
+        ''' Add the next samples to the live estimators.
+        Parameters:
+        -----------
+        data : numpy.ndarray, channels (see self.channels) x new time points
+        '''
+        if len(self.estimators) == 0:
+            self.setup_estimators()
+        data = np.asarray(data)
+        for rows, estimator in self.estimators.values():
+            estimator.update(data[rows, :])
+
+    def current(self):
+        ''' Scores of all metrics on the newest samples passed to update (NaN
+        until a window is full). Equal to scores() of these samples.
+
+        Return:
+        -------
+        scores : numpy.ndarray, one score per metric (see names)
+        '''
+        if len(self.estimators) == 0:
+            self.setup_estimators()
+        # Shared intermediates of this tick
+        powers = dict()
+        scores = list()
+        for metric in self.metrics.values():
+            bandPowers = dict()
+            for band, (fmin, fmax) in metric['bands'].items():
+                key = (metric['windowSize'], fmin, fmax)
+                rows, estimator = self.estimators[key]
+                if key not in powers:
+                    powers[key] = estimator.power()
+                bandPowers[band] = powers[key][[rows.index(row) for row in metric['rows']]]
+            scores.append(metric['combine'](bandPowers))
+        return np.array(scores, dtype=np.float64)
+
+def band_ratio(numerator, denominator):
+    ''' combine function of MetricRegistry.register: ratio of the powers of
+    two bands, averaged across the channels (e.g. theta/beta).'''
+    def combine(powers):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.mean(powers[numerator] / powers[denominator], axis=-1)
+    return combine
+
+
+class MetricNeuroFeedback(BaseNeuroFeedback):
+    ''' Feedback of several metrics at once (see MetricRegistry) with one 
+    worker. The scores, the calibration and the result passed to the 
+    animation are vectors with one entry per metric. Like 
+    BandPowerNeuroFeedback, the scores are updated incrementally with every
+    block (MetricRegistry.update), the calibration is computed in one batch
+    (MetricRegistry.scores).
+    '''
+    def __init__(self, registry, canvas, threadpool, gatherer, updateIntervalS=None, 
+        **kwargs):
+        '''
+        Parameters:
+        -----------
+        registry : MetricRegistry, the metrics
+        updateIntervalS : float/None, interval between two ticks. Default: one
+            block.
+        canvas, threadpool, gatherer, kwargs : see BaseNeuroFeedback
+        '''
+        assert len(registry) > 0, "The registry has no metrics"
+        assert registry.sr == gatherer.sr, "The registry is set up for {} Hz but the data has {} Hz".format(registry.sr, gatherer.sr)
+        self.registry = registry
+        # Absolute index after the last sample passed to the registry
+        self.estimatorEnd = None
+        if updateIntervalS is None:
+            updateIntervalS = gatherer.block_dur_s
+        super().__init__(registry.scores, canvas, threadpool, gatherer, 
+            timeRangeProcessed=registry.windowS, channelsOfInterest=registry.channels, 
+            updateIntervalS=updateIntervalS, multichannel=True, **kwargs)
+
+    def score_windows(self, windows):
+        ''' Scores of many windows in one pass (see MetricRegistry.scores).'''
+        return self.registry.scores(windows)
+
+    def score(self, newData):
+        ''' Scores of the current window (see BaseNeuroFeedback.score).'''
+        if self.registry.engine.window != 'boxcar':
+            # The sliding DFT needs a boxcar window
+            return self.registry.scores(self.current_window())
+        if self.estimatorEnd != self.samplesProcessed - newData.shape[1]:
+            # First score or samples were skipped: start with the whole window
+            self.registry.reset()
+            newData = self.current_window()
+        self.registry.update(newData)
+        self.estimatorEnd = self.samplesProcessed
+        return self.registry.current()
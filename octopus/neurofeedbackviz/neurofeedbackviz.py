@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -14,6 +15,10 @@ result : tuple, with items (canvas, score, cal):
     ->  minval : float, showing the lowest value observed during calibration
         maxval : float, showing the highest value observed during calibration
         medianval : float, median value of calibration
+    See BaseNeuroFeedback.calibrationWidth and recalibrationIntervalS for a 
+    robust range and a calibration that follows the session.
+    score and the items of cal are vectors with one entry per metric for 
+    MetricNeuroFeedback (one bar each in BarPlotAnimation).
 '''
 
 def BarPlotAnimation(result):
@@ -22,14 +27,14 @@ def BarPlotAnimation(result):
     canvas, score, cal = result
     minval, maxval, medianval = cal
     ylim = (minval, maxval)
-    tolerance = 1.5 * (maxval/medianval)
+    tolerance = 1.5 * np.max(maxval/medianval)
     # Clear axis
     canvas.ax.clear()
     canvas.ax.set_ylim((0, tolerance))
-    # Transform Scores
-    score_rel = score/medianval
+    # Transform Scores (one bar per metric)
+    score_rel = np.atleast_1d(score/medianval)
 
-    df = pd.DataFrame({'x': [0], 'score_rel': [score_rel]})
+    df = pd.DataFrame({'x': np.arange(len(score_rel)), 'score_rel': score_rel})
     sns.barplot(x='x', y='score_rel', ax=canvas.ax, data=df)
     canvas.ax.axhline(1, ls='-', color='black')
     
@@ -16,6 +16,13 @@ class DataMonitor:
    
     def __init__(self, sr, block_size, curve, widget, window_len_s=10, figsize=(13,6), ylim=(-100, 100), 
         title=None, viewChannel=None, EOGChannelIndex=None, blinder=1):
+        ''' 
+        Parameters:
+        -----------
+        sr : int, rate of the plotted data: the sampling rate of the gatherer
+            or a rate subscribed to (see Gather.subscribe)
+        block_size : int, samples per block at that rate
+        '''
         print('DataMonitor initialized')
         # Basic Settings
         self.sr = sr
@@ -26,8 +33,8 @@ class DataMonitor:
         self.block_duration = self.block_size / float(self.sr)
         assert round(self.window_size / self.block_size) == self.window_size / self.block_size, 'window size not divisible by block size, please adjust window size'
         self.n_blocks = int(self.window_size / self.block_size)
-        self.blockMemory = [-1] * self.n_blocks
-        self.blockCount = 0
+        # Absolute index of the next sample to plot
+        self.lastSample = 0
         # Plot Settings
         self.curve = curve
         self.widget = widget
@@ -40,7 +47,7 @@ class DataMonitor:
         self.blinder = blinder
         # Data structures
         self.time = np.linspace(0, self.window_len_s, self.window_size)
-        self.data_window = np.array([np.nan] * self.window_size)
+        self.data_window = np.full(self.window_size, np.nan, dtype=np.float32)
         self.initialize_figure()
 
     def initialize_figure(self):
@@ -67,8 +74,6 @@ class DataMonitor:
         -------
         '''
         gatherer = model.gatherer
-        d_est = model.d_est
-        toggle_EOG_correction = model.toggle_EOG_correction
         viewChannel = model.viewChannel
         
         if viewChannel is not None:
@@ -77,46 +82,26 @@ class DataMonitor:
         if not gatherer.connected:
             return
         self.viewChannelIndex = gatherer.channelNames.index(self.viewChannel)
-        dataMemory = gatherer.dataMemory[self.viewChannelIndex, :]
-        eogMemory = gatherer.dataMemory[self.EOGChannelIndex, :]
-        # Correct EOG
-        if toggle_EOG_correction:
-            dataMemory = dataMemory - (eogMemory * d_est[self.viewChannelIndex])
-        IncomingBlockMemory = gatherer.blockMemory
         lagtime = gatherer.lag_s
 
-        
-
-        n_new_blocks = int(np.max(IncomingBlockMemory) - np.max(self.blockMemory))
-        
-
-        if np.max(IncomingBlockMemory) == np.max(self.blockMemory):
-            # all blocks have been plotted
+        sampleCount = gatherer.select_buffer(clean=True, rate=self.sr).sampleCount
+        if sampleCount < self.lastSample:
+            # Memory of the gatherer was reset
+            self.lastSample = 0
+        if sampleCount == self.lastSample:
+            # all samples have been plotted
             return
-
-        new_blocks = np.arange(np.max(self.blockMemory) + 1, np.max(self.blockMemory) + 1 + n_new_blocks).astype(int)
-        # Block count of the first block that is new
-        first_new_block = np.max(self.blockMemory) + 1
-        # Block position that shall be replaced first
-        block_of_first_replacement = first_new_block % self.n_blocks
-        # Index of said block position
-        idx_of_first_replacement = int(block_of_first_replacement * self.block_size)
-        # Extract new portion of data
-        data_pack = np.array(dataMemory[-n_new_blocks*self.block_size:])
-        # If new portion of data goes beyong the window boundary:
-        if idx_of_first_replacement + len(data_pack) > self.window_size:
-            new_win = True
-            self.data_window[idx_of_first_replacement:] = data_pack[0:len(self.data_window[idx_of_first_replacement:])]
-
-            if len(self.data_window[idx_of_first_replacement:]) != len(data_pack):
-                remainder_length = int(len(data_pack) - len(data_pack[0:len(self.data_window[idx_of_first_replacement:])]))
-                self.data_window[0:remainder_length] = data_pack[len(self.data_window[idx_of_first_replacement:]):]
-        else:
-            self.data_window[idx_of_first_replacement:idx_of_first_replacement+len(data_pack)] = data_pack
-            if any(np.mod(new_blocks, self.window_size / self.block_size) == 0):
-                new_win = True
-            else:
-                new_win = False
+        # Re-referenced and EOG corrected samples since the last update (see 
+        # Gather.set_eog_correction and Gather.since)
+        newData, first_sample, _ = gatherer.since(self.lastSample, clean=True, rate=self.sr)
+        data_pack = newData[self.viewChannelIndex, -self.window_size:]
+        first_sample += newData.shape[1] - len(data_pack)
+        # Position of the first new sample in the window
+        idx_of_first_replacement = first_sample % self.window_size
+        # The window wraps around at its end
+        self.data_window[(first_sample + np.arange(len(data_pack))) % self.window_size] = data_pack
+        # A new window starts with a sample at position 0
+        new_win = idx_of_first_replacement == 0 or idx_of_first_replacement + len(data_pack) > self.window_size
 
         # If one window is full, start again on left side
         if new_win: # and self.blockCount != 0:
@@ -143,10 +128,10 @@ class DataMonitor:
 
         
         if lagtime is not None:
-            self.title.setText(f'lag={abs(lagtime):.1f}s')
+            # Delay of the newest block and amplifier clock drift (see ClockModel)
+            self.title.setText(f'lag={abs(lagtime)*1000:.0f} ms, drift={gatherer.driftPpm:.0f} ppm')
             
-        self.blockMemory = IncomingBlockMemory
-        self.blockCount += n_new_blocks
+        self.lastSample = first_sample + len(data_pack)
 
     def decide_ylimits(self):
         ''' Collect the ylimits of each new window and calculate the optimal window size using 5th percentile of lowest
@@ -180,7 +165,7 @@ class HistMonitor:
         self.scpBaselineDuration = scpBaselineDuration
         self.kdeCrit = 5
         self.package_size = None
-        # Data processing
+        # Data processing (done by the gatherer, see Gather.bands)
         self.filtfreq = (None, 0.5)
         # Data
         self.dataMemory = np.array([np.nan] * int(round(self.SCPTrialDuration*self.sr)))
@@ -218,43 +203,51 @@ class HistMonitor:
                 ch_types.append('eeg')
         return ch_types
 
-    def button_press(self, gatherer, d_est):
+    def button_press(self, gatherer, d_est, responseTime=None):
         ''' If a button was pressed append the average baseline corrected SCP to a list.
+        The SCP band is filtered causally as the data arrives (see Gather.add_band),
+        so the epoch is just a slice of it.
+        Parameters:
+        -----------
+        gatherer : Gather, provides the clean and the scp band data at the rate 
+            of the monitor (self.sr, see Gather.subscribe)
+        d_est : list, EOG weights (applied by the gatherer, see Gather.set_eog_correction)
+        responseTime : float/None, host time of the response (clock.host_clock). 
+            The epoch ends at the sample acquired at that time according to the 
+            clock model of the gatherer. If None, it ends with the newest sample.
         '''
-        # Get data from gatherer:
+        # Get data from gatherer (sample indices at the rate of the monitor):
         back_idx = int(self.SCPTrialDuration * self.sr)
-        data = gatherer.dataMemory[:, -back_idx:]
-        
-        # DELETE THIS LINE:
-        # data += np.cumsum(np.random.randn(*data.shape), axis=-1)
-
-        # Create mne.Info Object
-        ch_types = self.guess_channel_type(gatherer.channelNames)
-        info = mne.create_info(gatherer.channelNames, self.sr, ch_types=ch_types)
-        # Create EpochsArray object
-        epochs = mne.EpochsArray(data[np.newaxis, :, :], info, tmin=-self.SCPTrialDuration, verbose=0)
-        print("\nCHANNEL TYPES:", epochs.get_channel_types(),  '\n')
-        print("Epochs time goes from ", epochs.times[0], " to ", epochs.times[-1])
-        # Preprocess
-        baseline = (-self.SCPTrialDuration, -self.SCPTrialDuration+self.scpBaselineDuration)
-        epochs.apply_baseline(baseline=baseline, verbose=0)
-        
-        if gatherer.refChannels is not None:
-            print("rereference")
-            epochs.set_eeg_reference(gatherer.refChannels)
-        
-        # Filter
-        epochs_filt = epochs.copy().filter(*self.filtfreq, verbose=0)
-        print("filter at ", self.filtfreq[0], " until ", self.filtfreq)
-        print("channel of interest: ", epochs.ch_names[self.channelOfInterestIdx], " at idx ", self.channelOfInterestIdx)
-        # Extract data
-        coi = np.squeeze(epochs.copy().pick_channels([epochs.ch_names[self.channelOfInterestIdx]]).get_data())
-        coi_filt = np.squeeze(epochs_filt.copy().pick_channels([epochs_filt.ch_names[self.channelOfInterestIdx]]).get_data())
-        
+        cleanBuffer = gatherer.select_buffer(clean=True, rate=self.sr)
+        scpBuffer = gatherer.select_buffer(band='scp', rate=self.sr)
+        # Newest sample held by both streams
+        end_sample = min(cleanBuffer.sampleCount, scpBuffer.sampleCount)
+        if responseTime is not None and np.isfinite(gatherer.host_time_to_sample(responseTime)):
+            end_sample = int(round(gatherer.host_time_to_sample(responseTime) * self.sr / gatherer.sr))
+            # Wait for the blocks that were in transit at the response
+            gatherer.wait_for_samples(int(np.ceil(end_sample * gatherer.sr / self.sr)), timeoutS=1)
+            end_sample = min(end_sample, cleanBuffer.sampleCount, scpBuffer.sampleCount)
+        start_sample = max(end_sample - back_idx, 0)
+        data, first_sample, _ = gatherer.since(start_sample, clean=True, rate=self.sr)
+        data_filt, first_sample_filt, _ = gatherer.since(start_sample, band='scp', rate=self.sr)
+        # The same samples of both streams
+        first = max(first_sample, first_sample_filt)
+        data = data[:, first - first_sample:end_sample - first_sample]
+        data_filt = data_filt[:, first - first_sample_filt:end_sample - first_sample_filt]
+        # Averages in float64 (the data memory may be float32)
+        coi = data[self.channelOfInterestIdx, :].astype(np.float64)
+        coi_filt = data_filt[self.channelOfInterestIdx, :].astype(np.float64)
+        print("channel of interest: ", gatherer.channelNames[self.channelOfInterestIdx], " at idx ", self.channelOfInterestIdx)
+
+        # Baseline correction
+        baseline_idx = int(round(self.scpBaselineDuration * self.sr))
+        coi = coi - np.mean(coi[:baseline_idx])
+        coi_filt = coi_filt - np.mean(coi_filt[:baseline_idx])
+        times = np.arange(-len(coi), 0) / self.sr
 
         plt.figure()
-        plt.plot(epochs.times, coi*self.blinder, label='raw')
-        plt.plot(epochs_filt.times, coi_filt*self.blinder, label='filtered')
+        plt.plot(times, coi*self.blinder, label='clean')
+        plt.plot(times, coi_filt*self.blinder, label='filtered')
         plt.title("Slow cortical potential")
         plt.legend()
         plt.show()
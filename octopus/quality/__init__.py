@@ -0,0 +1 @@
+from .quality import *
\ No newline at end of file
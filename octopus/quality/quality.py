@@ -0,0 +1,167 @@
+import numpy as np
+
+# Order of the metrics in SignalQuality.matrix()
+quality_metrics = ['std', 'lineNoise', 'drift', 'flat', 'clipping', 'nanFraction', 'reasons']
+# Checks that make a channel bad, bit i of 'reasons' is set if check i failed
+quality_checks = ['flat', 'std', 'lineNoise', 'drift', 'clipping', 'nanFraction']
+
+class SignalQuality:
+    ''' Running signal quality of all channels, updated with every block in
+    O(channels) state. All statistics are exponentially weighted over 
+    timeConstantS:
+
+    * std : standard deviation (µV)
+    * lineNoise : amplitude (µV) at the line frequency, estimated by 
+      demodulation with the phase of the absolute sample index (a recursive 
+      single-bin DFT)
+    * drift : slope of the block means (µV/s)
+    * flat : the channel did not change by more than its resolution for flatDurS
+    * clipping : fraction of samples at the limit of the amplifier range 
+      (rangeCodes * resolution), NaN if the range is not known
+    * nanFraction : fraction of missing samples (gaps)
+
+    Blocks that contain NaN in a channel only update its nanFraction. The 
+    summary (self.summary) is replaced as a whole after each block, so that the 
+    GUI can poll it from another thread.
+    '''
+    def __init__(self, sr, resolutions, lineFreq=50, timeConstantS=2, flatDurS=1, 
+        rangeCodes=None, maxStd=200, maxLineNoise=20, maxDrift=100, maxClipping=0.001,
+        maxNanFraction=0.1):
+        '''
+        Parameters:
+        -----------
+        sr : int, sampling rate
+        resolutions : list of float, resolution (µV) of each channel
+        lineFreq : float, line frequency in Hz
+        timeConstantS : float, time constant of the running statistics
+        flatDurS : float, a channel is flat if it did not change for this long
+        rangeCodes : int/None, range of the amplifier in units of the 
+            resolution (e.g. 32768 for 16 bit). None: not known, clipping is 
+            not checked.
+        maxStd, maxLineNoise, maxDrift, maxClipping, maxNanFraction : float, 
+            a channel is bad if it is flat or exceeds one of these
+        '''
+        self.sr = sr
+        self.resolutions = np.asarray(resolutions, dtype=np.float64)
+        self.channelCount = len(self.resolutions)
+        self.lineFreq = lineFreq
+        self.timeConstantS = timeConstantS
+        self.flatSamples = int(round(flatDurS * sr))
+        # Largest code minus half a step (rounding)
+        self.clipLevel = None if rangeCodes is None else (rangeCodes - 1.5) * self.resolutions
+        self.limits = dict(std=maxStd, lineNoise=maxLineNoise, drift=maxDrift, 
+            clipping=maxClipping, nanFraction=maxNanFraction)
+        # Decay per sample
+        self.decay = np.exp(-1 / (timeConstantS * sr))
+        self.reset()
+
+    def reset(self):
+        ''' Forget all statistics.'''
+        C = self.channelCount
+        # Exponentially weighted sums and their total weight (unbiased from the start)
+        self.weight = np.zeros(C)
+        self.mean = np.zeros(C)
+        self.meanSquare = np.zeros(C)
+        self.line = np.zeros(C, dtype=np.complex128)
+        self.slope = np.zeros(C)
+        self.slopeWeight = np.zeros(C)
+        self.lastMean = np.full(C, np.nan)
+        self.flatCount = np.zeros(C, dtype=np.int64)
+        self.clipping = np.zeros(C) if self.clipLevel is not None else np.full(C, np.nan)
+        self.nanFraction = np.zeros(C)
+        self.fractionWeight = 0.
+        self.summary = self.summarize()
+
+    def update(self, data, start_sample):
+        ''' Update the statistics with a block.
+        Parameters:
+        -----------
+        data : numpy.ndarray, channels x time points
+        start_sample : int, absolute index of the first sample of the block
+        '''
+        n = data.shape[1]
+        if n == 0:
+            return
+        missing = np.isnan(data)
+        valid = ~missing.any(axis=1)
+        # Moments of float32 blocks lose precision on large offsets
+        x = np.where(missing, 0, data).astype(np.float64, copy=False)
+        blockDecay = self.decay ** n
+        # Weights of the samples within the block (newest = 1 - decay)
+        weights = (1 - self.decay) * self.decay ** np.arange(n - 1, -1, -1)
+        blockWeight = 1 - blockDecay
+
+        def decayed(state, value, mask=valid):
+            return np.where(mask, blockDecay * state + value, state)
+
+        # Fractions are updated for all channels
+        self.fractionWeight = blockDecay * self.fractionWeight + blockWeight
+        self.nanFraction = blockDecay * self.nanFraction + missing @ weights
+        if self.clipLevel is not None:
+            self.clipping = blockDecay * self.clipping + (np.abs(x) >= self.clipLevel[:, np.newaxis]) @ weights
+
+        blockMean = x.mean(axis=1)
+        # Offsets leak into the line frequency bin: demodulate without them
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = np.where(self.weight > 0, self.mean / self.weight, blockMean)
+        phasor = np.exp(-2j * np.pi * self.lineFreq / self.sr * np.arange(start_sample, start_sample + n))
+        self.line = decayed(self.line, (x - offset[:, np.newaxis]) @ (phasor * weights))
+        self.weight = decayed(self.weight, blockWeight)
+        self.mean = decayed(self.mean, x @ weights)
+        self.meanSquare = decayed(self.meanSquare, (x * x) @ weights)
+        # Slope from the change of the block means
+        hasLast = valid & np.isfinite(self.lastMean)
+        step = np.where(hasLast, blockMean - np.nan_to_num(self.lastMean), 0) * self.sr / n
+        self.slope = decayed(self.slope, step * blockWeight, hasLast)
+        self.slopeWeight = decayed(self.slopeWeight, blockWeight, hasLast)
+        self.lastMean = np.where(valid, blockMean, np.nan)
+
+        span = np.where(valid, x.max(axis=1) - x.min(axis=1), np.inf)
+        self.flatCount = np.where(span <= self.resolutions, self.flatCount + n, 0)
+        self.summary = self.summarize()
+
+    def summarize(self):
+        ''' Current statistics of all channels.
+        Return:
+        -------
+        summary : dict, metric (see quality_metrics) -> numpy.ndarray of one 
+            value per channel. reasons is a bit mask of the failed checks (see
+            quality_checks), bad and flat are booleans.
+        '''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.mean / self.weight
+            std = np.sqrt(np.maximum(self.meanSquare / self.weight - mean**2, 0))
+            # Amplitude of a sine is twice the magnitude of its DFT bin
+            lineNoise = 2 * np.abs(self.line / self.weight)
+            drift = np.abs(self.slope / self.slopeWeight)
+            fractionWeight = self.fractionWeight if self.fractionWeight > 0 else np.nan
+            summary = dict(std=std, lineNoise=lineNoise, drift=drift, 
+                flat=self.flatCount >= self.flatSamples, clipping=self.clipping / fractionWeight,
+                nanFraction=self.nanFraction / fractionWeight)
+        failed = [summary['flat']] + [summary[metric] > self.limits[metric] for metric in quality_checks[1:]]
+        summary['reasons'] = np.array(failed).T @ (1 << np.arange(len(quality_checks)))
+        summary['bad'] = summary['reasons'] > 0
+        return summary
+
+    def matrix(self):
+        ''' Summary as metrics x channels array (rows in the order of 
+        quality_metrics), e.g. to share it between processes.'''
+        summary = self.summary
+        return np.array([summary[metric] for metric in quality_metrics], dtype=np.float64)
+
+def quality_from_matrix(matrix):
+    ''' Summary (see SignalQuality.summarize) from SignalQuality.matrix().'''
+    summary = {metric: row for metric, row in zip(quality_metrics, matrix)}
+    summary['flat'] = summary['flat'] > 0
+    # Nothing published yet: NaN
+    summary['reasons'] = np.nan_to_num(summary['reasons']).astype(np.int64)
+    summary['bad'] = summary['reasons'] > 0
+    return summary
+
+def bad_channels(summary, channelNames):
+    ''' Bad channels and why, e.g. ["Cz (flat)", "TP9 (lineNoise, drift)"].'''
+    descriptions = []
+    for index in np.flatnonzero(summary['bad']):
+        reasons = [check for bit, check in enumerate(quality_checks) if summary['reasons'][index] & (1 << bit)]
+        descriptions.append('{} ({})'.format(channelNames[index], ', '.join(reasons)))
+    return descriptions
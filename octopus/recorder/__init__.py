@@ -0,0 +1 @@
+from .recorder import *
\ No newline at end of file
@@ -0,0 +1,246 @@
+import os
+import json
+import queue
+import threading
+from struct import pack, unpack
+import numpy as np
+
+MAGIC = b'OCTO'
+VERSION = 1
+
+class Recorder:
+    ''' Writes the raw data stream to disk from a background thread.
+
+    Blocks are handed over through a bounded queue, so pushing never blocks the
+    acquisition loop: if the queue is full the block is dropped and counted. 
+    Dropped blocks and gaps of the stream (push_gap) are written as NaN of the
+    same length, so sample i of the file is always the absolute sample 
+    firstSample + i of the stream (and of the markers). The writer thread 
+    drains the queue in batches and appends them with one write call each.
+
+    File format (<path>.oct): the 4 bytes b'OCTO', a little endian uint32 
+    header length and a json header (channel names, resolutions, sampling rate,
+    data type, absolute index of the first sample), followed by the samples as
+    little endian float32 in RDA (multiplexed, time points x channels) order. 
+    Markers go to the side file <path>.markers.tsv with one line per marker. 
+    Use read_recording to load it.
+    '''
+    def __init__(self, path, channelNames, resolutions, sr, firstSample=0, 
+        queueSize=500, batchSize=50):
+        '''
+        Parameters:
+        -----------
+        path : str, file name without extension
+        channelNames : list of str, names of the channels
+        resolutions : list of float, resolution of each channel
+        sr : int, sampling rate
+        firstSample : int, absolute sample index of the first sample pushed 
+            (e.g. Gather.sampleCount when the recording starts)
+        queueSize : int, maximum number of blocks waiting to be written
+        batchSize : int, maximum number of blocks written with one call
+        '''
+        self.path = path
+        self.channelNames = list(channelNames)
+        self.channelCount = len(self.channelNames)
+        self.sr = int(sr)
+        self.batchSize = batchSize
+        self.queue = queue.Queue(maxsize=queueSize)
+        self.droppedBlocks = 0
+        # (first sample, number of samples) of each run of dropped blocks
+        self.droppedRanges = []
+        # Absolute index of the next sample pushed
+        self.firstSample = int(firstSample)
+        self.pushedSamples = self.firstSample
+        # NaN samples and markers of dropped blocks, written before the next 
+        # block that is accepted
+        self.pendingGap = 0
+        self.pendingMarkers = []
+        self.writtenBlocks = 0
+        self.writtenSamples = 0
+        self.writeCalls = 0
+        # Set by close(), blocks pushed afterwards are ignored
+        self.closed = False
+
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.isdir(directory):
+            os.makedirs(directory)
+        header = json.dumps(dict(version=VERSION, channelNames=self.channelNames, 
+            resolutions=list(resolutions), sr=sr, dtype='<f4', 
+            layout='multiplexed', firstSample=self.firstSample)).encode('utf-8')
+        self.dataFile = open(path + '.oct', 'wb')
+        self.dataFile.write(MAGIC + pack('<L', len(header)) + header)
+        self.markerFile = open(path + '.markers.tsv', 'w')
+        self.markerFile.write('sample\ttype\tdescription\tpoints\tchannel\n')
+
+        self.thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.thread.start()
+        print(f'Recording raw data to {path}.oct')
+
+    @property
+    def queueDepth(self):
+        ''' Number of blocks waiting to be written.'''
+        return self.queue.qsize()
+
+    def stats(self):
+        ''' Summary of the recorder state.'''
+        return dict(queueDepth=self.queueDepth, droppedBlocks=self.droppedBlocks,
+            droppedRanges=list(self.droppedRanges), writtenBlocks=self.writtenBlocks, writtenSamples=self.writtenSamples, 
+            writeCalls=self.writeCalls)
+
+    def push(self, data, markers=None):
+        ''' Hand over a block without blocking. The data must not be modified 
+        afterwards.
+        Parameters:
+        -----------
+        data : numpy.ndarray, channels x time points
+        markers : dict/None, marker columns 'sample', 'type', 'description', 
+            'points' and 'channel' (absolute sample indices)
+        '''
+        self.enqueue(data, data.shape[1], markers)
+
+    def push_gap(self, n):
+        ''' Hand over n missing samples (e.g. a gap of the stream) without 
+        blocking. They are written as NaN.'''
+        if n > 0:
+            self.enqueue(None, int(n))
+
+    def enqueue(self, data, n, markers=None):
+        ''' Put a block (None: n missing samples) into the queue, preceded by 
+        the samples dropped since the last block that was accepted.'''
+        if self.closed:
+            return
+        gap = self.pendingGap if data is not None else self.pendingGap + n
+        try:
+            self.queue.put_nowait((gap, self.pendingMarkers, data, markers))
+            self.pendingGap = 0
+            self.pendingMarkers = []
+        except queue.Full:
+            if data is not None:
+                self.droppedBlocks += 1
+                if len(self.droppedRanges) > 0 and sum(self.droppedRanges[-1]) == self.pushedSamples:
+                    start, count = self.droppedRanges[-1]
+                    self.droppedRanges[-1] = (start, count + n)
+                else:
+                    self.droppedRanges.append((self.pushedSamples, n))
+            self.pendingGap += n
+            if markers is not None:
+                self.pendingMarkers.append(markers)
+        self.pushedSamples += n
+
+    def writer_loop(self):
+        ''' Drain the queue in batches until close() is called.'''
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            # Nothing after the sentinel
+            while len(batch) < self.batchSize and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                # Sentinel from close()
+                batch.pop()
+                running = False
+            if len(batch) > 0:
+                self.write_batch(batch)
+
+    def write_batch(self, batch):
+        ''' Write a list of (gap, gap markers, data, markers) with one call per 
+        file. Gaps (NaN) longer than a second are written in separate calls.'''
+        parts = []
+        lines = []
+        for gap, gapMarkers, data, markers in batch:
+            parts.append(gap)
+            if data is not None:
+                parts.append(data)
+                self.writtenBlocks += 1
+            for blockMarkers in gapMarkers + [markers]:
+                if blockMarkers is None:
+                    continue
+                for row in zip(blockMarkers['sample'], blockMarkers['type'], blockMarkers['description'], 
+                    blockMarkers['points'], blockMarkers['channel']):
+                    lines.append('\t'.join([str(r) for r in row]) + '\n')
+        blocks = []
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                blocks.append(part)
+            elif part <= self.sr:
+                blocks.append(np.full((self.channelCount, part), np.nan, dtype='<f4'))
+            else:
+                self.write_data(blocks)
+                blocks = []
+                # Long gaps second by second
+                nanBlock = np.full((self.sr, self.channelCount), np.nan, dtype='<f4').tobytes()
+                for _ in range(part // self.sr):
+                    self.dataFile.write(nanBlock)
+                self.write_data([np.full((self.channelCount, part % self.sr), np.nan, dtype='<f4')])
+                self.writtenSamples += part - part % self.sr
+        self.write_data(blocks)
+        if len(lines) > 0:
+            self.markerFile.write(''.join(lines))
+
+    def write_data(self, blocks):
+        ''' Append blocks (channels x time points) with one write call.'''
+        blocks = [block for block in blocks if block.shape[1] > 0]
+        if len(blocks) == 0:
+            return
+        data = np.concatenate(blocks, axis=1)
+        self.dataFile.write(np.ascontiguousarray(data.T, dtype='<f4').tobytes())
+        self.writeCalls += 1
+        self.writtenSamples += data.shape[1]
+
+    def close(self, timeout=5):
+        ''' Write what is left in the queue and close the files.'''
+        self.closed = True
+        if self.pendingGap > 0:
+            # Samples dropped at the end
+            self.queue.put((self.pendingGap, self.pendingMarkers, None, None), timeout=timeout)
+        self.queue.put(None, timeout=timeout)
+        self.thread.join(timeout=timeout)
+        self.dataFile.close()
+        self.markerFile.close()
+        print(f'Recording stopped ({self.writtenSamples} samples, {self.droppedBlocks} dropped blocks)')
+
+def read_recording(path):
+    ''' Load a recording written by Recorder.
+    Parameters:
+    -----------
+    path : str, file name without extension
+
+    Return:
+    -------
+    header : dict, channelNames, resolutions, sr, dtype, firstSample (absolute
+        sample index of the first sample in data)
+    data : numpy.memmap, channels x time points (memory-mapped, read-only)
+    markers : dict of lists, 'sample', 'type', 'description', 'points', 'channel'
+    '''
+    with open(path + '.oct', 'rb') as f:
+        magic = f.read(4)
+        assert magic == MAGIC, "{}.oct is not a recording (magic {})".format(path, magic)
+        (headerSize, ) = unpack('<L', f.read(4))
+        header = json.loads(f.read(headerSize).decode('utf-8'))
+    # Recordings without it started at the first sample of the stream
+    header.setdefault('firstSample', 0)
+    offset = 8 + headerSize
+    channelCount = len(header['channelNames'])
+    fileSize = os.path.getsize(path + '.oct')
+    n_samples = (fileSize - offset) // (4 * channelCount)
+    if n_samples == 0:
+        data = np.empty((channelCount, 0), dtype=header['dtype'])
+    else:
+        data = np.memmap(path + '.oct', dtype=header['dtype'], mode='r', offset=offset, 
+            shape=(n_samples, channelCount)).T
+
+    markers = dict(sample=[], type=[], description=[], points=[], channel=[])
+    if os.path.isfile(path + '.markers.tsv'):
+        with open(path + '.markers.tsv', 'r') as f:
+            next(f)
+            for line in f:
+                sample, typ, description, points, channel = line.rstrip('\n').split('\t')
+                markers['sample'].append(int(sample))
+                markers['type'].append(typ)
+                markers['description'].append(description)
+                markers['points'].append(int(points))
+                markers['channel'].append(int(channel))
+    return header, data, markers
@@ -0,0 +1 @@
+from .replay import *
\ No newline at end of file
@@ -0,0 +1,342 @@
+import socket
+import threading
+import time
+import argparse
+from struct import pack
+import numpy as np
+from scipy import signal
+from octopus.recorder import read_recording
+
+# GUID that starts every RDA message header
+RDA_GUID = bytes([0x8E, 0x45, 0x58, 0x43, 0x96, 0xC9, 0x86, 0x4C, 
+    0xAF, 0x4A, 0x98, 0xBB, 0xF6, 0xC9, 0x14, 0x50])
+
+def encode_message(msgtype, body=b''):
+    ''' Prefix a message body with the RDA header (GUID, size, type).'''
+    return RDA_GUID + pack('<LL', 24 + len(body), msgtype) + body
+
+def encode_start(channelNames, sr, resolutions=None):
+    ''' Start message (type 1): channel count, sampling interval [µs], 
+    resolutions and zero terminated channel names.'''
+    channelCount = len(channelNames)
+    if resolutions is None:
+        resolutions = [0.1] * channelCount
+    body = pack('<Ld', channelCount, 1e6 / sr)
+    body += np.asarray(resolutions, dtype='<f8').tobytes()
+    body += b''.join([name.encode('utf-8') + b'\x00' for name in channelNames])
+    return encode_message(1, body)
+
+def encode_data(block, data, markers=None):
+    ''' Data message (type 4) with 32 bit float samples.
+    Parameters:
+    -----------
+    block : int, block counter
+    data : numpy.ndarray, channels x points
+    markers : dict/None, lists 'position' (relative to the block), 'points', 
+        'channel', 'type' and 'description'
+    '''
+    channelCount, points = data.shape
+    markerCount = 0 if markers is None else len(markers['position'])
+    parts = [pack('<LLL', block % 2**32, points, markerCount), 
+        np.ascontiguousarray(data.T, dtype='<f4').tobytes()]
+    for m in range(markerCount):
+        strings = (markers['type'][m].encode('utf-8') + b'\x00' 
+            + markers['description'][m].encode('utf-8') + b'\x00')
+        parts.append(pack('<LLLl', 16 + len(strings), markers['position'][m], 
+            markers['points'][m], markers['channel'][m]) + strings)
+    return encode_message(4, b''.join(parts))
+
+def encode_stop():
+    ''' Stop message (type 3).'''
+    return encode_message(3)
+
+
+class RandomWalkSource:
+    ''' Synthetic data: independent random walks on every channel with a 
+    "S 10" marker at a fixed interval.'''
+    def __init__(self, channelCount=32, sr=1000, markerIntervalS=2.0, seed=0):
+        self.channelCount = channelCount
+        self.sr = sr
+        self.channelNames = ['Ch{}'.format(i+1) for i in range(channelCount)]
+        self.resolutions = [0.1] * channelCount
+        self.markerInterval = int(round(markerIntervalS * sr))
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        self.rng = np.random.default_rng(self.seed)
+        self.state = np.zeros((self.channelCount, 1), dtype=np.float32)
+        self.sample = 0
+
+    def read(self, n):
+        ''' Next n samples (channels x n) and the markers within them.'''
+        data = self.rng.standard_normal((self.channelCount, n), dtype=np.float32)
+        data = np.cumsum(data, axis=1) + self.state
+        self.state = data[:, -1:]
+        positions = np.arange(-self.sample % self.markerInterval, n, self.markerInterval).tolist()
+        self.sample += n
+        markers = dict(position=positions, points=[1]*len(positions), 
+            channel=[-1]*len(positions), type=['Stimulus']*len(positions), 
+            description=['S 10']*len(positions))
+        return data, markers
+
+
+class SyntheticSource:
+    ''' Synthetic EEG made of slow cortical potentials (SCP), alpha
+    oscillations, white noise, eye blinks that leak into all channels and
+    sporadic spike artifacts. All channels of a block are generated at once
+    from a seeded generator, so a given seed and block size always yield the
+    same stream.
+    '''
+    def __init__(self, channelCount=7, sr=1000, channelNames=None, seed=0,
+        scpAmplitude=10.0, scpTimeConstantS=2.0, alphaAmplitude=5.0, alphaFreq=10.0,
+        noiseAmplitude=2.0, eogChannel='VEOG', eogRate=0.5, eogAmplitude=100.0,
+        eogDurationS=0.3, eogLeakage=0.5, artifactRate=0.0, artifactAmplitude=200.0,
+        markerIntervalS=None):
+        '''
+        Parameters:
+        -----------
+        channelCount : int, number of channels (ignored if channelNames are given)
+        sr : int, sampling rate
+        channelNames : list/None, channel names. Default: Ch1, Ch2, ... and the EOG
+            channel as last channel.
+        seed : int/None, seed of the random generator
+        scpAmplitude : float, standard deviation of the SCP drift in µV
+        scpTimeConstantS : float, time constant of the SCP drift in seconds
+        alphaAmplitude : float, maximum alpha amplitude in µV
+        alphaFreq : float, alpha frequency in Hz
+        noiseAmplitude : float, standard deviation of the white noise in µV
+        eogChannel : str/None, name of the EOG channel. None disables blinks.
+        eogRate : float, blinks per second
+        eogAmplitude : float, blink amplitude in µV on the EOG channel
+        eogDurationS : float, duration of a blink in seconds
+        eogLeakage : float, fraction of the blink that leaks into the other channels
+        artifactRate : float, spike artifacts per channel and second
+        artifactAmplitude : float, amplitude of spike artifacts in µV
+        markerIntervalS : float/None, interval of "S 10" markers (None = no markers)
+        '''
+        if channelNames is None:
+            channelNames = ['Ch{}'.format(i+1) for i in range(channelCount)]
+            if eogChannel is not None:
+                channelNames[-1] = eogChannel
+        self.channelNames = list(channelNames)
+        self.channelCount = len(self.channelNames)
+        self.sr = sr
+        self.resolutions = [0.1] * self.channelCount
+        self.seed = seed
+        self.scpAmplitude = scpAmplitude
+        self.scpCoefficient = np.exp(-1 / (scpTimeConstantS * sr))
+        self.alphaAmplitude = alphaAmplitude
+        self.alphaFreq = alphaFreq
+        self.noiseAmplitude = noiseAmplitude
+        self.eogRate = eogRate if eogChannel in self.channelNames else 0
+        # Half a sine wave per blink
+        eogPoints = max(int(eogDurationS * sr), 1)
+        self.eogKernel = np.sin(np.pi * np.arange(eogPoints) / eogPoints) * eogAmplitude
+        # Weight of the blink signal on each channel
+        self.eogWeights = np.full((self.channelCount, 1), eogLeakage)
+        if self.eogRate > 0:
+            self.eogWeights[self.channelNames.index(eogChannel)] = 1
+        self.artifactRate = artifactRate
+        self.artifactAmplitude = artifactAmplitude
+        self.markerInterval = None if markerIntervalS is None else int(round(markerIntervalS * sr))
+        self.reset()
+
+    def reset(self):
+        self.rng = np.random.default_rng(self.seed)
+        self.sample = 0
+        # Filter state of the SCP drift, scaled so that it starts in its stationary state
+        self.scpState = self.rng.standard_normal((self.channelCount, 1)) * self.scpAmplitude * self.scpCoefficient
+        self.alphaPhase = self.rng.uniform(0, 2*np.pi, (self.channelCount, 1))
+        self.alphaGain = self.rng.uniform(0.5, 1, (self.channelCount, 1)) * self.alphaAmplitude
+        # Part of the blinks that reaches into the next block
+        self.eogTail = np.zeros(len(self.eogKernel) - 1)
+
+    def read(self, n):
+        ''' Next n samples (channels x n) and the markers within them.'''
+        noise = self.rng.standard_normal((self.channelCount, n))
+        # SCP: first order autoregressive drift
+        scpGain = self.scpAmplitude * np.sqrt(1 - self.scpCoefficient**2)
+        data, self.scpState = signal.lfilter([scpGain], [1, -self.scpCoefficient],
+            self.rng.standard_normal((self.channelCount, n)), axis=1, zi=self.scpState)
+        data += noise * self.noiseAmplitude
+        t = (self.sample + np.arange(n)) / self.sr
+        data += self.alphaGain * np.sin(2*np.pi*self.alphaFreq*t + self.alphaPhase)
+
+        if self.eogRate > 0:
+            onsets = (self.rng.random(n) < self.eogRate / self.sr).astype(float)
+            eog = np.convolve(onsets, self.eogKernel)
+            eog[:len(self.eogTail)] += self.eogTail
+            self.eogTail = eog[n:]
+            data += self.eogWeights * eog[:n]
+
+        if self.artifactRate > 0:
+            channels, positions = np.nonzero(self.rng.random((self.channelCount, n)) < self.artifactRate / self.sr)
+            data[channels, positions] += self.rng.choice([-1, 1], len(positions)) * self.artifactAmplitude
+
+        if self.markerInterval is None:
+            positions = []
+        else:
+            positions = np.arange(-self.sample % self.markerInterval, n, self.markerInterval).tolist()
+        self.sample += n
+        markers = dict(position=positions, points=[1]*len(positions),
+            channel=[-1]*len(positions), type=['Stimulus']*len(positions),
+            description=['S 10']*len(positions))
+        return data, markers
+
+
+class RecordingSource:
+    ''' Replays a recording written by recorder.Recorder, starting over at the end.'''
+    def __init__(self, path):
+        header, self.data, markers = read_recording(path)
+        self.channelNames = header['channelNames']
+        self.channelCount = len(self.channelNames)
+        self.resolutions = header['resolutions']
+        self.sr = header['sr']
+        # Markers hold absolute samples of the stream, the file starts at firstSample
+        self.markerSamples = np.array(markers['sample'], dtype=np.int64) - header['firstSample']
+        self.markers = markers
+        assert self.data.shape[1] > 0, "recording {} contains no data".format(path)
+        self.reset()
+
+    def reset(self):
+        self.sample = 0
+
+    def read(self, n):
+        ''' Next n samples (channels x n) and the markers within them.'''
+        total = self.data.shape[1]
+        idx = (self.sample + np.arange(n)) % total
+        data = np.asarray(self.data[:, idx], dtype=np.float32)
+        start = self.sample % total
+        if start + n <= total:
+            hits = np.flatnonzero((self.markerSamples >= start) & (self.markerSamples < start + n))
+            positions = (self.markerSamples[hits] - start).tolist()
+        else:
+            # Markers are not replayed across the wrap-around
+            hits, positions = [], []
+        self.sample += n
+        markers = dict(position=positions, 
+            points=[self.markers['points'][i] for i in hits], 
+            channel=[self.markers['channel'][i] for i in hits], 
+            type=[self.markers['type'][i] for i in hits], 
+            description=[self.markers['description'][i] for i in hits])
+        return data, markers
+
+
+class RDAReplayServer:
+    ''' Local server speaking the BrainVision Remote Data Access wire format 
+    (start message type 1, float data type 4 incl. markers, stop type 3). 
+    It replays a synthetic or recorded source in real time, N times faster 
+    or as fast as possible, so that Gather can be load tested without 
+    BrainVision Recorder. Clients are served one after another; each gets the
+    source from the beginning.
+    '''
+    def __init__(self, source, host='', port=51244, blockSize=None, speed=1.0, 
+        durationS=None):
+        '''
+        Parameters:
+        -----------
+        source : RandomWalkSource/SyntheticSource/RecordingSource or any object with channelNames,
+            resolutions, sr, reset() and read(n)
+        host : str, interface to listen on ('' = all)
+        port : int, port to listen on (0 = pick a free port, see self.port)
+        blockSize : int/None, points per block. Default: 20 ms of data.
+        speed : float/None, replay speed relative to real time. None sends as 
+            fast as possible.
+        durationS : float/None, send a stop message after this many seconds of 
+            data (None = stream until the client disconnects)
+        '''
+        self.source = source
+        self.blockSize = blockSize if blockSize is not None else int(round(source.sr / 50))
+        self.speed = speed
+        self.durationS = durationS
+        self.blocksSent = 0
+        self.bytesSent = 0
+        self.clients = 0
+        self.running = False
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.server.settimeout(0.2)
+        self.port = self.server.getsockname()[1]
+
+    def start(self):
+        ''' Serve clients in a background thread.'''
+        self.running = True
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.running = True
+        while self.running:
+            try:
+                con, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.clients += 1
+            try:
+                self.stream(con)
+            except OSError:
+                # Client disconnected
+                pass
+            finally:
+                con.close()
+
+    def stream(self, con):
+        ''' Send start message, data blocks on absolute deadlines and stop message.'''
+        con.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.source.reset()
+        con.sendall(encode_start(self.source.channelNames, self.source.sr, 
+            self.source.resolutions))
+        blockDurS = self.blockSize / self.source.sr
+        n_blocks = None if self.durationS is None else int(self.durationS / blockDurS)
+        block = 0
+        t0 = time.perf_counter()
+        while self.running and (n_blocks is None or block < n_blocks):
+            data, markers = self.source.read(self.blockSize)
+            message = encode_data(block, data, markers)
+            if self.speed is not None:
+                delay = t0 + (block + 1) * blockDurS / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            con.sendall(message)
+            self.blocksSent += 1
+            self.bytesSent += len(message)
+            block += 1
+        con.sendall(encode_stop())
+
+    def stop(self):
+        self.running = False
+        if hasattr(self, 'thread'):
+            self.thread.join(timeout=2)
+        self.server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay synthetic or recorded EEG as BrainVision RDA server.')
+    parser.add_argument('--recording', default=None, help='recording to replay (file name without extension)')
+    parser.add_argument('--channels', type=int, default=32, help='number of synthetic channels')
+    parser.add_argument('--sr', type=int, default=1000, help='sampling rate of synthetic data')
+    parser.add_argument('--block-size', type=int, default=None, help='points per block (default: 20 ms)')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed, 0 = as fast as possible')
+    parser.add_argument('--port', type=int, default=51244)
+    args = parser.parse_args()
+
+    if args.recording is not None:
+        source = RecordingSource(args.recording)
+    else:
+        source = SyntheticSource(args.channels, args.sr, markerIntervalS=2.0)
+    server = RDAReplayServer(source, port=args.port, blockSize=args.block_size, 
+        speed=args.speed if args.speed > 0 else None)
+    print(f'Replaying {source.channelCount} channels at {source.sr} Hz on port {server.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,13 @@
 import numpy as np
 import time
 import ctypes
+import bisect
 from pyqtgraph.functions import interpolateArray
 
 from scipy.stats import pearsonr
 from scipy.optimize import minimize_scalar
 
-from scipy.signal import periodogram
+from scipy.signal import periodogram, get_window
 from scipy import argmax, trapz
 
 import random
@@ -39,7 +40,9 @@ def insert(arr, piece):
         piece = np.expand_dims(piece, axis=0)
 
     piecelen = piece.shape[1]
-    new_arr = np.zeros(arr.shape)
+    # Keep float32 data in float32
+    dtype = np.result_type(arr, piece) if arr.dtype.kind == 'f' else np.float64
+    new_arr = np.zeros(arr.shape, dtype=dtype)
     new_arr[:, 0:-piecelen] = arr[:, piecelen:]
     new_arr[:, -piecelen:] = piece
 
@@ -119,8 +122,276 @@ def bandpower(x, fs, fmin, fmax):
     return trapz(Pxx[ind_min: ind_max], f[ind_min: ind_max])
 
 
+class BandPowerEngine:
+    ''' Band power of many channels at once, with the semantics of bandpower:
+    periodogram (constant detrend, density scaling, one-sided) zero-padded to 
+    padFactor times the length, integrated with the trapezoidal rule between 
+    the bins below fmin and fmax. All channels go through one real FFT along
+    the last axis or, if the band has few bins, one product with the DFT 
+    matrix of those bins. Window, nfft, scaling, band bins and DFT matrix are
+    computed once per (length, sr, band) and cached. NaNs are interpolated linearly per channel 
+    (see interp_nans_2d), channels without any valid sample get the power 0.
+    Several bands of the same data are cheaper from one periodogram (see 
+    spectrum and band).
+    '''
+    def __init__(self, window='boxcar', padFactor=10):
+        '''
+        Parameters:
+        -----------
+        window : str/tuple, window of the periodogram (see scipy.signal.get_window)
+        padFactor : int, nfft in multiples of the data length
+        '''
+        self.window = window
+        self.padFactor = padFactor
+        # (length, sr) and (length, sr, fmin, fmax) -> plan, replaced as a 
+        # whole (see spectrum_plan and plan)
+        self.plans = dict()
+
+    def spectrum_plan(self, n, sr):
+        ''' Window, nfft, frequencies and scaling of the periodogram of data of
+        length n.'''
+        key = (n, sr)
+        plan = self.plans.get(key)
+        if plan is not None:
+            return plan
+        nfft = n * self.padFactor
+        window = get_window(self.window, n)
+        f = np.fft.rfftfreq(nfft, 1 / sr)
+        # Density scaling, doubled for the one-sided spectrum (not DC and Nyquist)
+        scale = np.full(len(f), 2 / (sr * np.sum(window ** 2)))
+        scale[0] /= 2
+        if nfft % 2 == 0:
+            scale[-1] /= 2
+        plan = dict(nfft=nfft, window=window, f=f, scale=scale)
+        self.plans = {**self.plans, key: plan}
+        return plan
+
+    def plan(self, n, sr, fmin, fmax):
+        ''' Window, nfft, scaling and frequency bins of a band for data of 
+        length n.'''
+        key = (n, sr, fmin, fmax)
+        plan = self.plans.get(key)
+        if plan is not None:
+            return plan
+        spectrumPlan = self.spectrum_plan(n, sr)
+        nfft, window, f, scale = [spectrumPlan[name] for name in ('nfft', 'window', 'f', 'scale')]
+        # Same bins as bandpower
+        bins = slice(argmax(f > fmin) - 1, argmax(f > fmax) - 1)
+        indices = np.arange(len(f))[bins]
+        kernel = None
+        if len(indices) * n < nfft * np.log2(nfft):
+            # Fewer operations than the FFT: DFT of the band bins only (windowed),
+            # real and imaginary parts as real columns (no complex copy of the data)
+            phase = 2 * np.pi * np.outer(np.arange(n), indices) / nfft
+            kernel = window[:, np.newaxis] * np.hstack([np.cos(phase), np.sin(phase)])
+            # Centered columns: data @ kernel is the DFT of the detrended data
+            kernel -= kernel.mean(axis=0)
+        plan = dict(nfft=nfft, window=window, f=f[bins], scale=scale[bins], bins=bins, 
+            indices=indices, kernel=kernel)
+        self.plans = {**self.plans, key: plan}
+        return plan
+
+    def power(self, data, sr, fmin, fmax):
+        ''' Band power of each channel.
+        Parameters:
+        -----------
+        data : list/numpy.ndarray, 1- or 2-D data (channels x time points). 
+            More leading dimensions (e.g. windows x channels x time points) 
+            are processed in the same pass.
+        sr : int, sampling rate
+        fmin, fmax : float, edges of the band in Hz
+
+        Return:
+        -------
+        power : numpy.ndarray, band power of each channel
+        '''
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim == 1:
+            data = data[np.newaxis, :]
+        shape = data.shape[:-1]
+        data = data.reshape(-1, data.shape[-1])
+        plan = self.plan(data.shape[1], sr, fmin, fmax)
+        empty = np.isnan(data).all(axis=1)
+        data = interp_nans_2d(data)
+        if plan['kernel'] is not None:
+            parts = (data @ plan['kernel']) ** 2
+            pxx = parts[:, :len(plan['indices'])] + parts[:, len(plan['indices']):]
+        else:
+            data = data - data.mean(axis=1, keepdims=True)
+            spectrum = np.fft.rfft(data * plan['window'], n=plan['nfft'], axis=-1)[:, plan['bins']]
+            pxx = spectrum.real ** 2 + spectrum.imag ** 2
+        power = trapz(pxx * plan['scale'], plan['f'], axis=-1)
+        power[empty] = 0
+        return power.reshape(shape)
+
+    def spectrum(self, data, sr):
+        ''' Periodogram of each channel, from which the power of any band can 
+        be taken (see band).
+        Parameters:
+        -----------
+        data : list/numpy.ndarray, 1- or 2-D data (channels x time points), 
+            or more dimensions (see power)
+        sr : int, sampling rate
+
+        Return:
+        -------
+        spectrum : dict, length n and sampling rate sr of the data and the 
+            power spectral density pxx (channels x frequencies, see spectrum_plan)
+        '''
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim == 1:
+            data = data[np.newaxis, :]
+        shape = data.shape[:-1]
+        data = data.reshape(-1, data.shape[-1])
+        plan = self.spectrum_plan(data.shape[1], sr)
+        empty = np.isnan(data).all(axis=1)
+        data = interp_nans_2d(data)
+        data = (data - data.mean(axis=1, keepdims=True)) * plan['window']
+        spectrum = np.fft.rfft(data, n=plan['nfft'], axis=-1)
+        pxx = (spectrum.real ** 2 + spectrum.imag ** 2) * plan['scale']
+        pxx[empty] = 0
+        return dict(n=data.shape[1], sr=sr, pxx=pxx.reshape(shape + pxx.shape[-1:]))
+
+    def band(self, spectrum, fmin, fmax, channels=None):
+        ''' Band power of each channel from a periodogram (see spectrum). 
+        Equals power() of the data.
+        Parameters:
+        -----------
+        spectrum : dict, see spectrum
+        fmin, fmax : float, edges of the band in Hz
+        channels : list/None, channels (second to last axis) of the 
+            periodogram (default: all)
+        '''
+        plan = self.plan(spectrum['n'], spectrum['sr'], fmin, fmax)
+        pxx = spectrum['pxx'] if channels is None else spectrum['pxx'][..., channels, :]
+        return trapz(pxx[..., plan['bins']], plan['f'], axis=-1)
+
+band_power_engine = BandPowerEngine()
+
+class SlidingBandPower:
+    ''' Band power of the newest windowSize samples of each channel, updated 
+    with every block in O(bins x channels) per sample by a sliding DFT on 
+    the bins of the band. Gives the same values as BandPowerEngine (boxcar 
+    window) on that window.
+
+    The DFT coefficients are accumulated with the phase of the absolute 
+    sample index (T_k = sum x[i] exp(-2 pi j k i / nfft) over the window), so
+    a sample is added when it enters and subtracted when it leaves the window
+    without the drift of the recursive form. The mean (constant detrend) is 
+    tracked alongside. Rounding errors are removed by recomputing the sums 
+    from the window every resyncSamples. Windows containing NaN are passed 
+    to BandPowerEngine (interpolation).
+    '''
+    def __init__(self, channelCount, sr, windowSize, fmin, fmax, engine=None, 
+        resyncSamples=None):
+        '''
+        Parameters:
+        -----------
+        channelCount : int, number of channels
+        sr : int, sampling rate
+        windowSize : int, samples per window
+        fmin, fmax : float, edges of the band in Hz
+        engine : BandPowerEngine/None, engine whose bins and scaling are used 
+            (default: band_power_engine). Its window must be a boxcar.
+        resyncSamples : int/None, samples between exact recomputations of the
+            sums (default: 60 s)
+        '''
+        self.engine = band_power_engine if engine is None else engine
+        assert self.engine.window == 'boxcar', "The sliding DFT needs a boxcar window but the engine has {}".format(self.engine.window)
+        self.channelCount = channelCount
+        self.sr = sr
+        self.windowSize = int(windowSize)
+        self.band = (fmin, fmax)
+        self.plan = self.engine.plan(self.windowSize, sr, fmin, fmax)
+        self.frequencies = self.plan['indices'] / self.plan['nfft']
+        # Sum of exp(-2 pi j k m / nfft) over the window (DFT of a constant)
+        self.ones = self.phases(np.arange(self.windowSize)).sum(axis=0)
+        # Trapezoidal rule and density scaling as one weight per bin
+        f = self.plan['f']
+        weights = np.zeros(len(f))
+        if len(f) > 1:
+            weights[:-1] += np.diff(f) / 2
+            weights[1:] += np.diff(f) / 2
+        self.weights = weights * self.plan['scale']
+        self.resyncSamples = int(60 * sr if resyncSamples is None else resyncSamples)
+        self.reset()
+
+    def reset(self):
+        ''' Start with an empty window.'''
+        self.window = np.zeros((self.channelCount, self.windowSize))
+        self.nans = np.zeros((self.channelCount, self.windowSize), dtype=bool)
+        # Number of samples received, absolute index of the next sample
+        self.sampleCount = 0
+        self.sums = np.zeros((self.channelCount, len(self.ones)), dtype=complex)
+        self.total = np.zeros(self.channelCount)
+        self.nanCount = 0
+        self.lastResync = 0
+
+    def phases(self, samples):
+        ''' exp(-2 pi j k i / nfft) of absolute sample indices i (rows) and 
+        the bins k of the band (columns).'''
+        samples = np.asarray(samples) % self.plan['nfft']
+        return np.exp(-2j * np.pi * np.multiply.outer(samples, self.frequencies))
+
+    def update(self, data):
+        ''' Add the next samples (channels x time points). Samples that leave
+        the window are subtracted.'''
+        data = np.asarray(data, dtype=np.float64)
+        n = data.shape[1]
+        if n == 0:
+            return
+        if n >= self.windowSize:
+            # Nothing of the window survives
+            sampleCount = self.sampleCount + n - self.windowSize
+            self.reset()
+            self.sampleCount = self.lastResync = sampleCount
+            data = data[:, n - self.windowSize:]
+            n = self.windowSize
+        samples = np.arange(self.sampleCount, self.sampleCount + n)
+        positions = samples % self.windowSize
+        nans = np.isnan(data)
+        values = np.where(nans, 0, data)
+        # The leaving samples are zero while the window fills up
+        leaving = self.window[:, positions]
+        self.sums += values @ self.phases(samples) - leaving @ self.phases(samples - self.windowSize)
+        self.total += values.sum(axis=1) - leaving.sum(axis=1)
+        self.nanCount += int(nans.sum()) - int(self.nans[:, positions].sum())
+        self.window[:, positions] = values
+        self.nans[:, positions] = nans
+        self.sampleCount += n
+        if self.sampleCount - self.lastResync >= self.resyncSamples:
+            self.resync()
+
+    def resync(self):
+        ''' Recompute the sums from the window.'''
+        samples = np.arange(self.sampleCount - self.windowSize, self.sampleCount)
+        values = self.window[:, samples % self.windowSize]
+        self.sums = values @ self.phases(samples)
+        self.total = values.sum(axis=1)
+        self.lastResync = self.sampleCount
+
+    def data(self):
+        ''' The window in temporal order (channels x windowSize), NaN where
+        samples are missing.'''
+        order = np.arange(self.sampleCount - self.windowSize, self.sampleCount) % self.windowSize
+        return np.where(self.nans, np.nan, self.window)[:, order]
+
+    def power(self):
+        ''' Band power of each channel (see BandPowerEngine.power). NaN until
+        the window is full.'''
+        if self.sampleCount < self.windowSize:
+            return np.full(self.channelCount, np.nan)
+        if self.nanCount > 0:
+            return self.engine.power(self.data(), self.sr, *self.band)
+        mean = self.total / self.windowSize
+        # Constant detrend, with the phase of the first sample of the window
+        start = self.phases(self.sampleCount - self.windowSize)
+        spectrum = self.sums - np.outer(mean, start * self.ones)
+        return (spectrum.real ** 2 + spectrum.imag ** 2) @ self.weights
+
 def freq_band_power(data, freqs, sr):
     ''' Simple function to calculate the frequency band power for a set of electrodes.
+    All electrodes are processed at once (see BandPowerEngine).
     Paramters:
     ----------
     data : list/numpy.ndarray, 1- or 2-D data.
@@ -132,20 +403,27 @@ def freq_band_power(data, freqs, sr):
     meanScoreList : average frequency band power across selected channels.
 
     '''
-
-    if type(data) == list:
-        data = np.array(data)
-    if len(data.shape) == 1:
-        data = np.expand_dims(data, axis=0)
-
-    scoreList = []
-    # loop through all electrodes
-    for elec in range(data.shape[0]):
-        # Calculate score
-        scoreList.append(bandpower(data[elec, :], sr, *freqs))
-    meanScoreList = np.mean(scoreList)
-    
-    return meanScoreList
+    return np.mean(band_power_engine.power(data, sr, *freqs))
+
+def interp_nans_2d(data):
+    ''' Linear interpolation of NaNs along the last axis of a 2-D array, 
+    like interp_nans for each row (NaNs at the edges take the nearest valid 
+    value). Rows without valid samples stay NaN.'''
+    nans = np.isnan(data)
+    if not nans.any():
+        return data
+    n = data.shape[1]
+    index = np.arange(n)
+    # Nearest valid sample before and after each sample
+    before = np.maximum.accumulate(np.where(nans, -1, index), axis=1)
+    after = np.minimum.accumulate(np.where(nans, n, index)[:, ::-1], axis=1)[:, ::-1]
+    before, after = np.where(before < 0, after, before), np.where(after >= n, before, after)
+    rows = np.arange(data.shape[0])[:, np.newaxis]
+    low = data[rows, np.clip(before, 0, n - 1)]
+    high = data[rows, np.clip(after, 0, n - 1)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(after > before, (index - before) / (after - before), 0)
+    return np.where(nans, low + weight * (high - low), data)
         
 def nan_helper(y):
     """Helper to handle indices and logical indices of NaNs.
@@ -169,6 +447,131 @@ def interp_nans(y):
     y[nans] = np.interp(x(nans), x(~nans), y[~nans])
     return y
 
+class P2Quantile:
+    ''' Streaming estimate of a quantile with the P-square algorithm (Jain & 
+    Chlamtac, 1985): five markers (minimum, p/2, p, (1+p)/2 quantile and 
+    maximum) are moved towards their desired positions with a piecewise 
+    parabolic prediction. O(1) memory and time per value.
+    '''
+    def __init__(self, p=0.5):
+        '''
+        Parameters:
+        -----------
+        p : float, quantile (0 < p < 1)
+        '''
+        assert 0 < p < 1, "p must be between 0 and 1 but is {}".format(p)
+        self.p = p
+        # Desired position increments of the markers
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+        self.reset()
+
+    def reset(self):
+        ''' Forget all values.'''
+        self.count = 0
+        # Heights and (0-based) positions of the markers (floats, a value is 
+        # added on every score)
+        self.heights = []
+        self.positions = [0., 1., 2., 3., 4.]
+        self.desired = [0, 2 * self.p, 4 * self.p, 2 + 2 * self.p, 4]
+
+    def add(self, x):
+        ''' Add a value. NaN is ignored.'''
+        x = float(x)
+        if x != x:
+            return
+        self.count += 1
+        if self.count <= 5:
+            self.heights.append(x)
+            if self.count == 5:
+                self.heights.sort()
+            return
+        q, n = self.heights, self.positions
+        # Cell of x, extremes are moved
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Parabolic prediction, linear if it leaves the neighbours
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) + 
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    @property
+    def value(self):
+        ''' Current estimate of the quantile (NaN without values).'''
+        if self.count == 0:
+            return np.nan
+        if self.count < 5:
+            return float(np.quantile(self.heights, self.p))
+        return self.heights[2]
+
+class RunningRobustStats:
+    ''' Streaming median and median absolute deviation (MAD) of one or more 
+    quantities (e.g. the scores of several metrics) with P2Quantile sketches,
+    and their minimum, maximum and mean. The MAD is the median of the absolute 
+    deviations from the running median.
+    '''
+    def __init__(self, size=1):
+        '''
+        Parameters:
+        -----------
+        size : int, number of quantities
+        '''
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        ''' Forget all values.'''
+        self.medians = [P2Quantile(0.5) for _ in range(self.size)]
+        self.deviations = [P2Quantile(0.5) for _ in range(self.size)]
+        self.minimum = np.full(self.size, np.nan)
+        self.maximum = np.full(self.size, np.nan)
+        self.total = np.zeros(self.size)
+        self.valid = np.zeros(self.size, dtype=int)
+        self.count = 0
+
+    def add(self, values):
+        ''' Add one value of each quantity (scalar or vector). NaN is ignored.'''
+        values = np.atleast_1d(values)
+        assert len(values) == self.size, "Expected {} values but got {}".format(self.size, len(values))
+        for value, median, deviation in zip(values, self.medians, self.deviations):
+            median.add(value)
+            deviation.add(abs(value - median.value))
+        self.minimum = np.fmin(self.minimum, values)
+        self.maximum = np.fmax(self.maximum, values)
+        valid = ~np.isnan(values)
+        self.total += np.where(valid, values, 0)
+        self.valid += valid
+        self.count += 1
+
+    def median(self):
+        return np.array([median.value for median in self.medians])
+
+    def mad(self):
+        return np.array([deviation.value for deviation in self.deviations])
+
+    def mean(self):
+        ''' Mean of the values of each quantity (NaN without values).'''
+        with np.errstate(invalid='ignore'):
+            return self.total / self.valid
+
 class Scheduler:
     def __init__(self, list_of_functions, start, interval):
         self.list_of_functions = list_of_functions
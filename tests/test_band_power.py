@@ -0,0 +1,110 @@
+import sys; sys.path.insert(0, '../')
+import numpy as np
+from octopus.util import BandPowerEngine, bandpower
+
+sr = 500
+
+def reference(data, fmin, fmax):
+    ''' Band power of each channel with the scipy periodogram (bandpower,
+    which interpolates NaNs in place).'''
+    return np.array([bandpower(channel.copy(), sr, fmin, fmax) for channel in data])
+
+def test_kernel_and_fft_match_bandpower():
+    ''' Both the DFT of the band bins and the full FFT give the band power of
+    bandpower for several window lengths and bands.'''
+    data = np.random.default_rng(0).standard_normal((4, 2 * sr))
+    engine = BandPowerEngine()
+    paths = set()
+    for n in (sr // 2, sr, 2 * sr - 1):
+        for fmin, fmax in ((8, 12), (15, 30), (1, 40), (0.5, 100)):
+            power = engine.power(data[:, :n], sr, fmin, fmax)
+            paths.add(engine.plan(n, sr, fmin, fmax)['kernel'] is None)
+            assert np.allclose(power, reference(data[:, :n], fmin, fmax), rtol=1e-9)
+    # Both paths were taken
+    assert paths == {True, False}
+
+def test_nan_and_empty_channels():
+    ''' NaNs are interpolated like bandpower does, channels without any
+    valid sample get the power 0.'''
+    data = np.random.default_rng(1).standard_normal((3, sr))
+    data[0, 100:150] = np.nan
+    data[1, :10] = np.nan
+    data[2] = np.nan
+    power = BandPowerEngine().power(data, sr, 8, 12)
+    assert np.allclose(power[:2], reference(data[:2], 8, 12), rtol=1e-9)
+    assert power[2] == 0
+
+def test_plan_cache():
+    ''' Plans are computed once per length, sampling rate and band and
+    shared by power and band.'''
+    engine = BandPowerEngine()
+    data = np.random.default_rng(2).standard_normal((2, sr))
+    power = engine.power(data, sr, 8, 12)
+    plan = engine.plan(sr, sr, 8, 12)
+    assert set(engine.plans) == {(sr, sr), (sr, sr, 8, 12)}
+    engine.power(data[::-1], sr, 8, 12)
+    assert engine.plan(sr, sr, 8, 12) is plan and len(engine.plans) == 2
+    assert np.allclose(engine.band(engine.spectrum(data, sr), 8, 12), power)
+    assert engine.plan(sr, sr, 8, 12) is plan
+    engine.power(data[:, 1:], sr, 8, 12)
+    assert len(engine.plans) == 4
+
+def sliding_power(data, blockSize, **kwargs):
+    ''' Feed data block by block into a SlidingBandPower, return it and 
+    the power after each block.'''
+    from octopus.util import SlidingBandPower
+    sliding = SlidingBandPower(data.shape[0], sr, **kwargs)
+    powers = []
+    for start in range(0, data.shape[1], blockSize):
+        sliding.update(data[:, start:start + blockSize])
+        powers.append(sliding.power())
+    return sliding, powers
+
+def test_sliding_matches_batch():
+    ''' After many blocks (and several resyncs) the sliding DFT gives the 
+    band power of the newest window.'''
+    from octopus.util import band_power_engine
+    data = np.random.default_rng(3).standard_normal((3, 40 * sr)) + 5
+    windowSize, blockSize = sr, 25
+    sliding, powers = sliding_power(data, blockSize, windowSize=windowSize, 
+        fmin=8, fmax=12, resyncSamples=7 * sr)
+    assert np.isnan(powers[windowSize // blockSize - 2]).all()
+    for i in range(windowSize // blockSize - 1, len(powers), 37):
+        end = (i + 1) * blockSize
+        batch = band_power_engine.power(data[:, end - windowSize:end], sr, 8, 12)
+        assert np.allclose(powers[i], batch, rtol=1e-8)
+    assert np.allclose(powers[-1], reference(data[:, -windowSize:], 8, 12), rtol=1e-8)
+
+def test_sliding_without_resync():
+    ''' Without resync the rounding errors of a long run stay small.'''
+    from octopus.util import band_power_engine
+    data = np.random.default_rng(4).standard_normal((2, 120 * sr))
+    sliding, _ = sliding_power(data, 10, windowSize=sr // 2, fmin=15, fmax=30, 
+        resyncSamples=10 ** 9)
+    assert sliding.lastResync == 0
+    batch = band_power_engine.power(data[:, -(sr // 2):], sr, 15, 30)
+    assert np.allclose(sliding.power(), batch, rtol=1e-6)
+
+def test_sliding_across_nan_gap():
+    ''' Windows containing NaN are interpolated, after the gap has left the
+    window the sliding sums are exact again.'''
+    from octopus.util import band_power_engine
+    data = np.random.default_rng(5).standard_normal((2, 6 * sr))
+    data[:, 2 * sr:2 * sr + 60] = np.nan
+    windowSize, blockSize = sr, 20
+    sliding, powers = sliding_power(data, blockSize, windowSize=windowSize, 
+        fmin=8, fmax=12)
+    for i in range(windowSize // blockSize - 1, len(powers)):
+        end = (i + 1) * blockSize
+        window = data[:, end - windowSize:end]
+        assert np.allclose(powers[i], reference(window, 8, 12), rtol=1e-8)
+        if np.isnan(window).any():
+            assert np.allclose(powers[i], band_power_engine.power(window, sr, 8, 12))
+    assert sliding.nanCount == 0
+
+def test_sliding_block_longer_than_window():
+    ''' A block longer than the window replaces it.'''
+    data = np.random.default_rng(6).standard_normal((1, 3 * sr))
+    sliding, _ = sliding_power(data, 2 * sr, windowSize=sr, fmin=8, fmax=12)
+    assert sliding.sampleCount == 3 * sr
+    assert np.allclose(sliding.power(), reference(data[:, -sr:], 8, 12), rtol=1e-8)
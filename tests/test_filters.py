@@ -0,0 +1,83 @@
+import sys; sys.path.insert(0, '../')
+import numpy as np
+from scipy import signal
+from octopus.filters import FilterBank, Decimator
+
+def decimate(data, factor, blockSize, inputCount=0):
+    ''' Feed data block by block into a Decimator joined at inputCount,
+    return the decimated data and the index of its first sample.'''
+    decimator = Decimator(factor, data.shape[0])
+    decimator.reset(inputCount)
+    firstIndex = decimator.outputCount
+    blocks = [decimator.process(data[:, start:start + blockSize])
+        for start in range(0, data.shape[1], blockSize)]
+    return np.concatenate(blocks, axis=1), firstIndex
+
+def test_decimator_impulse_alignment():
+    ''' An impulse at input sample i * factor peaks at decimated sample i,
+    whatever the blocks and the sample index the decimator joins at.'''
+    for factor, blockSize, inputCount in ((10, 20, 0), (10, 37, 7), (4, 3, 3), (20, 50, 1000)):
+        data = np.zeros((2, 3000))
+        impulse = 1000 + factor - inputCount % factor
+        data[:, impulse] = 1
+        decimated, firstIndex = decimate(data, factor, blockSize, inputCount)
+        peak = firstIndex + np.argmax(decimated, axis=1)
+        assert (inputCount + impulse) % factor == 0
+        assert (peak == (inputCount + impulse) // factor).all()
+        # Held back by the group delay (10 output samples) only
+        last = (inputCount + data.shape[1] - 1) // factor - 10
+        assert firstIndex + decimated.shape[1] == last + 1
+
+def test_decimator_sinusoid():
+    ''' A sinusoid in the pass band keeps its phase: decimated sample k is
+    input sample k * factor.'''
+    sr, factor = 1000, 20
+    samples = np.arange(10 * sr)
+    data = np.sin(2 * np.pi * 3 * samples / sr)[np.newaxis, :]
+    decimated, firstIndex = decimate(data, factor, 20)
+    expected = data[0, (firstIndex + np.arange(decimated.shape[1])) * factor]
+    # After the transient of the first samples
+    np.testing.assert_allclose(decimated[0, 20:], expected[20:], atol=0.01)
+
+def test_decimator_blocks():
+    ''' The decimated data does not depend on the block size.'''
+    data = np.random.default_rng(0).standard_normal((3, 2000))
+    oneShot, _ = decimate(data, 10, data.shape[1])
+    for blockSize in (1, 7, 20, 333):
+        decimated, _ = decimate(data, 10, blockSize)
+        np.testing.assert_allclose(decimated, oneShot, rtol=0, atol=1e-12)
+
+def test_filter_bank_blocks():
+    ''' Filtering block by block gives the same streams as filtering all
+    data at once with sosfilt from the steady state of the first sample.'''
+    sr = 500
+    bands = dict(scp=(None, 0.5), alpha=(8, 12), high=(30, None))
+    data = np.random.default_rng(1).standard_normal((3, 10 * sr)) + 100
+    filterBank = FilterBank(sr, data.shape[0], bands)
+    for blockSize in (1, 10, 333):
+        filterBank.reset()
+        blocks = [filterBank.process(data[:, start:start + blockSize]) 
+            for start in range(0, data.shape[1], blockSize)]
+        for name in bands:
+            sos = filterBank.bands[name]['sos']
+            zi = signal.sosfilt_zi(sos)[:, np.newaxis, :] * data[:, 0][np.newaxis, :, np.newaxis]
+            oneShot, _ = signal.sosfilt(sos, data, axis=1, zi=zi)
+            filtered = np.concatenate([block[name] for block in blocks], axis=1)
+            np.testing.assert_allclose(filtered, oneShot, rtol=0, atol=1e-9)
+
+def test_filter_bank_gap():
+    ''' A block with NaN is passed on as NaN, the channel restarts at its
+    next block, the other channels are not affected.'''
+    sr = 500
+    data = np.random.default_rng(2).standard_normal((2, 4 * sr))
+    data[0, 1000:1005] = np.nan
+    filterBank = FilterBank(sr, data.shape[0], dict(alpha=(8, 12)))
+    filtered = np.concatenate([filterBank.process(data[:, start:start + 10])['alpha'] 
+        for start in range(0, data.shape[1], 10)], axis=1)
+    assert np.isnan(filtered[0, 1000:1010]).all() and not np.isnan(filtered[0, 1010:]).any()
+    sos = filterBank.bands['alpha']['sos']
+    zi = signal.sosfilt_zi(sos) * data[0, 1010]
+    restarted, _ = signal.sosfilt(sos, data[0, 1010:], zi=zi)
+    np.testing.assert_allclose(filtered[0, 1010:], restarted, rtol=0, atol=1e-9)
+    oneShot, _ = signal.sosfilt(sos, data[1], zi=signal.sosfilt_zi(sos) * data[1, 0])
+    np.testing.assert_allclose(filtered[1], oneShot, rtol=0, atol=1e-9)
@@ -0,0 +1,50 @@
+import sys; sys.path.insert(0, '../')
+import numpy as np
+from octopus.buffer import RingBuffer
+from octopus.filters import SpatialFilter, FilterBank, Decimator
+from octopus.replay import SyntheticSource
+
+def run_pipeline(dtype, n_blocks=1500, blockSize=20, sr=1000, rate=50, offset=5000.0):
+    ''' Feed the same float32 stream (as sent by the RDA) through the
+    preprocessing of the gatherer (spatial filter, filter bank, decimation)
+    and keep the decimated SCP band in a ring buffer of the given data type.
+    A large electrode offset makes the test sensitive to float32 rounding.'''
+    source = SyntheticSource(channelNames=['Cz', 'Fz', 'TP9', 'TP10', 'VEOG'], sr=sr, seed=3)
+    channelCount = len(source.channelNames)
+    spatialFilter = SpatialFilter(source.channelNames, refChannels=['TP9', 'TP10'],
+        eogChannel='VEOG', eogWeights=[0.1] * channelCount)
+    filterBank = FilterBank(sr, channelCount, dict(scp=(None, 0.5)))
+    decimator = Decimator(sr // rate, channelCount)
+    buffer = RingBuffer(n_blocks * blockSize // (sr // rate), channelCount, dtype=dtype)
+    for block in range(n_blocks):
+        data, _ = source.read(blockSize)
+        data = np.asarray(data + offset, dtype=np.float32)
+        cleanData = spatialFilter.apply(np.array(data, dtype=dtype))
+        bandData = filterBank.process(cleanData)
+        assert cleanData.dtype == dtype and bandData['scp'].dtype == dtype
+        buffer.write(decimator.process(bandData['scp']), tag=block)
+    return buffer.snapshot(buffer.sampleCount)[0], rate
+
+def scp_averages(data, rate, trialDurationS=6, baselineDurationS=1):
+    ''' Baseline corrected SCP average of consecutive trials (like
+    HistMonitor.button_press).'''
+    n = int(trialDurationS * rate)
+    baseline = int(baselineDurationS * rate)
+    averages = []
+    for start in range(n, data.shape[1] - n + 1, n):
+        trial = data[:, start:start + n].astype(np.float64)
+        averages.append((trial - trial[:, :baseline].mean(axis=1, keepdims=True)).mean(axis=1))
+    return np.array(averages)
+
+def test_float32_scp_averages():
+    ''' SCP averages of a float32 data path match the float64 one.'''
+    data32, rate = run_pipeline(np.float32)
+    data64, _ = run_pipeline(np.float64)
+    assert data32.dtype == np.float32 and data64.dtype == np.float64
+    assert np.isfinite(data64).all()
+    averages32 = scp_averages(data32, rate)
+    averages64 = scp_averages(data64, rate)
+    assert len(averages64) > 0
+    # µV: far below the resolution of the amplifier (0.1 µV)
+    np.testing.assert_allclose(averages32, averages64, rtol=0, atol=0.01)
+    np.testing.assert_allclose(data32, data64, rtol=0, atol=0.01)
@@ -0,0 +1,103 @@
+import sys; sys.path.insert(0, '../')
+import numpy as np
+from octopus.buffer import RingBuffer
+from octopus.history import TieredHistory
+
+def make_history(channelCount=2, capacity=1000, chunkSize=200, maxSamples=5000, resolutions=None):
+    ''' Hot ring buffer (float32 like the gatherer) and its history.'''
+    hot = RingBuffer(capacity, channelCount, dtype=np.float32)
+    resolutions = [0.5] * channelCount if resolutions is None else resolutions
+    return hot, TieredHistory(hot, resolutions, chunkSize, maxSamples)
+
+def write(hot, history, block):
+    ''' Write a block like the gatherer: hot buffer first, then history.'''
+    hot.write(block)
+    history.write(block)
+
+def skip(hot, history, n):
+    ''' Skip a gap like the gatherer: history first, then hot buffer.'''
+    history.skip(n)
+    hot.skip(n)
+
+def test_int16_round_trip():
+    ''' Amplifier data (multiples of the resolution around a large offset)
+    comes back from the int16 chunks unchanged.'''
+    hot, history = make_history(resolutions=[0.5, 0.1])
+    rng = np.random.default_rng(0)
+    codes = np.cumsum(rng.integers(-20, 21, size=(2, 3000)), axis=1)
+    data = (codes * np.array([[0.5], [0.1]]) + 5000).astype(np.float32)
+    for start in range(0, data.shape[1], 20):
+        write(hot, history, data[:, start:start + 20])
+    assert history.stats()['chunks'] == 15 and history.stats()['float32Chunks'] == 0
+    assert all(chunk['kind'] == 'int16' for chunk in history.chunks)
+    recalled, first = history.range(0, 2000)
+    assert first == 0 and recalled.dtype == np.float32
+    np.testing.assert_array_equal(recalled[0], data[0, :2000])
+    np.testing.assert_allclose(recalled[1], data[1, :2000], rtol=0, atol=1e-3)
+    assert history.stats()['ratio'] > 1
+
+def test_float32_fallback():
+    ''' A chunk whose range exceeds int16 in units of the resolution is
+    stored as float32, the other chunks stay int16.'''
+    hot, history = make_history(channelCount=1, chunkSize=100, resolutions=[0.1])
+    data = np.zeros((1, 1500), dtype=np.float32)
+    # 20000 µV within one chunk: 200000 codes
+    data[0, 250] = 20000
+    data[0, 600:700] = np.linspace(-5000, 5000, 100, dtype=np.float32)
+    write(hot, history, data)
+    kinds = [chunk['kind'] for chunk in history.chunks]
+    assert kinds.count('float32') == 2 and kinds[2] == kinds[6] == 'float32'
+    assert history.stats()['float32Chunks'] == 2
+    recalled, first = history.range(0, 1000)
+    assert first == 0
+    np.testing.assert_array_equal(recalled, data[:, :1000])
+
+def test_skip_whole_chunks():
+    ''' A gap spanning whole chunks is NaN in the history, the chunks stay
+    aligned to the samples written after it.'''
+    hot, history = make_history(chunkSize=200)
+    reference = []
+    rng = np.random.default_rng(1)
+    def block(n):
+        data = np.round(rng.standard_normal((2, n)) * 20) * 0.5
+        reference.append(data)
+        return data.astype(np.float32)
+    write(hot, history, block(350))
+    skip(hot, history, 730)
+    reference.append(np.full((2, 730), np.nan))
+    for _ in range(40):
+        write(hot, history, block(20))
+    reference = np.concatenate(reference, axis=1)
+    starts = [chunk['start'] for chunk in history.chunks]
+    assert starts == list(range(0, starts[-1] + 1, 200))
+    recalled, first = history.range(0)
+    assert first == 0 and recalled.shape[1] == reference.shape[1] == hot.sampleCount
+    np.testing.assert_array_equal(np.isnan(recalled), np.isnan(reference))
+    np.testing.assert_array_equal(recalled[~np.isnan(reference)], reference[~np.isnan(reference)])
+
+def test_skip_beyond_history():
+    ''' A gap longer than the history keeps only maxSamples of chunks.'''
+    hot, history = make_history(chunkSize=200, maxSamples=1000)
+    write(hot, history, np.ones((2, 300), dtype=np.float32))
+    skip(hot, history, 100000)
+    write(hot, history, np.ones((2, 50), dtype=np.float32))
+    assert len(history.chunks) == 5
+    assert history.chunks[-1]['start'] + 200 <= hot.sampleCount - 50
+    recalled, first = history.range(0)
+    assert first == history.chunks[0]['start'] == history.firstSample
+    assert first > 300 and np.isnan(recalled[:, :-50]).all() and (recalled[:, -50:] == 1).all()
+
+def test_range_across_boundary():
+    ''' A range that starts in the chunks and ends in the hot buffer is
+    continuous, whatever its edges.'''
+    hot, history = make_history(capacity=1000, chunkSize=200, maxSamples=4000)
+    data = (np.arange(2 * 5000).reshape(2, 5000) % 997 * 0.5).astype(np.float32)
+    for start in range(0, data.shape[1], 50):
+        write(hot, history, data[:, start:start + 50])
+    assert hot.firstSample == 4000 and history.firstSample == 1000
+    for start, end in ((1000, 5000), (3999, 4001), (3150, 4321), (3800, 4000), (4000, 4200), (0, 1200)):
+        recalled, first = history.range(start, end)
+        assert first == max(start, 1000)
+        np.testing.assert_array_equal(recalled, data[:, first:end])
+    recalled, first = history.range(4500)
+    assert first == 4500 and recalled.shape[1] == 500
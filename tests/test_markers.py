@@ -0,0 +1,64 @@
+import sys; sys.path.insert(0, '../')
+from octopus.markers import MarkerStore
+from octopus.gather import DummyGather
+from octopus.replay import SyntheticSource
+
+def test_reset_keeps_columns_sorted():
+    ''' After the sample counter restarts (reset_memory), queries only see
+    the markers of the new counter.'''
+    store = MarkerStore(capacity=100)
+    store.add([5000, 9000], [1, 1], [-1, -1], ['Stimulus', 'Response'], ['S 10', 'R 1'])
+    store.reset()
+    assert len(store) == 0 and store.last_of_type('S 10') is None
+    store.add([10, 20], [1, 1], [-1, -1], ['Stimulus', 'Stimulus'], ['S 10', 'S 11'])
+    markers = store.markers_between(0, 100)
+    assert markers['sample'].tolist() == [10, 20]
+    assert markers['description'].tolist() == ['S 10', 'S 11']
+    assert store.last_of_type('S 10') == 10
+    assert store.last_of_type('Stimulus', before=20) == 10
+    assert store.last_of_type('R 1') is None
+
+def test_query_boundaries():
+    ''' markers_between includes t0 and excludes t1, last_of_type excludes
+    before, by type as well as by description.'''
+    store = MarkerStore(capacity=100)
+    store.add([10, 20, 20, 30], [1, 1, 1, 1], [-1, -1, 2, -1], 
+        ['Stimulus', 'Stimulus', 'Response', 'Stimulus'], ['S 10', 'S 11', 'R 1', 'S 10'])
+    assert store.markers_between(10, 30)['sample'].tolist() == [10, 20, 20]
+    assert store.markers_between(11, 31)['sample'].tolist() == [20, 20, 30]
+    assert store.markers_between(20, 20)['sample'].tolist() == []
+    assert store.markers_between(31, 100)['sample'].tolist() == []
+    markers = store.markers_between(20, 21)
+    assert markers['type'].tolist() == ['Stimulus', 'Response'] and markers['channel'].tolist() == [-1, 2]
+    assert store.last_of_type('S 10') == 30
+    assert store.last_of_type('S 10', before=30) == 10
+    assert store.last_of_type('S 10', before=31) == 30
+    assert store.last_of_type('S 10', before=10) is None
+    assert store.last_of_type('Stimulus', before=30) == 20
+    assert store.last_of_type('R 1', before=21) == 20 and store.last_of_type('R 1', before=20) is None
+    assert store.last_of_type('S 99') is None
+
+def test_capacity_bounds_all_labels():
+    ''' Only the newest capacity markers are kept, for every label. Many
+    distinct labels take no memory beyond the columns.'''
+    store = MarkerStore(capacity=10)
+    for sample in range(100):
+        store.add([sample], [1], [-1], ['Comment'], ['note {}'.format(sample)])
+    assert len(store) == 10
+    assert store.markers_between(0, 100)['sample'].tolist() == list(range(90, 100))
+    assert store.last_of_type('Comment') == 99
+    assert store.last_of_type('Comment', before=90) is None
+    assert store.last_of_type('note 5') is None and store.last_of_type('note 95') == 95
+    assert all(column.capacity == 10 for column in (store.samples, store.points, 
+        store.channels, store.typeCodes, store.descriptionCodes))
+
+def test_dummy_gather_markers():
+    ''' DummyGather stores the markers of its source like Gather.'''
+    gatherer = DummyGather(source=SyntheticSource(sr=1000, markerIntervalS=0.5, seed=0))
+    gatherer.fresh_init()
+    for _ in range(gatherer.blocks_per_s * 2):
+        gatherer.GetData()
+    markers = gatherer.markerStore.markers_between(0, gatherer.sampleCount)
+    assert markers['sample'].tolist() == [0, 500, 1000, 1500]
+    assert set(markers['description']) == {'S 10'}
+    assert gatherer.markerStore.last_of_type('S 10', before=1500) == 1000
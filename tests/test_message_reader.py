@@ -0,0 +1,33 @@
+import sys; sys.path.insert(0, '../')
+from struct import pack
+from octopus.gather import MessageReader
+
+class ChunkedConnection:
+    ''' Socket stand-in that returns at most chunkSize bytes per recv_into.'''
+    def __init__(self, data, chunkSize):
+        self.data = memoryview(data)
+        self.chunkSize = chunkSize
+        self.position = 0
+
+    def recv_into(self, view, size):
+        n = min(size, self.chunkSize, len(self.data) - self.position)
+        view[:n] = self.data[self.position:self.position + n]
+        self.position += n
+        return n
+
+def message(msgtype, body):
+    return pack('<llllLL', 0, 0, 0, 0, MessageReader.headerSize + len(body), msgtype) + body
+
+def test_last_message_syscalls():
+    ''' lastMessageSyscalls is the number of recv calls of the last complete
+    message, also while the header of the next one is received.'''
+    reader = MessageReader(ChunkedConnection(message(4, bytes(100)) + message(4, bytes(10)), 16), bufferSize=8)
+    msgtype, body = reader.read_message()
+    # 24 byte header in 2 calls, 100 byte body in 7 calls
+    assert msgtype == 4 and len(body) == 100 and reader.stats()['lastMessageSyscalls'] == 9
+    reader.read_header()
+    assert reader.stats()['lastMessageSyscalls'] == 9
+    body = reader.read_body(10)
+    stats = reader.stats()
+    assert len(body) == 10 and stats['lastMessageSyscalls'] == 3
+    assert stats['messages'] == 2 and stats['syscalls'] == 12 and stats['bytesReceived'] == 158
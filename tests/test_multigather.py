@@ -0,0 +1,62 @@
+import sys; sys.path.insert(0, '../')
+import numpy as np
+from octopus.gather import MultiGather
+
+# Nothing listens on this port, the sources are fed directly (see feed)
+PORT = 1
+
+def signal(t):
+    ''' Smooth signal of the host time, seen by both amplifiers.'''
+    return np.sin(2 * np.pi * 2 * t) + t
+
+def start(source, sr):
+    ''' Set up a source as if its start message had arrived.'''
+    source.channelNames = ['Cz', 'TP9']
+    source.channelCount = len(source.channelNames)
+    source.resolutions = [0.1] * source.channelCount
+    source.samplingInterval = 1e6 / sr
+    source.setup_memory()
+    source.connected = True
+
+def feed(source, startS, durationS, markerSamples=(), latencyS=0.01):
+    ''' Blocks of a source whose sample 0 is acquired at host time startS,
+    with markers at the given source samples. Each block arrives latencyS
+    after its end, i.e. the sample count after it (see ClockModel.add).'''
+    for _ in range(int(durationS * source.blocks_per_s)):
+        samples = source.sampleCount + np.arange(source.blockSize)
+        t = startS + samples / source.sr
+        source.data = np.array([signal(t), -signal(t)], dtype=source.dtype)
+        positions = [sample - samples[0] for sample in markerSamples if sample in samples]
+        markers = dict(position=positions, points=[1] * len(positions), channel=[-1] * len(positions),
+            type=['Stimulus'] * len(positions), description=['S  1'] * len(positions))
+        source.process_block(markers if len(positions) > 0 else None)
+        source.clock.add(source.sampleCount, startS + source.sampleCount / source.sr + latencyS)
+
+def test_merge_offset_clocks():
+    ''' Two amplifiers (1000 Hz and 500 Hz) whose streams start 0.3 s apart
+    are merged on the samples of the first one: the second one is resampled
+    at the same host times and its markers land at the merged sample of
+    their host time.'''
+    gatherer = MultiGather([('a', '127.0.0.1', PORT), ('b', '127.0.0.1', PORT)])
+    a, b = gatherer.sources
+    start(a, 1000)
+    start(b, 500)
+    assert gatherer.connect()
+    assert gatherer.channelNames == ['a:Cz', 'a:TP9', 'b:Cz', 'b:TP9'] and gatherer.sr == 1000
+    feed(a, 0, 4)
+    feed(b, 0.3, 3.5, markerSamples=[250])
+    gatherer.merge()
+    # b starts at sample 300 of a
+    assert gatherer.refStart == 300
+    # Whole blocks that both sources hold (b ends at 3.8 s)
+    assert gatherer.sampleCount == 3480
+    data, firstSample, _ = gatherer.snapshot(gatherer.sampleCount)
+    t = (gatherer.refStart + firstSample + np.arange(data.shape[1])) / 1000
+    np.testing.assert_allclose(data[0], signal(t), rtol=0, atol=1e-5)
+    # Linear interpolation between the samples of b
+    np.testing.assert_allclose(data[2], signal(t), rtol=0, atol=1e-3)
+    np.testing.assert_allclose(data[3], -signal(t), rtol=0, atol=1e-3)
+    # Sample 250 of b is acquired at 0.8 s
+    markers = gatherer.markerStore.markers_between(0, gatherer.sampleCount)
+    assert list(markers['sample']) == [800 - gatherer.refStart]
+    assert list(markers['description']) == ['S  1']
@@ -0,0 +1,50 @@
+import sys; sys.path.insert(0, '../')
+import types
+import numpy as np
+from octopus.gather import DummyGather
+from octopus.neurofeedback import BandPowerNeuroFeedback, MetricRegistry, band_ratio
+
+# The worker is not started, update() is called directly
+threadpool = types.SimpleNamespace(start=lambda worker: None)
+
+def test_calibration_with_full_data_memory():
+    ''' By default the calibration is based on the data memory and happens
+    as soon as it is full, the first score follows with the next block.'''
+    gatherer = DummyGather()
+    gatherer.fresh_init()
+    feedback = BandPowerNeuroFeedback(None, threadpool, gatherer, (15, 30),
+        channelsOfInterest=['Cz'], waitTimeoutS=0)
+    for _ in range(gatherer.dataMemoryDurS * gatherer.blocks_per_s - 1):
+        gatherer.GetData()
+    assert feedback.update() == (False, False) and feedback.cal is None
+    gatherer.GetData()
+    feedback.update()
+    assert feedback.cal is not None
+    gatherer.GetData()
+    ok, (_, score, cal) = feedback.update()
+    assert ok and np.isfinite(score) and cal[0] <= cal[2] <= cal[1]
+
+def test_registry_live_matches_batch():
+    ''' Scores of the sliding estimators (update, current) equal the batch
+    scores of the newest samples after every block, before each window is 
+    full they are NaN.'''
+    sr = 500
+    registry = MetricRegistry(sr)
+    registry.register('beta', ['Cz'], (15, 30), windowS=0.25)
+    registry.register('alpha', ['Fz', 'Cz'], (8, 12), windowS=0.25)
+    registry.register('theta/beta', ['Cz'], dict(theta=(4, 8), beta=(15, 30)), 
+        windowS=1, combine=band_ratio('theta', 'beta'))
+    # beta of 'beta' and 'theta/beta' have different windows, 4 estimators
+    data = np.random.default_rng(0).standard_normal((2, 20 * sr))
+    registry.reset()
+    assert len(registry.estimators) == 4
+    blockSize = 20
+    for end in range(blockSize, data.shape[1] + 1, blockSize):
+        registry.update(data[:, end - blockSize:end])
+        live = registry.current()
+        if end < sr:
+            assert np.isnan(live[2]) and np.isfinite(live[0]) == (end >= sr // 4)
+            continue
+        assert np.allclose(live, registry.scores(data[:, end - sr:end]), rtol=1e-8)
+    registry.reset()
+    assert np.isnan(registry.current()).all()
@@ -0,0 +1,30 @@
+import sys; sys.path.insert(0, '../')
+import numpy as np
+from octopus.quality import SignalQuality, quality_checks
+
+def clipped_data(sr=500, n_blocks=50, blockSize=10, resolution=0.1):
+    ''' Two channels of noise, the second one stuck at the 16 bit limit.'''
+    rng = np.random.default_rng(0)
+    data = rng.normal(scale=10, size=(2, n_blocks * blockSize))
+    data[1] = 32767 * resolution
+    return np.split(data, n_blocks, axis=1)
+
+def test_clipping_with_range():
+    ''' A known amplifier range makes channels at its limit bad.'''
+    quality = SignalQuality(500, [0.1, 0.1], rangeCodes=32768)
+    for i, block in enumerate(clipped_data()):
+        quality.update(block, i * block.shape[1])
+    summary = quality.summary
+    assert summary['clipping'][0] == 0 and summary['clipping'][1] > 0.99
+    clippingBit = 1 << quality_checks.index('clipping')
+    assert not summary['reasons'][0] & clippingBit and summary['reasons'][1] & clippingBit
+
+def test_clipping_without_range():
+    ''' Without a range clipping is not checked.'''
+    quality = SignalQuality(500, [0.1, 0.1])
+    for i, block in enumerate(clipped_data()):
+        quality.update(block, i * block.shape[1])
+    summary = quality.summary
+    assert np.isnan(summary['clipping']).all()
+    clippingBit = 1 << quality_checks.index('clipping')
+    assert not (summary['reasons'] & clippingBit).any()
@@ -0,0 +1,29 @@
+import sys; sys.path.insert(0, '../')
+import os
+import tempfile
+import numpy as np
+from octopus.gather import DummyGather
+from octopus.recorder import read_recording
+
+def test_recording_restarts_with_sample_counter():
+    ''' After the sample counter restarts the recording continues in a new 
+    file, sample i of each file is the sample firstSample + i of the stream.'''
+    gatherer = DummyGather()
+    gatherer.fresh_init()
+    path = os.path.join(tempfile.mkdtemp(), 'session')
+    for _ in range(3):
+        gatherer.GetData()
+    gatherer.start_recording(path)
+    for _ in range(5):
+        gatherer.GetData()
+    gatherer.reset_memory()
+    for _ in range(4):
+        gatherer.GetData()
+    gatherer.stop_recording()
+    header, data, _ = read_recording(path)
+    assert header['firstSample'] == 3 * gatherer.blockSize
+    assert data.shape[1] == 5 * gatherer.blockSize
+    header, data, _ = read_recording(path + '_2')
+    assert header['firstSample'] == 0
+    assert data.shape[1] == 4 * gatherer.blockSize
+    np.testing.assert_allclose(data, gatherer.snapshot(4 * gatherer.blockSize)[0])
@@ -0,0 +1,26 @@
+import sys; sys.path.insert(0, '../')
+import os
+import tempfile
+import numpy as np
+from octopus.recorder import Recorder
+from octopus.replay import RecordingSource
+
+def test_recording_markers_round_trip():
+    ''' Markers of a recording that starts later in the stream are replayed
+    at their position within the file.'''
+    path = os.path.join(tempfile.mkdtemp(), 'session')
+    firstSample = 500
+    recorder = Recorder(path, ['Cz', 'Fz'], [0.1, 0.1], 1000, firstSample=firstSample)
+    data = np.arange(2 * 100, dtype=np.float32).reshape(2, 100)
+    for start in range(0, 100, 20):
+        markers = dict(sample=[firstSample + start + 5], type=['Stimulus'], 
+            description=['S {}'.format(start)], points=[1], channel=[0])
+        recorder.push(data[:, start:start + 20], markers)
+    recorder.close()
+    source = RecordingSource(path)
+    positions = []
+    for start in range(0, 100, 20):
+        block, markers = source.read(20)
+        np.testing.assert_array_equal(block, data[:, start:start + 20])
+        positions.append((start + markers['position'][0], markers['description'][0]))
+    assert positions == [(start + 5, 'S {}'.format(start)) for start in range(0, 100, 20)]
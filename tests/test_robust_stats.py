@@ -0,0 +1,28 @@
+import sys; sys.path.insert(0, '../')
+import numpy as np
+from octopus.util import P2Quantile, RunningRobustStats
+
+def test_p2_quantile():
+    ''' Streaming quantiles are close to the exact ones of skewed data.'''
+    data = np.random.default_rng(0).lognormal(size=20000)
+    for p in (0.1, 0.5, 0.9):
+        quantile = P2Quantile(p)
+        for value in data:
+            quantile.add(value)
+        assert abs(quantile.value - np.quantile(data, p)) < 0.02 * np.quantile(data, 0.9)
+
+def test_running_robust_stats():
+    ''' Median and MAD of several quantities, NaN is ignored.'''
+    data = np.random.default_rng(1).normal(size=(5000, 2)) * [1, 10] + [0, 5]
+    data[::100, 1] = np.nan
+    stats = RunningRobustStats(2)
+    for values in data:
+        stats.add(values)
+    median = np.nanmedian(data, axis=0)
+    mad = np.nanmedian(np.abs(data - median), axis=0)
+    np.testing.assert_allclose(stats.median(), median, atol=0.05 * mad.max())
+    np.testing.assert_allclose(stats.mad(), mad, rtol=0.05)
+    np.testing.assert_allclose(stats.maximum, np.nanmax(data, axis=0))
+    np.testing.assert_allclose(stats.mean(), np.nanmean(data, axis=0))
+    stats.reset()
+    assert stats.count == 0 and np.isnan(stats.median()).all()
@@ -0,0 +1,74 @@
+import sys; sys.path.insert(0, '../')
+import threading
+import numpy as np
+from octopus.buffer import RingBuffer
+
+def test_snapshot_stress(channelCount=8, blockSize=20, capacity=500, n_blocks=20000, n_readers=4):
+    ''' Hammer snapshot() from several reader threads against a fast writer.
+    Every sample holds its own absolute index, so each snapshot must be a
+    consecutive run of indices that ends with the block given by the tag.'''
+    buffer = RingBuffer(capacity, channelCount)
+    done = threading.Event()
+    errors = []
+    snapshots = [0] * n_readers
+
+    def writer():
+        base = np.arange(blockSize)
+        for block in range(1, n_blocks+1):
+            data = np.tile(base + (block-1)*blockSize, (channelCount, 1))
+            buffer.write(data, tag=block)
+        done.set()
+
+    def reader(i):
+        n = blockSize * (i+1)
+        while not done.is_set():
+            data, first_sample, last_block = buffer.snapshot(n)
+            snapshots[i] += 1
+            if last_block * blockSize < n:
+                # Not enough data written yet
+                continue
+            expected = np.arange(first_sample, first_sample + n)
+            if not (data == expected).all() or first_sample + n != last_block * blockSize:
+                errors.append((first_sample, last_block, data[:, [0, -1]]))
+                return
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(n_readers)]
+    [r.start() for r in readers]
+    writer()
+    [r.join() for r in readers]
+
+    assert not errors, "inconsistent snapshots: {}".format(errors[:3])
+    assert all(n > 0 for n in snapshots)
+    assert buffer.tag == n_blocks
+
+def test_snapshot_before_full():
+    ''' Samples that were not written yet are not handed out.'''
+    buffer = RingBuffer(100, 2)
+    data, first_sample, _ = buffer.snapshot()
+    assert data.shape == (2, 0) and first_sample == 0
+    buffer.write(np.ones((2, 30)))
+    data, first_sample, _ = buffer.snapshot(50)
+    assert data.shape == (2, 30) and first_sample == 0
+    data, first_sample, _ = buffer.snapshot(start_sample=-20)
+    assert data.shape == (2, 30) and first_sample == 0
+
+def test_writes_beyond_capacity():
+    ''' Blocks and gaps longer than the ring keep only the newest samples,
+    the sample counter advances by all of them.'''
+    buffer = RingBuffer(10, 1)
+    buffer.write(np.arange(25)[np.newaxis, :])
+    assert buffer.sampleCount == 25 and buffer.firstSample == 15
+    assert buffer.latest(10)[0].tolist() == list(range(15, 25))
+    assert buffer.range(20, 25)[0].tolist() == list(range(20, 25))
+    buffer.skip(12, tag=3)
+    assert buffer.sampleCount == 37 and buffer.tag == 3
+    assert np.isnan(buffer.ordered()).all()
+    buffer.write(np.arange(37, 40)[np.newaxis, :])
+    data, first_sample, _ = buffer.snapshot(start_sample=0)
+    assert first_sample == 30 and np.isnan(data[0, :7]).all() and data[0, 7:].tolist() == [37, 38, 39]
+    buffer.skip(4)
+    assert buffer.sampleCount == 44 and buffer.range(37, 40)[0].tolist() == [37, 38, 39]
+
+if __name__ == '__main__':
+    test_snapshot_stress()
+    print("Snapshots are consistent.")